@@ -1,5 +1,7 @@
 import asyncio
 
+import click
+from beanie import PydanticObjectId
 from quart import Quart, jsonify
 from config import Config
 from common.data import ObjectDocumentMapper
@@ -14,11 +16,60 @@ def create_app(config_class=Config):
     async def connect_db():
         await odm.connect()
 
+    @app.before_serving
+    async def start_cleanup_scheduler():
+        from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+        app.add_background_task(cleanup_scheduler.run)
+
+    @app.after_serving
+    async def stop_cleanup_scheduler():
+        from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+        cleanup_scheduler.stop()
+
+    @app.before_serving
+    async def load_similarity_points():
+        if app.config["ADAPTIVE_TOLERANCES"]:
+            from assistml.model_recommender.select.adaptive_tolerances import build_similarity_points
+            app.add_background_task(build_similarity_points)
+
+    @app.before_serving
+    async def load_dataset_index():
+        if app.config["DATASET_INDEX_PREFILTER_K"] is not None:
+            from assistml.model_recommender.select.dataset_index import build_dataset_index
+            app.add_background_task(build_dataset_index)
+
     #asyncio.run(async_init())
 
     from assistml.api import bp
     app.register_blueprint(bp)
 
+    if app.config["ADMIN_API_ENABLED"]:
+        from assistml.admin import admin_bp
+        app.register_blueprint(admin_bp)
+
+    @app.cli.command("profile-query")
+    @click.argument("query_id")
+    @click.option("--similarity-level", type=click.IntRange(1, 3), default=3,
+                  help="Similarity level of the datasets whose models are selected.")
+    def profile_query(query_id: str, similarity_level: int):
+        """
+        Explain the model selection pipelines of a query and store their profiles.
+        """
+        from assistml.model_recommender.select.pipeline_profiler import profile_query_pipelines
+
+        async def run():
+            await odm.connect()
+            async with app.app_context():
+                return await profile_query_pipelines(PydanticObjectId(query_id), similarity_level)
+
+        for profile in asyncio.run(run()):
+            click.echo(f"{profile.pipeline} on {profile.collection}: {profile.execution_time_ms} ms, "
+                       f"{profile.merge_documents} documents to merge")
+            for stage in profile.stages:
+                click.echo(f"  {stage.stage}: {stage.execution_time_ms} ms, {stage.documents_returned} returned, "
+                           f"{stage.documents_examined} examined, {stage.keys_examined} keys, "
+                           f"{stage.collection_scans} collection scans, indexes {stage.indexes_used}")
+
     @app.route('/<path:any_other_path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
     def block_other_paths(any_other_path):
         """
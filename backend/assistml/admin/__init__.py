@@ -0,0 +1,6 @@
+from quart import Blueprint
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+from assistml.admin import cleanup, document_cache, pipeline_profiles
@@ -0,0 +1,15 @@
+from quart import jsonify
+
+from assistml.admin import admin_bp
+from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+
+
+@admin_bp.route('/cleanup', methods=['GET'])
+async def get_cleanup_metrics():
+    """
+        ---
+        get:
+          summary: Metrics of the cleanup scheduler
+          description: Returns the backlog of scratch data pending deletion and the totals of the cleared data.
+        """
+    return jsonify(cleanup_scheduler.get_metrics())
@@ -0,0 +1,16 @@
+from quart import jsonify
+
+from assistml.admin import admin_bp
+from common.utils.document_cache import get_shared_document_cache
+
+
+@admin_bp.route('/document-cache', methods=['GET'])
+async def get_document_cache_stats():
+    """
+        ---
+        get:
+          summary: Statistics of the shared document cache
+          description: Returns the size, hits, misses and evictions of the cached datasets, tasks and implementations.
+        """
+    stats = get_shared_document_cache().get_stats()
+    return jsonify({collection: collection_stats._asdict() for collection, collection_stats in stats.items()})
@@ -0,0 +1,53 @@
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from quart import jsonify, request
+
+from assistml.admin import admin_bp
+from assistml.model_recommender.select.pipeline_profiler import profile_query_pipelines
+from common.data import PipelineProfile
+
+
+@admin_bp.route('/explain/<query_id>', methods=['POST'])
+async def explain_query(query_id: str):
+    """
+        ---
+        post:
+          summary: Profile the model selection pipelines of a query
+          description: Runs the aggregation pipelines of the model selection of a query with explain (executionStats)
+            and stores the stage-by-stage statistics.
+          parameters:
+            - in: path
+              name: query_id
+              required: true
+            - in: query
+              name: similarityLevel
+              required: false
+        """
+    try:
+        similarity_level = int(request.args.get("similarityLevel", 3))
+        if not 1 <= similarity_level <= 3:
+            raise ValueError("similarityLevel must be 1, 2 or 3")
+        profiles = await profile_query_pipelines(PydanticObjectId(query_id), similarity_level)
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+
+    return jsonify([profile.model_dump(by_alias=True, mode="json") for profile in profiles])
+
+
+@admin_bp.route('/pipeline-profiles', methods=['GET'])
+async def list_pipeline_profiles():
+    """
+        ---
+        get:
+          summary: List stored pipeline profiles
+          description: Returns the most recent pipeline profiles, optionally filtered by pipeline name, to compare
+            them over time.
+        """
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    filters = {"pipeline": request.args["pipeline"]} if "pipeline" in request.args else {}
+    profiles = await PipelineProfile.find(filters).sort("-createdAt").limit(limit).to_list()
+
+    return jsonify([profile.model_dump(by_alias=True, mode="json") for profile in profiles])
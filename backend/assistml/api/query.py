@@ -1,9 +1,11 @@
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
 from pydantic import ValidationError
-from quart import jsonify, request
+from quart import current_app, jsonify, request
 
 from assistml.api import bp
-from assistml.model_recommender import generate_report
-from common.dto import ReportRequestDto, ReportResponseDto
+from assistml.model_recommender import generate_batch_reports, generate_report, get_stored_report, rerank_report
+from common.dto import BatchReportRequestDto, ReportRequestDto, ReportResponseDto, RerankRequestDto
 
 
 @bp.route('/query', methods=['POST'])
@@ -31,3 +33,91 @@ async def query():
     response: ReportResponseDto = await generate_report(report_request)
 
     return jsonify(response.model_dump(by_alias=True, mode="json"))
+
+
+@bp.route('/query/batch', methods=['POST'])
+async def query_batch():
+    """
+        ---
+        post:
+          summary: AssistML analysis of several preference sets for new data
+          description: Recommends ML models for every preference set of a query, selecting the known models only once.
+          parameters:
+            - in: body
+              name: body
+              required: true
+              schema:
+                $ref: '#/definitions/BatchReportRequestDto'
+        """
+    try:
+        data = await request.get_json()
+        batch_request = BatchReportRequestDto(**data)
+    except ValidationError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {e}"}), 400
+    max_preference_sets = current_app.config["BATCH_REPORT_MAX_PREFERENCE_SETS"]
+    if len(batch_request.preference_sets) > max_preference_sets:
+        return jsonify({"error": f"At most {max_preference_sets} preference sets are allowed"}), 400
+
+    response = await generate_batch_reports(batch_request)
+
+    return jsonify(response.model_dump(by_alias=True, mode="json"))
+
+
+@bp.route('/query/<query_id>', methods=['GET'])
+async def get_query_report(query_id: str):
+    """
+        ---
+        get:
+          summary: Stored AssistML report of a query
+          description: Returns the report generated for a previous query without recomputing it.
+          parameters:
+            - in: path
+              name: query_id
+              required: true
+        """
+    try:
+        response = await get_stored_report(PydanticObjectId(query_id))
+    except InvalidId as e:
+        return jsonify({"error": f"Invalid query id: {e}"}), 400
+    if response is None:
+        return jsonify({"error": "No report found for this query"}), 404
+
+    return jsonify(response.model_dump(by_alias=True, mode="json"))
+
+
+@bp.route('/query/<query_id>/rerank', methods=['POST'])
+async def rerank_query_report(query_id: str):
+    """
+        ---
+        post:
+          summary: Re-rank the AssistML report of a query for other preferences
+          description: Reuses the models selected for a previous query and only repeats the clustering and ranking.
+          parameters:
+            - in: path
+              name: query_id
+              required: true
+            - in: body
+              name: body
+              required: true
+              schema:
+                $ref: '#/definitions/RerankRequestDto'
+        """
+    try:
+        query_object_id = PydanticObjectId(query_id)
+    except InvalidId as e:
+        return jsonify({"error": f"Invalid query id: {e}"}), 400
+    try:
+        data = await request.get_json()
+        rerank_request = RerankRequestDto(**data)
+    except ValidationError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {e}"}), 400
+
+    response = await rerank_report(query_object_id, rerank_request.preferences)
+    if response is None:
+        return jsonify({"error": "Query not found"}), 404
+
+    return jsonify(response.model_dump(by_alias=True, mode="json"))
@@ -1,3 +1,4 @@
+import asyncio
 import csv
 import io
 import os
@@ -8,10 +9,16 @@ from pydantic import ValidationError
 from quart import current_app
 from werkzeug.datastructures.file_storage import FileStorage
 
+from assistml.model_recommender.select.dataset_index import build_dataset_index
 from common.dto import AnalyseDatasetRequestDto, DatasetInfoDto, DbWriteStatusDto
 from common.data_profiler import DataProfiler, ReadMode
-from common.data import Dataset
+from common.data import CorpusVersion, Dataset
 from common.data.projection import dataset as dataset_projection
+from common.utils.dataset_neighbors import add_dataset_neighbors, update_all_dataset_neighbors
+from common.utils.dataset_similarity import DEFAULT_SIMILARITY_TOLERANCES
+
+# recalculations triggered by concurrent uploads run one after another
+_recalculate_neighbors_lock = asyncio.Lock()
 
 
 async def profile_dataset(request: AnalyseDatasetRequestDto, file: FileStorage) -> (DatasetInfoDto, DbWriteStatusDto):
@@ -82,11 +89,39 @@ async def _write_result_to_db(data_profile: DatasetInfoDto) -> DbWriteStatusDto:
     else:
         new_dataset = Dataset(**data_profile.model_dump())
         await new_dataset.insert()
+        await CorpusVersion.bump(Dataset.get_collection_name())
+        current_app.add_background_task(_update_dataset_neighbors, new_dataset.id)
+        if current_app.config["DATASET_INDEX_PREFILTER_K"] is not None:
+            current_app.add_background_task(build_dataset_index)
         return DbWriteStatusDto(
             status=f"Information about the dataset {data_profile.info.dataset_name} written to the database.",
             dataset_id=str(new_dataset.id)
         )
 
+async def _update_dataset_neighbors(dataset_id):
+    current_app.logger.info(f"Updating dataset neighbors for new dataset {dataset_id}")
+    try:
+        all_lists_patched = await add_dataset_neighbors(dataset_id, DEFAULT_SIMILARITY_TOLERANCES,
+                                                        current_app.config["DATASET_NEIGHBORS_COUNT"])
+    except Exception as e:
+        current_app.logger.error(f"Error while updating dataset neighbors: {e}")
+        return
+    current_app.logger.info(f"Updated dataset neighbors for new dataset {dataset_id}")
+    if not all_lists_patched:
+        # lists that missed a concurrently added dataset can't be patched anymore
+        current_app.add_background_task(_recalculate_dataset_neighbors)
+
+async def _recalculate_dataset_neighbors():
+    async with _recalculate_neighbors_lock:
+        current_app.logger.info("Recalculating the neighbor lists of all datasets")
+        try:
+            updated_lists_count = await update_all_dataset_neighbors(DEFAULT_SIMILARITY_TOLERANCES,
+                                                                     current_app.config["DATASET_NEIGHBORS_COUNT"])
+        except Exception as e:
+            current_app.logger.error(f"Error while recalculating dataset neighbors: {e}")
+            return
+        current_app.logger.info(f"Recalculated the neighbor lists of {updated_lists_count} datasets")
+
 
 async def _check_for_similar_dataset_in_db(data_profile) -> dataset_projection.EmptyView:
     similar_datasets = Dataset.find({
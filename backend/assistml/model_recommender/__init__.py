@@ -1,3 +1,3 @@
-from .model_recommender_service import generate_report
+from .model_recommender_service import generate_batch_reports, generate_report, get_stored_report, rerank_report
 
-__all__ = ['generate_report']
+__all__ = ['generate_report', 'generate_batch_reports', 'get_stored_report', 'rerank_report']
@@ -1,45 +1,51 @@
-from typing import List, Optional, Tuple, Any
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from quart import current_app
-from sklearn.cluster import DBSCAN
+from scipy.spatial import cKDTree
 
-from common.data.projection.model import ModelView
+from assistml.model_recommender.cluster_engines import NOISE_LABEL, create_clustering_engine
+from assistml.model_recommender.query_budget import QueryBudget
+from assistml.model_recommender.select import SelectedModels
 from common.data.model import Metric
 
+CLUSTERING_EPS = 0.05
+CLUSTERING_MIN_SAMPLES = 3
+
+ClusteringResult = Tuple[np.ndarray, np.ndarray, int, int, Optional[int]]
+
 
 def _calculate_thresholds(
         metrics_df: pd.DataFrame,
         metrics: list[Metric],
-        preferences: dict[Metric, float]
-) -> Tuple[dict[Metric, Any], dict[Metric, Any]]:
+        preference_values: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Calculate the acceptable and nearly acceptable thresholds for each metric.
+    Calculate the acceptable and nearly acceptable thresholds for each metric and preference set at once.
 
     Parameters:
     metrics_df (pd.DataFrame): DataFrame containing metric values.
     metrics (list[Metric]): List of metrics.
-    preferences (dict[Metric, float]): Dictionary with performance preferences (tolerance factors per metric).
+    preference_values (np.ndarray): Performance preferences (tolerance factors), one row per preference set and one
+        column per metric.
 
     Returns:
     A tuple containing:
-        - A dictionary mapping metrics to acceptable thresholds.
-        - A dictionary mapping metrics to nearly acceptable thresholds.
+        - The acceptable thresholds, one row per preference set and one column per metric.
+        - The nearly acceptable thresholds, one row per preference set and one column per metric.
     """
-    max_values = metrics_df.max()
-    min_values = metrics_df.min()
-
-    thresholds_acc = {}
-    thresholds_nacc = {}
-
-    for metric in metrics:
-        if metric.optimization_goal == 'maximize':
-            thresholds_acc[metric] = max_values[metric] * (1 - preferences[metric])
-            thresholds_nacc[metric] = max_values[metric] * (1 - (preferences[metric] * 2))
-        elif metric.optimization_goal == 'minimize':
-            thresholds_acc[metric] = min_values[metric] / (1 - preferences[metric])
-            thresholds_nacc[metric] = min_values[metric] / (1 - (preferences[metric] * 2)) if (preferences[metric] * 2) < 1 else float('inf')
-
+    maximize = np.array([metric.optimization_goal == 'maximize' for metric in metrics], dtype=bool)
+    max_values = metrics_df[metrics].max().to_numpy(dtype=float)
+    min_values = metrics_df[metrics].min().to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thresholds_acc = np.where(maximize, max_values * (1 - preference_values), min_values / (1 - preference_values))
+        thresholds_nacc = np.where(
+            maximize,
+            max_values * (1 - (preference_values * 2)),
+            np.where((preference_values * 2) < 1, min_values / (1 - (preference_values * 2)), np.inf)
+        )
     return thresholds_acc, thresholds_nacc
 
 def _calculate_inside_cluster_distrust_points(inside_ratio: float) -> int:
@@ -80,36 +86,77 @@ def _calculate_metrics_distrust_points(used_metric_ratio: float) -> int:
     else:
         return 3
 
+def _build_condition_matrix(
+        metric_values: np.ndarray,
+        metrics: list[Metric],
+        thresholds_acc: np.ndarray,
+        thresholds_nacc: np.ndarray
+) -> np.ndarray:
+    """
+    Evaluate the region conditions for all models, metrics and preference sets at once.
+
+    The acceptable condition is met if the value is at least as good as the acceptable threshold, the nearly
+    acceptable condition if it lies between the nearly acceptable threshold and the acceptable threshold.
+
+    Returns:
+        A boolean matrix with one row per model and one block of columns per preference set, each block holding the
+        acceptable conditions of the metrics in its first half and the nearly acceptable conditions in its second
+        half.
+    """
+    maximize = np.array([metric.optimization_goal == 'maximize' for metric in metrics], dtype=bool)
+    values = metric_values[:, np.newaxis, :]
+    acc = thresholds_acc[np.newaxis]
+    nacc = thresholds_nacc[np.newaxis]
+
+    acceptable = np.where(maximize, acc <= values, acc >= values)
+    nearly_acceptable = np.where(
+        maximize,
+        (nacc <= values) & (values < acc),
+        (acc < values) & (values <= nacc)
+    )
+    return np.concatenate([acceptable, nearly_acceptable], axis=2).reshape(len(metric_values),
+                                                                            2 * thresholds_acc.size)
+
 def _compute_cluster_fit(
-        cluster_labels: list,
-        metrics_df: pd.DataFrame,
-        metrics: list[Metric], condition_fn
-) -> dict:
+        labels: np.ndarray,
+        conditions: np.ndarray,
+        metrics_count: int,
+        preference_sets_count: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Compute the cluster fitness for each cluster in metrics_df['dbscan'].
+    Compute the cluster fitness of every cluster for both regions and all preference sets in one grouped pass.
 
-    For each metric, the condition_fn returns whether the metric value of a model in the cluster
-    meets the condition of the region. The overall cluster fitness is the average of the mean values
-    of the conditions for all metrics.
+    The fitness of a cluster is the average over the metrics of the share of its models meeting the condition of
+    the region. Noise is not a cluster.
 
     Parameters:
-        df: DataFrame containing metric values and a 'dbscan' column.
-        metrics: List of metric names.
-        condition_fn: Function taking (df, metric) and returning a boolean Series.
+        labels: Cluster label of every model.
+        conditions: Condition matrix of the models as built by _build_condition_matrix.
+        metrics_count: Number of metrics.
+        preference_sets_count: Number of preference sets.
 
     Returns:
-        A dictionary mapping cluster labels to fitness values.
+        A tuple containing:
+            - The distinct cluster labels.
+            - The fitness of each cluster (rows) for the acceptable region and each preference set (columns).
+            - The fitness of each cluster (rows) for the nearly acceptable region and each preference set (columns).
     """
-    cluster_fit = {}
-    for label in cluster_labels:
-        cluster_data = metrics_df.loc[metrics_df['dbscan'] == label]
-        fits = {}
-        for metric in metrics:
-            condition = condition_fn(cluster_data, metric)
-            fits[metric] = condition.mean()
-
-        cluster_fit[label] = sum(fits.values()) / len(fits) if len(fits) > 0 else 0
-    return cluster_fit
+    clustered = labels != NOISE_LABEL
+    cluster_labels, cluster_idx, cluster_sizes = np.unique(labels[clustered], return_inverse=True, return_counts=True)
+    if len(cluster_labels) == 0 or metrics_count == 0:
+        no_fit = np.zeros((len(cluster_labels), preference_sets_count))
+        return cluster_labels, no_fit, no_fit.copy()
+
+    order = np.argsort(cluster_idx, kind='stable')
+    cluster_starts = np.concatenate([[0], np.cumsum(cluster_sizes)[:-1]])
+    met_counts = np.add.reduceat(conditions[clustered][order].astype(float), cluster_starts, axis=0)
+    met_ratios = (met_counts / cluster_sizes[:, np.newaxis]).reshape(len(cluster_labels), preference_sets_count,
+                                                                     2, metrics_count)
+    return (
+        cluster_labels,
+        met_ratios[:, :, 0].mean(axis=2),
+        met_ratios[:, :, 1].mean(axis=2)
+    )
 
 def _filter_metrics_df(
         metrics_df: pd.DataFrame,
@@ -145,83 +192,177 @@ def _filter_metrics_df(
     metrics_df.dropna(inplace=True)
     return metrics_df, metrics
 
-def cluster_models(
-        selected_models: List[ModelView],
-        preferences: dict[Metric, float]
-) -> Tuple[List[ModelView], List[ModelView], int, int, Optional[int]]:
+def _dominates(values: np.ndarray, other_values: np.ndarray) -> np.ndarray:
+    # element [i, j] tells whether values[i] dominates other_values[j]
+    return (np.all(values[:, np.newaxis] >= other_values[np.newaxis], axis=2)
+            & np.any(values[:, np.newaxis] > other_values[np.newaxis], axis=2))
+
+def _get_non_dominated(values: np.ndarray, block_size: int = 1024) -> np.ndarray:
     """
-    Cluster models using DBSCAN and classify them into "acceptable" and "nearly acceptable" groups
-    based on user performance preferences.
+    Find the points not dominated by any other point, larger values being better on every dimension.
 
-    Parameters:
-        selected_models (List[ModelView]): List of selected models.
-        preferences (Dict[str, Any]): Dictionary with performance preferences (tolerance factors per metric).
+    A point can only be dominated by points with a larger sum of values, hence the points are visited in blocks of
+    descending sums and only compared against the non-dominated points found so far and the points of their block.
+    """
+    unique_values, unique_idx = np.unique(values, axis=0, return_inverse=True)
+    order = np.argsort(-unique_values.sum(axis=1), kind='stable')
+    non_dominated = np.zeros(len(unique_values), dtype=bool)
+    front = np.empty((0, values.shape[1]))
+    for block_start in range(0, len(order), block_size):
+        block = order[block_start:block_start + block_size]
+        # points dominated by a point of the block are dominated by the front as well, unless the dominating point
+        # is not dominated by the front itself
+        block = block[~_dominates(front, unique_values[block]).any(axis=0)]
+        block = block[~_dominates(unique_values[block], unique_values[block]).any(axis=0)]
+        non_dominated[block] = True
+        front = np.vstack([front, unique_values[block]])
+    return non_dominated[unique_idx.reshape(-1)]
+
+def _prefilter_pareto_layers(
+        metrics_df: pd.DataFrame,
+        metrics: list[Metric],
+        layers_count: int
+) -> pd.DataFrame:
+    """
+    Keep only the models of the first Pareto layers (non-dominated sorting along the optimization goals of the
+    metrics) and the models within the clustering eps of them, so that the density of the clusters around the kept
+    models is preserved. The best value of every metric lies on the first layer, hence the region thresholds do not
+    change.
 
     Returns:
-        A tuple containing:
-            - List of acceptable models.
-            - List of nearly acceptable models.
-            - Distrust points for the requested metrics.
-            - Distrust points for the acceptable region.
-            - Distrust points for the nearly acceptable region (or None).
+        The filtered DataFrame.
     """
+    metric_values = metrics_df[metrics].to_numpy(dtype=float)
+    directions = np.array([1 if metric.optimization_goal == 'maximize' else -1 for metric in metrics])
+    oriented_values = metric_values * directions
+
+    kept = np.zeros(len(metrics_df), dtype=bool)
+    for _ in range(layers_count):
+        remaining = np.flatnonzero(~kept)
+        if len(remaining) == 0:
+            break
+        kept[remaining[_get_non_dominated(oriented_values[remaining])]] = True
+
+    dropped = np.flatnonzero(~kept)
+    if len(dropped) > 0 and kept.any():
+        # models at a distance of exactly eps are neighbors in DBSCAN, the bound of cKDTree queries is exclusive
+        distances, _ = cKDTree(metric_values[kept]).query(metric_values[dropped],
+                                                          distance_upper_bound=np.nextafter(CLUSTERING_EPS, np.inf))
+        kept[dropped[np.isfinite(distances)]] = True
+
+    current_app.logger.info(f"Pareto prefilter kept {kept.sum()} of {len(metrics_df)} models")
+    return metrics_df[kept]
+
+def _assign_models(
+        labels: np.ndarray,
+        model_positions: np.ndarray,
+        cluster_labels: np.ndarray,
+        cluster_fit_acc: np.ndarray,
+        cluster_fit_nacc: np.ndarray,
+        distrust_pts_metrics: int
+) -> ClusteringResult:
     majority_ratio = 0.51
 
-    raw_metrics_df = pd.DataFrame([model.metrics for model in selected_models])
-    metrics_df, metrics = _filter_metrics_df(raw_metrics_df, preferences)
-    used_metric_ratio = len(metrics) / len(preferences)
-    distrust_pts_metrics = _calculate_metrics_distrust_points(used_metric_ratio)
-
-    dbscan = DBSCAN(eps=0.05, min_samples=3, algorithm='kd_tree')
-    metrics_df['dbscan'] = dbscan.fit_predict(metrics_df)
-
-    thresholds_acc, thresholds_nacc = _calculate_thresholds(metrics_df, metrics, preferences)
-
-    # Retrieve distinct cluster labels and remove the noise label (-1) if present
-    distinct_labels = sorted(metrics_df['dbscan'].unique())
-    if -1 in distinct_labels:
-        distinct_labels.remove(-1)
-
-    if len(distinct_labels) == 0:
-        return [], [], distrust_pts_metrics, 0, 0
-
-    # Compute cluster fitness for the Acceptable region (threshold <= value)
-    cluster_fit_acc = _compute_cluster_fit(
-        distinct_labels,
-        metrics_df,
-        metrics,
-        lambda cluster_data, metric: (thresholds_acc[metric] <= cluster_data[metric] if metric.optimization_goal == 'maximize' else thresholds_acc[metric] >= cluster_data[metric])
-    )
-    clusters_acc = {label: fit for label, fit in cluster_fit_acc.items() if fit >= majority_ratio}
+    if len(cluster_labels) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), distrust_pts_metrics, 0, 0
 
     # Calculate the inside ratio for acceptable clusters (fraction of clusters with perfect fit)
-    inside_ratio_acc = sum(1 for fit in clusters_acc.values() if fit == 1) / len(clusters_acc) if len(clusters_acc) > 0 else 0
+    is_acc = cluster_fit_acc >= majority_ratio
+    inside_ratio_acc = (cluster_fit_acc[is_acc] == 1).mean() if is_acc.any() else 0
     distrust_pts_acc = _calculate_inside_cluster_distrust_points(inside_ratio_acc)
 
-    # Compute cluster fitness for the Nearly Acceptable region:
-    # condition: value is between the nearly acceptable threshold and the acceptable threshold.
-    cluster_fit_nacc = _compute_cluster_fit(
-        distinct_labels,
-        metrics_df,
-        metrics,
-        lambda cluster_data, metric: ((thresholds_nacc[metric] <= cluster_data[metric]) & (cluster_data[metric] < thresholds_acc[metric]) if metric.optimization_goal == 'maximize' else (thresholds_acc[metric] < cluster_data[metric]) & (cluster_data[metric] <= thresholds_nacc[metric]))
-    )
-    clusters_nacc = {label: fit for label, fit in cluster_fit_nacc.items() if fit >= majority_ratio}
-
-    if len(clusters_nacc) > 0:
-        inside_ratio_nacc = sum(1 for fit in clusters_nacc.values() if fit == 1) / len(clusters_nacc)
+    is_nacc = cluster_fit_nacc >= majority_ratio
+    if is_nacc.any():
+        inside_ratio_nacc = (cluster_fit_nacc[is_nacc] == 1).mean()
         distrust_pts_nacc = _calculate_inside_cluster_distrust_points(inside_ratio_nacc)
     else:
         distrust_pts_nacc = None
 
-    # Assign models to acceptable or nearly acceptable groups based on the cluster label.
-    acceptable_models: List[ModelView] = []
-    nearly_acceptable_models: List[ModelView] = []
-    for idx, row in metrics_df.iterrows():
-        label = row['dbscan']
-        if label in clusters_acc.keys():
-            acceptable_models.append(selected_models[idx])
-        elif label in clusters_nacc.keys():
-            nearly_acceptable_models.append(selected_models[idx])
+    # Assign models to acceptable or nearly acceptable groups based on the cluster label, acceptable clusters first.
+    in_acceptable = np.isin(labels, cluster_labels[is_acc])
+    in_nearly_acceptable = np.isin(labels, cluster_labels[is_nacc]) & ~in_acceptable
+    acceptable_models = model_positions[in_acceptable]
+    nearly_acceptable_models = model_positions[in_nearly_acceptable]
 
     return acceptable_models, nearly_acceptable_models, distrust_pts_metrics, distrust_pts_acc, distrust_pts_nacc
+
+def _get_clustering_sample_size(models_count: int, budget: Optional[QueryBudget]) -> Optional[int]:
+    sample_size: Optional[int] = current_app.config["CLUSTERING_SAMPLE_SIZE"]
+    degraded_sample_size: int = current_app.config["DEGRADED_CLUSTERING_SAMPLE_SIZE"]
+    if budget is not None and budget.is_running_short() and models_count > degraded_sample_size \
+            and (sample_size is None or sample_size > degraded_sample_size):
+        budget.degrade(f"Only a sample of {degraded_sample_size} models was clustered")
+        return degraded_sample_size
+    return sample_size
+
+def cluster_models_batch(
+        selected_models: SelectedModels,
+        preference_sets: List[dict[Metric, float]],
+        budget: Optional[QueryBudget] = None
+) -> List[ClusteringResult]:
+    """
+    Cluster models and classify them into "acceptable" and "nearly acceptable" groups for several preference sets
+    at once, see cluster_models.
+
+    The clustering only depends on the requested metrics, hence the models are clustered once per distinct set of
+    metrics. The thresholds and the cluster fitness of all preference sets with the same metrics are computed in
+    one vectorized pass. If the time budget runs short, at most DEGRADED_CLUSTERING_SAMPLE_SIZE models are clustered.
+
+    Returns:
+        The clustering result of every preference set, in the order of the preference sets.
+    """
+    preference_sets_by_metrics: Dict[Tuple[Metric, ...], List[int]] = {}
+    for preference_set_idx, preferences in enumerate(preference_sets):
+        preference_sets_by_metrics.setdefault(tuple(preferences.keys()), []).append(preference_set_idx)
+
+    results: List[Optional[ClusteringResult]] = [None] * len(preference_sets)
+    for requested_metrics, preference_set_idx in preference_sets_by_metrics.items():
+        metrics_df, metrics = _filter_metrics_df(selected_models.metrics, dict.fromkeys(requested_metrics))
+        used_metric_ratio = len(metrics) / len(requested_metrics)
+        distrust_pts_metrics = _calculate_metrics_distrust_points(used_metric_ratio)
+
+        if current_app.config["PARETO_PREFILTER_LAYERS"] is not None and len(metrics) > 0:
+            metrics_df = _prefilter_pareto_layers(metrics_df, metrics, current_app.config["PARETO_PREFILTER_LAYERS"])
+
+        preference_values = np.array([[preference_sets[idx][metric] for metric in metrics]
+                                      for idx in preference_set_idx], dtype=float)
+        thresholds_acc, thresholds_nacc = _calculate_thresholds(metrics_df, metrics, preference_values)
+
+        metric_values = metrics_df.to_numpy(dtype=float)
+        sample_size = _get_clustering_sample_size(len(metric_values), budget)
+        engine = create_clustering_engine(current_app.config["CLUSTERING_ENGINE"], CLUSTERING_EPS,
+                                          CLUSTERING_MIN_SAMPLES, sample_size, current_app.config["SAMPLING_SEED"])
+        labels = engine.fit_predict(metric_values)
+        conditions = _build_condition_matrix(metric_values, metrics, thresholds_acc, thresholds_nacc)
+        cluster_labels, cluster_fit_acc, cluster_fit_nacc = _compute_cluster_fit(labels, conditions, len(metrics),
+                                                                                 len(preference_set_idx))
+
+        model_positions = metrics_df.index.to_numpy()
+        for column, idx in enumerate(preference_set_idx):
+            results[idx] = _assign_models(labels, model_positions, cluster_labels, cluster_fit_acc[:, column],
+                                          cluster_fit_nacc[:, column], distrust_pts_metrics)
+    return results
+
+def cluster_models(
+        selected_models: SelectedModels,
+        preferences: dict[Metric, float],
+        budget: Optional[QueryBudget] = None
+) -> ClusteringResult:
+    """
+    Cluster models using density-based clustering (the CLUSTERING_ENGINE) and classify them into "acceptable" and "nearly acceptable" groups
+    based on user performance preferences.
+
+    Parameters:
+        selected_models (SelectedModels): Compact representation of the selected models.
+        preferences (Dict[str, Any]): Dictionary with performance preferences (tolerance factors per metric).
+        budget (QueryBudget): Time budget of the query, if the clustering may degrade when it runs short.
+
+    Returns:
+        A tuple containing:
+            - Positions of the acceptable models in the selected models.
+            - Positions of the nearly acceptable models in the selected models.
+            - Distrust points for the requested metrics.
+            - Distrust points for the acceptable region.
+            - Distrust points for the nearly acceptable region (or None).
+    """
+    return cluster_models_batch(selected_models, [preferences], budget)[0]
@@ -0,0 +1,223 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from sklearn.cluster import DBSCAN
+
+NOISE_LABEL = -1
+CELL_PAIRS_CHUNK_SIZE = 4_096
+SMALL_CELL_SIZE = 16
+
+
+class ClusteringEngine(ABC):
+    """
+    Density-based clustering of the metric values of models. Labels are non-negative cluster numbers, noise is
+    labelled with NOISE_LABEL.
+    """
+
+    @abstractmethod
+    def fit_predict(self, points: np.ndarray) -> np.ndarray:
+        pass
+
+
+class DbscanEngine(ClusteringEngine):
+    """
+    Exact DBSCAN. Its neighbor lists grow quadratically in dense regions, hence it is only suitable for a few
+    thousand models.
+    """
+
+    def __init__(self, eps: float, min_samples: int):
+        self._eps = eps
+        self._min_samples = min_samples
+
+    def fit_predict(self, points: np.ndarray) -> np.ndarray:
+        if len(points) == 0:
+            return np.empty(0, dtype=int)
+        return DBSCAN(eps=self._eps, min_samples=self._min_samples, algorithm='kd_tree').fit_predict(points)
+
+
+class GridDbscanEngine(ClusteringEngine):
+    """
+    Grid-based DBSCAN that avoids the neighbor lists of exact DBSCAN in dense regions.
+
+    The space is divided into cells with a diagonal of eps, hence all points of a cell are neighbors of each other
+    and all points of cells with at least min_samples points are core points without counting their neighbors. Only
+    the points of sparse cells count their neighbors. Core points of the same cell belong to the same cluster, two
+    cells are connected if any pair of their core points is within eps. Points that are not core points join the
+    cluster of the nearest core point within eps (border points) or are noise. Apart from the choice among several
+    clusters of a border point, the result equals exact DBSCAN.
+    """
+
+    def __init__(self, eps: float, min_samples: int):
+        self._eps = eps
+        self._min_samples = min_samples
+
+    @staticmethod
+    def _find_root(parents: np.ndarray, cell: int) -> int:
+        while parents[cell] != cell:
+            parents[cell] = parents[parents[cell]]
+            cell = parents[cell]
+        return cell
+
+    @staticmethod
+    def _compress(parents: np.ndarray) -> None:
+        # points every cell of the union-find directly to its root
+        while True:
+            grandparents = parents[parents]
+            if np.array_equal(grandparents, parents):
+                return
+            parents[:] = grandparents
+
+    @staticmethod
+    def _union(parents: np.ndarray, cell_pairs: np.ndarray) -> None:
+        # joins the trees of the given pairs of cells at once, the parents must be compressed
+        if len(cell_pairs) == 0:
+            return
+        roots, root_pairs = np.unique(parents[cell_pairs], return_inverse=True)
+        root_pairs = root_pairs.reshape(-1, 2)
+        graph = coo_matrix((np.ones(len(root_pairs)), (root_pairs[:, 0], root_pairs[:, 1])),
+                           shape=(len(roots), len(roots)))
+        _, components = connected_components(graph, directed=False)
+        # the smallest root of every component becomes the root of the others
+        component_roots = np.full(components.max() + 1, len(parents))
+        np.minimum.at(component_roots, components, roots)
+        parents[roots] = component_roots[components]
+
+    def _are_within_eps(self, cell_points: np.ndarray, cell_starts: np.ndarray, cell_pairs: np.ndarray) -> np.ndarray:
+        # tells for pairs of cells with few points whether any pair of their points is within eps, the points of
+        # every cell are padded to the size of the largest cell
+        cell_sizes = np.diff(cell_starts)
+        offsets = np.arange(cell_sizes[cell_pairs].max())
+        is_valid = offsets < cell_sizes[cell_pairs][:, :, np.newaxis]
+        point_idx = np.where(is_valid, cell_starts[cell_pairs][:, :, np.newaxis] + offsets,
+                             cell_starts[cell_pairs][:, :, np.newaxis])
+        first_points, second_points = cell_points[point_idx[:, 0]], cell_points[point_idx[:, 1]]
+        squared_distances = ((first_points[:, :, np.newaxis] - second_points[:, np.newaxis]) ** 2).sum(axis=3)
+        is_within_eps = (squared_distances <= self._eps ** 2) & is_valid[:, 0, :, np.newaxis] \
+            & is_valid[:, 1, np.newaxis]
+        return is_within_eps.any(axis=(1, 2))
+
+    def fit_predict(self, points: np.ndarray) -> np.ndarray:
+        labels = np.full(len(points), NOISE_LABEL, dtype=int)
+        if len(points) == 0:
+            return labels
+
+        # like DBSCAN, points at a distance of exactly eps are neighbors, the bound of cKDTree queries is exclusive
+        max_distance = np.nextafter(self._eps, np.inf)
+        dimensions = points.shape[1]
+        cell_size = self._eps / np.sqrt(dimensions)
+        cells = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64)
+        unique_cells, point_cells, cell_counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        point_cells = point_cells.reshape(-1)
+
+        is_core = cell_counts[point_cells] >= self._min_samples
+        sparse_points = np.flatnonzero(~is_core)
+        if len(sparse_points) > 0:
+            neighbor_counts = cKDTree(points).query_ball_point(points[sparse_points], r=self._eps, return_length=True)
+            is_core[sparse_points] = neighbor_counts >= self._min_samples
+        core_points = np.flatnonzero(is_core)
+        if len(core_points) == 0:
+            return labels
+
+        # points within eps are at most ceil(sqrt(d)) cells apart in every dimension
+        core_cells, core_point_cells = np.unique(point_cells[core_points], return_inverse=True)
+        core_point_cells = core_point_cells.reshape(-1)
+        candidate_pairs = cKDTree(unique_cells[core_cells]).query_pairs(
+            r=np.ceil(np.sqrt(dimensions)), p=np.inf, output_type='ndarray')
+        pair_cells = unique_cells[core_cells[candidate_pairs]]
+        cell_gaps = np.maximum(np.abs(pair_cells[:, 0] - pair_cells[:, 1]) - 1, 0)
+        min_distances = np.sqrt((cell_gaps.astype(float) ** 2).sum(axis=1)) * cell_size
+        is_candidate = min_distances <= self._eps
+        # close cells are visited first, so that most pairs of cells are connected already when they are visited
+        candidate_pairs = candidate_pairs[is_candidate][np.argsort(min_distances[is_candidate], kind='stable')]
+
+        # the core points are grouped by cell
+        order = np.argsort(core_point_cells, kind='stable')
+        cell_points = points[core_points[order]]
+        cell_starts = np.searchsorted(core_point_cells[order], np.arange(len(core_cells) + 1))
+        is_small_cell = np.diff(cell_starts) <= SMALL_CELL_SIZE
+        cell_trees: Dict[int, cKDTree] = {}
+
+        # connect the cells with core points within eps of each other with a union-find, the pairs of cells that are
+        # connected already are skipped in chunks and pairs of small cells are checked at once
+        parents = np.arange(len(core_cells))
+        for chunk_start in range(0, len(candidate_pairs), CELL_PAIRS_CHUNK_SIZE):
+            self._compress(parents)
+            chunk = candidate_pairs[chunk_start:chunk_start + CELL_PAIRS_CHUNK_SIZE]
+            chunk = chunk[parents[chunk[:, 0]] != parents[chunk[:, 1]]]
+            is_small_pair = is_small_cell[chunk].all(axis=1)
+            if is_small_pair.any():
+                small_pairs = chunk[is_small_pair]
+                self._union(parents, small_pairs[self._are_within_eps(cell_points, cell_starts, small_pairs)])
+            for first, second in chunk[~is_small_pair]:
+                first_root, second_root = self._find_root(parents, first), self._find_root(parents, second)
+                if first_root == second_root:
+                    continue
+                if second not in cell_trees:
+                    cell_trees[second] = cKDTree(cell_points[cell_starts[second]:cell_starts[second + 1]])
+                distances, _ = cell_trees[second].query(cell_points[cell_starts[first]:cell_starts[first + 1]],
+                                                        distance_upper_bound=max_distance)
+                if np.isfinite(distances).any():
+                    parents[second_root] = first_root
+        self._compress(parents)
+        _, cluster_labels = np.unique(parents, return_inverse=True)
+        labels[core_points] = cluster_labels.reshape(-1)[core_point_cells]
+
+        border_candidates = np.flatnonzero(~is_core)
+        if len(border_candidates) > 0:
+            distances, nearest = cKDTree(points[core_points]).query(points[border_candidates],
+                                                                   distance_upper_bound=max_distance)
+            is_border = np.isfinite(distances)
+            labels[border_candidates[is_border]] = labels[core_points[nearest[is_border]]]
+        return labels
+
+
+class SubsamplingEngine(ClusteringEngine):
+    """
+    Clusters a random sample of at most sample_size points with another engine and assigns every remaining point to
+    the cluster of the nearest clustered sample point within eps, noise otherwise.
+    """
+
+    def __init__(self, engine: ClusteringEngine, sample_size: int, eps: float, seed: int = 0):
+        self._engine = engine
+        self._sample_size = sample_size
+        self._eps = eps
+        self._seed = seed
+
+    def fit_predict(self, points: np.ndarray) -> np.ndarray:
+        if len(points) <= self._sample_size:
+            return self._engine.fit_predict(points)
+
+        sample = np.random.default_rng(self._seed).choice(len(points), size=self._sample_size, replace=False)
+        labels = np.full(len(points), NOISE_LABEL, dtype=int)
+        labels[sample] = self._engine.fit_predict(points[sample])
+
+        clustered = sample[labels[sample] != NOISE_LABEL]
+        remaining = np.setdiff1d(np.arange(len(points)), sample)
+        if len(clustered) == 0:
+            return labels
+        # like DBSCAN, points at a distance of exactly eps are neighbors, the bound of cKDTree queries is exclusive
+        distances, nearest = cKDTree(points[clustered]).query(points[remaining],
+                                                              distance_upper_bound=np.nextafter(self._eps, np.inf))
+        is_assigned = np.isfinite(distances)
+        labels[remaining[is_assigned]] = labels[clustered[nearest[is_assigned]]]
+        return labels
+
+
+def create_clustering_engine(name: str, eps: float, min_samples: int, sample_size: Optional[int] = None,
+                             seed: int = 0) -> ClusteringEngine:
+    """
+    Create the clustering engine with the given name ("dbscan" or "grid"), optionally clustering a subsample only.
+    """
+    if name == "dbscan":
+        engine = DbscanEngine(eps, min_samples)
+    elif name == "grid":
+        engine = GridDbscanEngine(eps, min_samples)
+    else:
+        raise ValueError(f"Unknown clustering engine: {name}")
+    if sample_size is not None:
+        engine = SubsamplingEngine(engine, sample_size, eps, seed)
+    return engine
@@ -1,41 +1,259 @@
+import asyncio
 import time
+from typing import Dict, List, Optional, Tuple
 
-from beanie import WriteRules
+import numpy as np
+from beanie import PydanticObjectId, WriteRules
+from pymongo.errors import ExecutionTimeout
 from quart import current_app
 
-from assistml.model_recommender.cluster import cluster_models
-from assistml.model_recommender.query import handle_query
+from assistml.model_recommender.cluster import ClusteringResult, cluster_models, cluster_models_batch
+from assistml.model_recommender.query import build_query_cache_key, find_cached_query, handle_query
+from assistml.model_recommender.query_budget import QueryBudget
+from assistml.model_recommender.query_operations import kill_query_operations, tag_query_operations
 from assistml.model_recommender.ranking import Report
 from assistml.model_recommender.ranking.report import DistrustPointCategory
 from assistml.model_recommender.select import select_models_on_dataset_similarity
-from common.dto import ReportRequestDto
+from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+from assistml.model_recommender.session import RecommendationSession, get_session, store_session
+from common.data import Query
+from common.data.model import Metric
+from common.data.projection.model import ModelView
+from common.dto import BatchReportRequestDto, BatchReportResponseDto, ReportRequestDto, ReportResponseDto
+from common.utils.lru_cache import LRUCache
+from common.utils.single_flight import SingleFlight
 
+DEFAULT_TOP_K, DEFAULT_TOP_N, DEFAULT_TOP_M = 5, 3, 3
+DEGRADED_TOP_K, DEGRADED_TOP_N, DEGRADED_TOP_M = 2, 1, 1
+DEGRADED_REPORT_MODEL_LIMIT = 1_000
 
-async def generate_report(request: ReportRequestDto):
-    """
-    Generate a report based on the given request.
-    """
-    start_time = time.time()
+_report_cache: Optional[LRUCache[str, ReportResponseDto]] = None
+_report_flights: SingleFlight[str, ReportResponseDto] = SingleFlight()
 
-    query = await handle_query(request)
-    report = Report(query)
 
-    models, similarity_level = await select_models_on_dataset_similarity(query)
-    if len(models) == 0:
-        raise ValueError("No models found")
+async def _abandon_query(query_id: PydanticObjectId):
+    await kill_query_operations(query_id)
+    # killed operations may have written scratch data after the cleanup was scheduled
+    cleanup_scheduler.schedule_similar_models(query_id)
+
+def _get_report_cache() -> LRUCache[str, ReportResponseDto]:
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = LRUCache(current_app.config["REPORT_CACHE_SIZE"], current_app.config["REPORT_CACHE_TTL_SECONDS"])
+    return _report_cache
+
+def _to_response(query: Query) -> ReportResponseDto:
+    return ReportResponseDto(
+        summary=query.report.summary,
+        acceptable_models=query.report.acceptable_models,
+        nearly_acceptable_models=query.report.nearly_acceptable_models,
+        query_id=str(query.id)
+    )
 
-    report.set_distrust_points(DistrustPointCategory.DATASET_SIMILARITY, 3-similarity_level)
+async def _get_model_views(session: RecommendationSession, acceptable_model_idx: np.ndarray,
+                           nearly_acceptable_model_idx: np.ndarray,
+                           budget: QueryBudget) -> Tuple[List[ModelView], List[ModelView]]:
+    # the documents are fetched within the budget, if it is exhausted the nearly acceptable models are dropped first
+    # and a bounded number of acceptable models is fetched without a time limit
+    try:
+        acceptable_models = await session.get_model_views(acceptable_model_idx, budget.get_max_time_ms())
+    except ExecutionTimeout:
+        budget.degrade("Nearly acceptable models were not reported")
+        if len(acceptable_model_idx) > DEGRADED_REPORT_MODEL_LIMIT:
+            budget.degrade(f"Only {DEGRADED_REPORT_MODEL_LIMIT} of {len(acceptable_model_idx)} acceptable models "
+                           f"were ranked")
+        return await session.get_model_views(acceptable_model_idx[:DEGRADED_REPORT_MODEL_LIMIT]), []
+
+    try:
+        nearly_acceptable_models = await session.get_model_views(nearly_acceptable_model_idx,
+                                                                 budget.get_max_time_ms())
+    except ExecutionTimeout:
+        budget.degrade("Nearly acceptable models were not reported")
+        nearly_acceptable_models = []
+    return acceptable_models, nearly_acceptable_models
+
+async def _build_report(query: Query, session: RecommendationSession, clustering_result: ClusteringResult,
+                        budget: QueryBudget) -> None:
+    # ranks the selected models of the session that were clustered according to the preferences of the query
+    report = Report(query)
+    report.set_distrust_points(DistrustPointCategory.DATASET_SIMILARITY, 3-session.similarity_level)
+    report.set_similarity_tolerances(session.similarity_tolerances)
 
-    acceptable_models, nearly_acceptable_models, distrust_pts_metrics, distrust_pts_acc, distrust_pts_nacc = cluster_models(models, query.preferences)
+    acceptable_model_idx, nearly_acceptable_model_idx, distrust_pts_metrics, distrust_pts_acc, distrust_pts_nacc = clustering_result
+    acceptable_models, nearly_acceptable_models = await _get_model_views(
+        session, acceptable_model_idx, nearly_acceptable_model_idx, budget)
     await report.set_models(acceptable_models, nearly_acceptable_models)
     report.set_distrust_points(DistrustPointCategory.METRICS_SUPPORT, distrust_pts_metrics)
     report.set_distrust_points(DistrustPointCategory.CLUSTER_INSIDE_RATIO_ACC, distrust_pts_acc)
     report.set_distrust_points(DistrustPointCategory.CLUSTER_INSIDE_RATIO_NACC, distrust_pts_nacc or 0)
 
-    query.report = await report.generate_report()
-    await query.save(link_rule=WriteRules.DO_NOTHING)
+    top_k, top_n, top_m = DEFAULT_TOP_K, DEFAULT_TOP_N, DEFAULT_TOP_M
+    if budget.is_running_short():
+        top_k, top_n, top_m = DEGRADED_TOP_K, DEGRADED_TOP_N, DEGRADED_TOP_M
+        budget.degrade(f"Only the top {top_k} implementations with {top_n} datasets and {top_m} configurations "
+                       f"each are reported")
+    # the degradations of the selection apply to all reports of the session, also to those built with a new budget
+    report.set_degradations(list(dict.fromkeys(session.degradations + budget.get_degradations())))
+    query.report = await report.generate_report(top_k, top_n, top_m)
+
+async def _create_session(query: Query, budget: QueryBudget) -> RecommendationSession:
+    models, similarity_level, similarity_tolerances = await select_models_on_dataset_similarity(query, budget)
+    if len(models) == 0:
+        raise ValueError("No models found")
+    return RecommendationSession(query.id, models, similarity_level, similarity_tolerances, budget.get_degradations())
+
+async def _generate_report(request: ReportRequestDto, cache_key: str) -> Query:
+    """
+    Generate a report based on the given request and store it on the query. Complete reports are stored with the
+    cache key, so that identical requests can be served with the stored report. The selected models are kept in a
+    recommendation session of the query, so that the report can be re-ranked for other preferences.
+
+    If QUERY_TIME_BUDGET_SECONDS is set, the steps degrade their results when the budget runs short and the report
+    is annotated with the applied degradations. If the request is cancelled, e.g. because the client disconnected,
+    the MongoDB operations of the query are killed and its scratch data is deleted.
+    """
+    start_time = time.time()
+    budget = QueryBudget(current_app.config["QUERY_TIME_BUDGET_SECONDS"])
+
+    query = await handle_query(request)
+
+    tag_query_operations(query.id)
+    try:
+        session = await _create_session(query, budget)
+        store_session(session)
+        await _build_report(query, session, cluster_models(session.models, query.preferences, budget), budget)
+        if not budget.get_degradations():
+            query.cache_key = cache_key
+        await query.save(link_rule=WriteRules.DO_NOTHING)
+    except asyncio.CancelledError:
+        current_app.logger.info(f"Query {query.id} was cancelled")
+        current_app.add_background_task(_abandon_query, query.id)
+        raise
 
     end_time = time.time()
     time_taken = end_time - start_time
     current_app.logger.info(f"Time taken for end to end execution {time_taken}")
-    return query.report
+    return query
+
+async def generate_report(request: ReportRequestDto) -> ReportResponseDto:
+    """
+    Generate a report based on the given request.
+
+    Identical requests (same dataset, task type and preferences on the same dataset and model corpora) share their
+    report: concurrent requests are coalesced into a single computation, recent reports are kept in memory for
+    REPORT_CACHE_TTL_SECONDS (up to REPORT_CACHE_SIZE reports) and older ones are read from the stored queries.
+    Best-effort reports of queries that ran out of time are not shared.
+    """
+    key = await build_query_cache_key(request)
+    report_cache = _get_report_cache()
+    response = report_cache.get(key)
+    if response is not None:
+        current_app.logger.info("Serving cached report of an identical request")
+        return response
+    if _report_flights.is_in_flight(key):
+        current_app.logger.info("Identical request in flight, waiting for its report...")
+
+    async def generate_and_cache_report() -> ReportResponseDto:
+        query = await find_cached_query(key)
+        if query is not None:
+            current_app.logger.info(f"Serving stored report of identical query {query.id}")
+        else:
+            query = await _generate_report(request, key)
+        generated_response = _to_response(query)
+        if query.cache_key is not None:
+            report_cache.put(key, generated_response)
+        return generated_response
+
+    return await _report_flights.run(key, generate_and_cache_report)
+
+async def get_stored_report(query_id: PydanticObjectId) -> Optional[ReportResponseDto]:
+    """
+    Get the stored report of a query.
+
+    Returns:
+        The report, or None if the query does not exist or its report is not generated yet.
+    """
+    query = await Query.get(query_id)
+    if query is None or query.report is None:
+        return None
+    return _to_response(query)
+
+async def rerank_report(query_id: PydanticObjectId, preferences: Dict[Metric, float]) -> Optional[ReportResponseDto]:
+    """
+    Generate the report of a previous query for other preferences. The re-ranked report is stored on a new query.
+
+    The models selected for the previous query are reused from its recommendation session, only the clustering and
+    the ranking are repeated. If the session was evicted, the models are selected again.
+
+    Returns:
+        The report, or None if the previous query does not exist.
+    """
+    start_time = time.time()
+    budget = QueryBudget(current_app.config["QUERY_TIME_BUDGET_SECONDS"])
+
+    previous_query = await Query.get(query_id)
+    if previous_query is None:
+        return None
+    query = Query(
+        made_at=time.strftime('%Y%m%d-%H%M'),
+        task_type=previous_query.task_type,
+        dataset=previous_query.dataset,
+        semantic_types=previous_query.semantic_types,
+        preferences=preferences
+    )
+    await query.insert()
+
+    tag_query_operations(query.id)
+    try:
+        session = get_session(previous_query.id)
+        if session is not None:
+            current_app.logger.info(f"Re-ranking the models of query {previous_query.id}")
+            store_session(session, [query.id])
+        else:
+            current_app.logger.info(f"No session for query {previous_query.id}, selecting the models again...")
+            session = await _create_session(query, budget)
+            store_session(session)
+        await _build_report(query, session, cluster_models(session.models, query.preferences, budget), budget)
+        await query.save(link_rule=WriteRules.DO_NOTHING)
+    except asyncio.CancelledError:
+        current_app.logger.info(f"Query {query.id} was cancelled")
+        current_app.add_background_task(_abandon_query, query.id)
+        raise
+
+    current_app.logger.info(f"Time taken for re-ranking {time.time() - start_time}")
+    return _to_response(query)
+
+async def generate_batch_reports(request: BatchReportRequestDto) -> BatchReportResponseDto:
+    """
+    Generate the reports of several preference sets for the same dataset and task type, e.g. for preference sweeps.
+
+    The models are selected once and shared by all reports, which are stored on a query per preference set. The
+    models are clustered once per distinct set of requested metrics and the thresholds and cluster fitness of all
+    preference sets are evaluated together.
+    """
+    start_time = time.time()
+    budget = QueryBudget(current_app.config["QUERY_TIME_BUDGET_SECONDS"])
+
+    report_requests = request.to_report_requests()
+    queries: List[Query] = [await handle_query(report_request) for report_request in report_requests]
+
+    # the selection runs as the first query, its operations and scratch data are tagged with its id
+    tag_query_operations(queries[0].id)
+    try:
+        session = await _create_session(queries[0], budget)
+        store_session(session, [query.id for query in queries[1:]])
+        clustering_results = cluster_models_batch(session.models, [query.preferences for query in queries], budget)
+        for report_request, query, clustering_result in zip(report_requests, queries, clustering_results):
+            # the degradations of one report must not carry over to the next ones
+            report_budget = budget.fork()
+            await _build_report(query, session, clustering_result, report_budget)
+            if not report_budget.get_degradations():
+                query.cache_key = await build_query_cache_key(report_request)
+            await query.save(link_rule=WriteRules.DO_NOTHING)
+    except asyncio.CancelledError:
+        current_app.logger.info(f"Batch of queries {queries[0].id} to {queries[-1].id} was cancelled")
+        current_app.add_background_task(_abandon_query, queries[0].id)
+        raise
+
+    current_app.logger.info(f"Time taken for {len(queries)} reports {time.time() - start_time}")
+    return BatchReportResponseDto(reports=[_to_response(query) for query in queries])
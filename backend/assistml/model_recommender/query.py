@@ -1,9 +1,12 @@
+import hashlib
+import json
 import time
+from typing import Optional
 
 from beanie import Link
 from quart import current_app
 
-from common.data import Dataset, Query
+from common.data import CorpusVersion, Dataset, Model, Query
 from common.dto import ReportRequestDto
 
 
@@ -28,3 +31,25 @@ async def handle_query(request: ReportRequestDto) -> Query:
     )
     await query.insert()
     return query
+
+async def build_query_cache_key(request: ReportRequestDto) -> str:
+    """
+    Build the key of a query request. Requests with the same dataset, task type and preferences on the same versions
+    of the dataset and model corpora get the same report, hence the same key.
+    """
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    models_version = await CorpusVersion.get_version(Model.get_collection_name())
+    key_data = json.dumps({
+        "datasetId": request.dataset_id,
+        "taskType": request.task_type.value,
+        "preferences": sorted((metric.value, round(float(value), 6)) for metric, value in request.preferences.items()),
+        "corpusVersion": corpus_version,
+        "modelsVersion": models_version
+    })
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+async def find_cached_query(cache_key: str) -> Optional[Query]:
+    """
+    Find the most recent query with the given key and a complete report.
+    """
+    return await Query.find({"cache_key": cache_key}).sort("-_id").first_or_none()
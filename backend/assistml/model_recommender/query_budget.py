@@ -0,0 +1,66 @@
+import time
+from typing import List, Optional
+
+from quart import current_app
+
+SHORT_BUDGET_RATIO = 0.5
+MIN_OPERATION_TIME_MS = 1_000
+
+
+class QueryBudget:
+    """
+    Time budget of a query, carried through selection, clustering and ranking.
+
+    The steps check whether the budget runs short (less than SHORT_BUDGET_RATIO of it is left) and degrade their
+    results instead of exceeding it. Applied degradations are recorded, so that they can be reported. MongoDB
+    operations are bounded by the remaining time, but get at least MIN_OPERATION_TIME_MS to be able to return a
+    best-effort result. A budget without a time limit never runs short.
+    """
+
+    _total_seconds: Optional[float]
+    _deadline: Optional[float]
+    _degradations: List[str]
+
+    def __init__(self, total_seconds: Optional[float]):
+        self._total_seconds = total_seconds
+        self._deadline = time.monotonic() + total_seconds if total_seconds is not None else None
+        self._degradations = []
+
+    def get_remaining_seconds(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def is_running_short(self) -> bool:
+        if self._deadline is None:
+            return False
+        return self.get_remaining_seconds() < self._total_seconds * SHORT_BUDGET_RATIO
+
+    def get_max_time_ms(self) -> Optional[int]:
+        """
+        Returns:
+            The maxTimeMS for the next MongoDB operation, None if the budget has no time limit.
+        """
+        if self._deadline is None:
+            return None
+        return max(MIN_OPERATION_TIME_MS, int(self.get_remaining_seconds() * 1000))
+
+    def degrade(self, description: str) -> None:
+        if description in self._degradations:
+            return
+        current_app.logger.warning(f"Query time budget running short: {description}")
+        self._degradations.append(description)
+
+    def fork(self) -> "QueryBudget":
+        """
+        Returns:
+            A budget with the same deadline and the degradations applied so far, which records its further
+            degradations separately, e.g. for one of several reports of a query.
+        """
+        budget = QueryBudget(self._total_seconds)
+        budget._deadline = self._deadline
+        budget._degradations = list(self._degradations)
+        return budget
+
+    def get_degradations(self) -> List[str]:
+        return list(self._degradations)
@@ -0,0 +1,47 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from quart import current_app
+
+from common.data import Query
+
+_operation_comment: ContextVar[Optional[str]] = ContextVar("operation_comment", default=None)
+
+
+def _get_query_operation_comment(query_id: ObjectId) -> str:
+    return f"assistml:query:{query_id}"
+
+def tag_query_operations(query_id: ObjectId) -> None:
+    """
+    Tag all MongoDB operations of the current request (and the tasks it spawns) with the id of the query, so that
+    they can be found and killed if the query is cancelled.
+    """
+    _operation_comment.set(_get_query_operation_comment(query_id))
+
+def get_operation_comment() -> Optional[str]:
+    return _operation_comment.get()
+
+async def kill_query_operations(query_id: ObjectId) -> int:
+    """
+    Kill the server-side MongoDB operations of a query that are still running, e.g. after the client disconnected.
+    Only operations of the backend's own database user are considered.
+
+    Returns:
+        The number of killed operations.
+    """
+    admin_database = Query.get_motor_collection().database.client.admin
+    try:
+        operations = await admin_database.aggregate([
+            {"$currentOp": {"allUsers": False, "idleConnections": False}},
+            {"$match": {"command.comment": _get_query_operation_comment(query_id)}},
+            {"$project": {"opid": 1}}
+        ]).to_list(None)
+        for operation in operations:
+            await admin_database.command("killOp", op=operation["opid"])
+    except PyMongoError as e:
+        current_app.logger.warning(f"Could not kill the operations of cancelled query {query_id}: {e}")
+        return 0
+    current_app.logger.info(f"Killed {len(operations)} operations of cancelled query {query_id}")
+    return len(operations)
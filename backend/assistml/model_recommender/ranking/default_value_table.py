@@ -0,0 +1,45 @@
+from typing import Any, Dict, Iterable
+
+from beanie import PydanticObjectId
+
+from common.data import Implementation
+from common.data.implementation import Parameter
+
+
+class DefaultValueTable:
+    """
+    Lookup table of the parameters (and their default values) of implementations, built once from prefetched
+    implementations, so that the hyperparameters of models can be checked for default values without awaiting the
+    document cache for every value.
+    """
+
+    _titles: Dict[PydanticObjectId, str]
+    _parameters: Dict[PydanticObjectId, Dict[str, Parameter]]
+
+    def __init__(self, implementations: Iterable[Implementation] = ()):
+        self._titles = {}
+        self._parameters = {}
+        for implementation in implementations:
+            self.add_implementation(implementation)
+
+    def add_implementation(self, implementation: Implementation) -> None:
+        self._titles[implementation.id] = implementation.title
+        self._parameters[implementation.id] = implementation.parameters
+
+    def get_parameter(self, implementation_id: PydanticObjectId, hyperparameter_name: str) -> Parameter:
+        if implementation_id not in self._parameters:
+            raise ValueError(f"Implementation {implementation_id} not found in the default value table")
+        parameters = self._parameters[implementation_id]
+        if hyperparameter_name not in parameters:
+            raise ValueError(f"Hyperparameter {hyperparameter_name} not found in implementation {self._titles[implementation_id]}")
+        return parameters[hyperparameter_name]
+
+    def is_default_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any) -> bool:
+        """
+        Check whether the (stored) value of a hyperparameter is its default value. Flags without a default value are
+        never default.
+        """
+        parameter = self.get_parameter(implementation_id, hyperparameter_name)
+        if parameter.type == "flag" and parameter.default_value is None:
+            return False
+        return value == parameter.default_value
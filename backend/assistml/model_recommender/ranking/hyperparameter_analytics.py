@@ -1,42 +1,36 @@
 from email.policy import default
-from typing import Dict, Any, ForwardRef
+from typing import Dict, Any, ForwardRef, Iterable, Tuple
 
 from beanie import PydanticObjectId
 
 from assistml.model_recommender.ranking.standardizer import Standardizer
 from common.data import Implementation
-from common.utils.document_cache import DocumentCache
 
 HyperparameterConfiguration = ForwardRef("HyperparameterConfiguration")
+ConfigurationKey = Tuple[Tuple[PydanticObjectId, Tuple[Tuple[str, Any], ...]], ...]
 
 
 class HyperparameterAnalytics:
 
     _implementation: Implementation
-    _document_cache: DocumentCache
     _standardizers: Dict[PydanticObjectId, Dict[str, Standardizer]]
     _hyperparameter_values: Dict[PydanticObjectId, Dict[str, list]]
+    _standardized_values: Dict[PydanticObjectId, Dict[str, Dict[Tuple[type, Any], Any]]]
     _are_standardizers_fitted: bool
+    _fit_count: int
+    _interned_keys: Dict[ConfigurationKey, ConfigurationKey]
 
-    def __init__(self, implementation: Implementation, document_cache: DocumentCache):
+    def __init__(self, implementation: Implementation):
         self._implementation = implementation
-        self._document_cache = document_cache
         self._standardizers = {}
         self._hyperparameter_values = {}
+        self._standardized_values = {}
         self._are_standardizers_fitted = False
+        self._fit_count = 0
+        self._interned_keys = {}
 
-    async def _is_default_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any) -> bool:
-        parameter_implementation = await self._document_cache.get_implementation(implementation_id)
-        if hyperparameter_name not in parameter_implementation.parameters:
-            raise ValueError(f"Hyperparameter {hyperparameter_name} not found in implementation {parameter_implementation.title}")
-        implementation_parameter = parameter_implementation.parameters[hyperparameter_name]
-        if implementation_parameter.type == "flag" and implementation_parameter.default_value is None:
-            return False
-        return value == implementation_parameter.default_value
-
-    async def add_hyperparameter_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any):
-        if await self._is_default_value(implementation_id, hyperparameter_name, value):
-            return  # do not store default values
+    def add_hyperparameter_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any):
+        # configurations hold non-default values only, see HyperparameterConfiguration.from_setup
         if implementation_id not in self._hyperparameter_values:
             self._hyperparameter_values[implementation_id] = {}
             self._standardizers[implementation_id] = {}
@@ -46,21 +40,42 @@ class HyperparameterAnalytics:
         self._hyperparameter_values[implementation_id][hyperparameter_name].append(value)
         self._are_standardizers_fitted = False
 
-    async def add_configuration(self, configuration: HyperparameterConfiguration):
-        for implementation_id, hyperparameters in configuration.get_raw_configuration().items():
-            for hyperparameter_name, value in hyperparameters.items():
-                await self.add_hyperparameter_value(implementation_id, hyperparameter_name, value)
+    def add_configurations(self, configurations: Iterable[HyperparameterConfiguration]):
+        for configuration in configurations:
+            for implementation_id, hyperparameters in configuration.get_raw_configuration().items():
+                for hyperparameter_name, value in hyperparameters.items():
+                    self.add_hyperparameter_value(implementation_id, hyperparameter_name, value)
 
     def fit_standardizers(self):
+        """
+        Fit the standardizers and standardize all stored values at once, so that standardizing the values of the
+        configurations afterwards only takes a lookup.
+        """
+        self._standardized_values = {}
         for implementation_id, hyperparameters in self._hyperparameter_values.items():
+            self._standardized_values[implementation_id] = {}
             for hyperparameter_name, values in hyperparameters.items():
-                self._standardizers[implementation_id][hyperparameter_name].fit(values)
+                standardizer = self._standardizers[implementation_id][hyperparameter_name]
+                standardizer.fit(values)
+                # keyed by type as well, as equal values of different types (e.g. 1 and True) may be cleaned differently
+                standardized_values: Dict[Tuple[type, Any], Any] = {}
+                for value, standardized_value in zip(values, standardizer.transform(list(values))):
+                    try:
+                        standardized_values.setdefault((type(value), value), standardized_value)
+                    except TypeError:
+                        pass  # unhashable values are standardized on demand
+                self._standardized_values[implementation_id][hyperparameter_name] = standardized_values
         self._are_standardizers_fitted = True
+        self._fit_count += 1
+        self._interned_keys = {}
 
     def standardize_hyperparameter_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any) -> Any:
         if not self._are_standardizers_fitted:
             raise ValueError("Standardizers are not fitted. Call fit_standardizers() first.")
-        return self._standardizers[implementation_id][hyperparameter_name].transform(value)
+        try:
+            return self._standardized_values[implementation_id][hyperparameter_name][(type(value), value)]
+        except (KeyError, TypeError):
+            return self._standardizers[implementation_id][hyperparameter_name].transform(value)
 
     def reverse_standardize_hyperparameter_value(self, implementation_id: PydanticObjectId, hyperparameter_name: str, value: Any) -> Any:
         if not self._are_standardizers_fitted:
@@ -69,3 +84,14 @@ class HyperparameterAnalytics:
 
     def are_standardizers_fitted(self) -> bool:
         return self._are_standardizers_fitted
+
+    def get_fit_count(self) -> int:
+        return self._fit_count
+
+    def intern_configuration_key(self, key: ConfigurationKey) -> ConfigurationKey:
+        """
+        Returns:
+            The canonical instance of the given standardized configuration key, so that equal keys of the
+            configurations of this implementation are the same object.
+        """
+        return self._interned_keys.setdefault(key, key)
@@ -1,36 +1,54 @@
 from collections import OrderedDict
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
+from beanie import Link
 from bson import ObjectId
 
-from assistml.model_recommender.ranking.hyperparameter_analytics import HyperparameterAnalytics
+from assistml.model_recommender.ranking.default_value_table import DefaultValueTable
+from assistml.model_recommender.ranking.hyperparameter_analytics import ConfigurationKey, HyperparameterAnalytics
 from common.data.model import Setup
-from common.utils.document_cache import DocumentCache
 
 
 class HyperparameterConfiguration:
+    """
+    Non-default hyperparameter values of a model, ordered by implementation and name.
+
+    Once the standardizers are fitted, configurations are compared by their standardized key: a tuple of the
+    standardized values, computed once per fit, interned by the hyperparameter analytics and hashed once, so that
+    grouping models by configuration only takes dictionary operations.
+    """
     _configuration: OrderedDict[ObjectId, OrderedDict[str, Any]]
     _hyperparameter_analytics: HyperparameterAnalytics
+    _standardized_key: Optional[ConfigurationKey]
+    _standardized_key_hash: Optional[int]
+    _standardized_key_fit_count: Optional[int]
+    _representational_configuration: Optional[OrderedDict[ObjectId, OrderedDict[str, Any]]]
+    _representational_configuration_fit_count: Optional[int]
 
     def __init__(self, configuration: Dict[ObjectId, Dict[str, Any]], hyperparameter_analytics: HyperparameterAnalytics):
         self._configuration = HyperparameterConfiguration.order_configuration(configuration)
         self._hyperparameter_analytics = hyperparameter_analytics
+        self._standardized_key = None
+        self._standardized_key_hash = None
+        self._standardized_key_fit_count = None
+        self._representational_configuration = None
+        self._representational_configuration_fit_count = None
 
     @classmethod
-    async def from_setup(cls, setup: Setup, document_cache: DocumentCache, hyperparameter_analytics: HyperparameterAnalytics) -> "HyperparameterConfiguration":
+    def from_setup(cls, setup: Setup, default_value_table: DefaultValueTable, hyperparameter_analytics: HyperparameterAnalytics) -> "HyperparameterConfiguration":
         configuration: Dict[ObjectId, Dict[str, Any]] = {}
         for hyperparameter in setup.hyper_parameters:
-            parameter_implementation = await document_cache.get_implementation(hyperparameter.implementation)
-            if hyperparameter.name not in parameter_implementation.parameters:
-                raise ValueError(f"Hyperparameter {hyperparameter.name} not found in implementation {parameter_implementation.title}")
-            if hyperparameter.value is not None and hyperparameter.value == parameter_implementation.parameters[hyperparameter.name].default_value:
+            implementation = hyperparameter.implementation
+            implementation_id = implementation.to_ref().id if isinstance(implementation, Link) else implementation.id
+            parameter = default_value_table.get_parameter(implementation_id, hyperparameter.name)
+            if hyperparameter.value is not None and hyperparameter.value == parameter.default_value:
                 continue  # do not store default values
-            if parameter_implementation.id not in configuration:
-                configuration[parameter_implementation.id] = {}
-            if hyperparameter.data_type == "flag":
-                configuration[parameter_implementation.id][hyperparameter.name] = True
-            else:
-                configuration[parameter_implementation.id][hyperparameter.name] = hyperparameter.value
+            value = True if hyperparameter.data_type == "flag" else hyperparameter.value
+            if default_value_table.is_default_value(implementation_id, hyperparameter.name, value):
+                continue
+            if implementation_id not in configuration:
+                configuration[implementation_id] = {}
+            configuration[implementation_id][hyperparameter.name] = value
         return cls(configuration, hyperparameter_analytics)
 
     @staticmethod
@@ -41,25 +59,42 @@ class HyperparameterConfiguration:
             sorted_configuration[implementation_id] = OrderedDict(sorted(configuration[implementation_id].items(), key=lambda x: x[0]))
         return sorted_configuration
 
-    def get_standardized_configuration(self) -> OrderedDict[ObjectId, OrderedDict[str, Any]]:
+    def get_standardized_key(self) -> ConfigurationKey:
         if not self._hyperparameter_analytics.are_standardizers_fitted():
             raise ValueError("Standardizers are not fitted. Call fit_standardizers() first.")
-        standardized_configuration = OrderedDict()
-        for implementation_id, hyperparameters in self._configuration.items():
-            standardized_configuration[implementation_id] = OrderedDict()
-            for name, value in hyperparameters.items():
-                standardized_configuration[implementation_id][name] = self._hyperparameter_analytics.standardize_hyperparameter_value(implementation_id, name, value)
-        return standardized_configuration
+        fit_count = self._hyperparameter_analytics.get_fit_count()
+        if self._standardized_key_fit_count != fit_count:
+            key = tuple(
+                (implementation_id, tuple(
+                    (name, self._hyperparameter_analytics.standardize_hyperparameter_value(implementation_id, name, value))
+                    for name, value in hyperparameters.items()
+                ))
+                for implementation_id, hyperparameters in self._configuration.items()
+            )
+            self._standardized_key = self._hyperparameter_analytics.intern_configuration_key(key)
+            self._standardized_key_hash = hash(self._standardized_key)
+            self._standardized_key_fit_count = fit_count
+        return self._standardized_key
+
+    def get_standardized_configuration(self) -> OrderedDict[ObjectId, OrderedDict[str, Any]]:
+        return OrderedDict(
+            (implementation_id, OrderedDict(hyperparameters))
+            for implementation_id, hyperparameters in self.get_standardized_key()
+        )
 
     def get_representational_configuration(self) -> OrderedDict[ObjectId, OrderedDict[str, Any]]:
         if not self._hyperparameter_analytics.are_standardizers_fitted():
             raise ValueError("Standardizers are not fitted. Call fit_standardizers() first.")
-        representational_configuration = OrderedDict()
-        for implementation_id, hyperparameters in self.get_standardized_configuration().items():
-            representational_configuration[implementation_id] = OrderedDict()
-            for name, value in hyperparameters.items():
-                representational_configuration[implementation_id][name] = self._hyperparameter_analytics.reverse_standardize_hyperparameter_value(implementation_id, name, value)
-        return representational_configuration
+        fit_count = self._hyperparameter_analytics.get_fit_count()
+        if self._representational_configuration_fit_count != fit_count:
+            representational_configuration = OrderedDict()
+            for implementation_id, hyperparameters in self.get_standardized_key():
+                representational_configuration[implementation_id] = OrderedDict()
+                for name, value in hyperparameters:
+                    representational_configuration[implementation_id][name] = self._hyperparameter_analytics.reverse_standardize_hyperparameter_value(implementation_id, name, value)
+            self._representational_configuration = representational_configuration
+            self._representational_configuration_fit_count = fit_count
+        return self._representational_configuration
 
     def get_raw_configuration(self):
         return self._configuration
@@ -84,7 +119,13 @@ class HyperparameterConfiguration:
         other_fitted = other._hyperparameter_analytics.are_standardizers_fitted()
         if self_fitted != other_fitted:
             return False
-        return self.get_configuration() == other.get_configuration()
+        if self_fitted:
+            self_key, other_key = self.get_standardized_key(), other.get_standardized_key()
+            return self_key is other_key or (hash(self) == hash(other) and self_key == other_key)
+        return self.get_raw_configuration() == other.get_raw_configuration()
 
     def __hash__(self):
+        if self._hyperparameter_analytics.are_standardizers_fitted():
+            self.get_standardized_key()
+            return self._standardized_key_hash
         return hash(str(self))
@@ -4,6 +4,7 @@ from typing import Any, DefaultDict, Dict, List, Optional, Tuple, Union
 from beanie import Link
 from bson import DBRef
 
+from assistml.model_recommender.ranking.default_value_table import DefaultValueTable
 from assistml.model_recommender.ranking.hyperparameter_analytics import HyperparameterAnalytics
 from assistml.model_recommender.ranking.hyperparameter_configuration import HyperparameterConfiguration
 from assistml.model_recommender.ranking.metric_analytics import DescriptiveStatistics, MetricAnalytics
@@ -25,6 +26,7 @@ class ImplementationDatasetGroup:
     _models_grouped_by_configuration: Optional[
         DefaultDict[HyperparameterConfiguration, List[Tuple[ModelView, HyperparameterConfiguration]]]]
     _document_cache: DocumentCache
+    _default_value_table: DefaultValueTable
     _metric_analytics: MetricAnalytics
     _hyperparameter_analytics: HyperparameterAnalytics
     _dataset_descriptor_normalizer: DatasetDescriptorNormalizer
@@ -37,6 +39,7 @@ class ImplementationDatasetGroup:
             implementation: Implementation,
             dataset: Dataset,
             document_cache: DocumentCache,
+            default_value_table: DefaultValueTable,
             metric_analytics: MetricAnalytics,
             hyperparameter_analytics: HyperparameterAnalytics,
             dataset_descriptor_normalizer: DatasetDescriptorNormalizer
@@ -47,6 +50,7 @@ class ImplementationDatasetGroup:
         self._models = []
         self._models_grouped_by_configuration = None
         self._document_cache = document_cache
+        self._default_value_table = default_value_table
         self._metric_analytics = metric_analytics
         self._hyperparameter_analytics = hyperparameter_analytics
         self._dataset_descriptor_normalizer = dataset_descriptor_normalizer
@@ -59,22 +63,27 @@ class ImplementationDatasetGroup:
             implementation: Implementation,
             dataset_ref: Union[Link[Dataset], Dataset],
             document_cache: DocumentCache,
+            default_value_table: DefaultValueTable,
             metric_analytics: MetricAnalytics,
             hyperparameter_analytics: HyperparameterAnalytics,
             dataset_descriptor_normalizer: DatasetDescriptorNormalizer
     ) -> "ImplementationDatasetGroup":
         dataset = await document_cache.get_dataset(dataset_ref)
         dataset_descriptor_normalizer.add_dataset(dataset)
-        return cls(implementation, dataset, document_cache, metric_analytics, hyperparameter_analytics, dataset_descriptor_normalizer)
+        return cls(implementation, dataset, document_cache, default_value_table, metric_analytics,
+                   hyperparameter_analytics, dataset_descriptor_normalizer)
 
-    async def add_model(self, model: ModelView) -> None:
+    def add_models(self, models: List[ModelView]) -> None:
         if self._immutable:
             raise ValueError("Group is immutable")
-        configuration = await HyperparameterConfiguration.from_setup(
-            model.setup, self._document_cache, self._hyperparameter_analytics)
-        self._metric_analytics.add_metric_values(model.metrics)
-        await self._hyperparameter_analytics.add_configuration(configuration)
-        self._models.append((model, configuration))
+        configurations = [
+            HyperparameterConfiguration.from_setup(model.setup, self._default_value_table, self._hyperparameter_analytics)
+            for model in models
+        ]
+        for model in models:
+            self._metric_analytics.add_metric_values(model.metrics)
+        self._hyperparameter_analytics.add_configurations(configurations)
+        self._models.extend(zip(models, configurations))
 
     def _group_models_by_hyperparameters(self) -> None:
         if not self._hyperparameter_analytics.are_standardizers_fitted():
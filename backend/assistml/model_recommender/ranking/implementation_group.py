@@ -1,9 +1,8 @@
-import asyncio
-from collections import defaultdict
-from typing import DefaultDict, Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from beanie import Link, PydanticObjectId
 
+from assistml.model_recommender.ranking.default_value_table import DefaultValueTable
 from assistml.model_recommender.ranking.hyperparameter_analytics import HyperparameterAnalytics
 from assistml.model_recommender.ranking.implementation_dataset_group import ImplementationDatasetGroup
 from assistml.model_recommender.ranking.metric_analytics import DescriptiveStatistics, MetricAnalytics
@@ -20,10 +19,10 @@ class ImplementationGroup:
     _implementation: Implementation
     _dataset_groups: Dict[PydanticObjectId, ImplementationDatasetGroup]
     _document_cache: DocumentCache
+    _default_value_table: DefaultValueTable
     _metric_analytics: MetricAnalytics
     _dataset_descriptor_normalizer: DatasetDescriptorNormalizer
     _hyperparameter_analytics: HyperparameterAnalytics
-    _check_dataset_lock: DefaultDict[PydanticObjectId, asyncio.Lock]
     _ranked_dataset_groups: Optional[List[Tuple[float, ImplementationDatasetGroup]]]
     _aggregated_metrics: Optional[Dict[Metric, DescriptiveStatistics]]
     _overall_score: Optional[float]
@@ -32,16 +31,17 @@ class ImplementationGroup:
             self,
             implementation: Implementation,
             document_cache: DocumentCache,
+            default_value_table: DefaultValueTable,
             metric_analytics: MetricAnalytics,
             dataset_descriptor_normalizer: DatasetDescriptorNormalizer
     ):
         self._implementation = implementation
         self._dataset_groups = {}
         self._document_cache = document_cache
+        self._default_value_table = default_value_table
         self._metric_analytics = metric_analytics
         self._dataset_descriptor_normalizer = dataset_descriptor_normalizer
-        self._hyperparameter_analytics = HyperparameterAnalytics(implementation, document_cache)
-        self._check_dataset_lock = defaultdict(asyncio.Lock)
+        self._hyperparameter_analytics = HyperparameterAnalytics(implementation)
         self._ranked_dataset_groups = None
         self._aggregated_metrics = None
         self._overall_score = None
@@ -51,29 +51,32 @@ class ImplementationGroup:
             cls,
             implementation_ref: Union[Link[Implementation], Implementation],
             document_cache: DocumentCache,
+            default_value_table: DefaultValueTable,
             metric_analytics: MetricAnalytics,
             dataset_descriptor_normalizer: DatasetDescriptorNormalizer
     ) -> "ImplementationGroup":
         implementation = await document_cache.get_implementation(implementation_ref)
-        return cls(implementation, document_cache, metric_analytics, dataset_descriptor_normalizer)
-
-    async def add_model(self, model: ModelView):
-        task: Task = await self._document_cache.get_task(model.setup.task)
-        dataset: Dataset = await self._document_cache.get_dataset(task.dataset)
-        if isinstance(dataset, Dataset):
-            dataset_id = dataset.id
-        else:
-            raise ValueError(f"Unknown dataset type: {type(dataset)}")
-        if dataset_id in self._dataset_groups:
-            await self._dataset_groups[dataset_id].add_model(model)
-            return
-
-        async with self._check_dataset_lock[dataset_id]:
-            if dataset_id not in self._dataset_groups: # check again after lock
+        return cls(implementation, document_cache, default_value_table, metric_analytics, dataset_descriptor_normalizer)
+
+    async def add_models(self, models: List[ModelView]):
+        datasets: Dict[PydanticObjectId, Dataset] = {}
+        models_by_dataset: Dict[PydanticObjectId, List[ModelView]] = {}
+        for model in models:
+            task: Task = await self._document_cache.get_task(model.setup.task)
+            dataset: Dataset = await self._document_cache.get_dataset(task.dataset)
+            if isinstance(dataset, Dataset):
+                dataset_id = dataset.id
+            else:
+                raise ValueError(f"Unknown dataset type: {type(dataset)}")
+            datasets[dataset_id] = dataset
+            models_by_dataset.setdefault(dataset_id, []).append(model)
+
+        for dataset_id, dataset_models in models_by_dataset.items():
+            if dataset_id not in self._dataset_groups:
                 self._dataset_groups[dataset_id] = await ImplementationDatasetGroup.create(
-                    self._implementation, dataset, self._document_cache, self._metric_analytics,
-                    self._hyperparameter_analytics, self._dataset_descriptor_normalizer)
-        await self._dataset_groups[dataset_id].add_model(model)
+                    self._implementation, datasets[dataset_id], self._document_cache, self._default_value_table,
+                    self._metric_analytics, self._hyperparameter_analytics, self._dataset_descriptor_normalizer)
+            self._dataset_groups[dataset_id].add_models(dataset_models)
 
     def rank_datasets(self, dataset: Dataset) -> None:
         if not self._hyperparameter_analytics.are_standardizers_fitted():
@@ -1,10 +1,10 @@
 import asyncio
-from collections import defaultdict
 from enum import Enum
-from typing import DefaultDict, Dict, List, Literal, Optional, Tuple
+from typing import Dict, List, Literal, Optional, Tuple
 
 from beanie import Link, PydanticObjectId
 
+from assistml.model_recommender.ranking.default_value_table import DefaultValueTable
 from assistml.model_recommender.ranking.implementation_group import ImplementationGroup
 from assistml.model_recommender.ranking.metric_analytics import MetricAnalytics
 from common.data import Dataset, Implementation, Query
@@ -12,7 +12,7 @@ from common.data.query import Summary, Report as FinalReport
 from common.data.model import Metric
 from common.data.projection.model import ModelView
 from common.utils.dataset_descriptor_normalizer import DatasetDescriptorNormalizer
-from common.utils.document_cache import DocumentCache
+from common.utils.document_cache import DocumentCache, get_shared_document_cache
 
 
 class DistrustPointCategory(Enum):
@@ -35,28 +35,27 @@ ModelGroup = Literal['acceptable_models', 'nearly_acceptable_models']
 class Report:
     _query: Query
     _distrust_points: Dict[DistrustPointCategory, int]
+    _similarity_tolerances: Optional[Dict[str, float]]
+    _degradations: List[str]
     _models_count: Dict[ModelGroup, int]
     _implementation_groups: Dict[ModelGroup, Optional[Dict[PydanticObjectId, ImplementationGroup]]]
-    _implementation_groups_locks: Dict[ModelGroup, DefaultDict[PydanticObjectId, asyncio.Lock]]
     _document_cache: DocumentCache
     _metric_analytics: MetricAnalytics
     _dataset_analytics: DatasetDescriptorNormalizer
     _ranked_implementation_groups: Optional[Dict[ModelGroup, List[Tuple[float, ImplementationGroup]]]]
     _rank_implementations_lock: asyncio.Lock
 
-    def __init__(self, query: Query):
+    def __init__(self, query: Query, document_cache: Optional[DocumentCache] = None):
         self._query = query
         self._distrust_points = {category: 0 for category in DistrustPointCategory}
+        self._similarity_tolerances = None
+        self._degradations = []
         self._models_count = {}
         self._implementation_groups = {
             "acceptable_models": None,
             "nearly_acceptable_models": None,
         }
-        self._implementation_groups_locks = {
-            "acceptable_models": defaultdict(asyncio.Lock),
-            "nearly_acceptable_models": defaultdict(asyncio.Lock),
-        }
-        self._document_cache = DocumentCache()
+        self._document_cache = document_cache if document_cache is not None else get_shared_document_cache()
         self._metric_analytics = MetricAnalytics()
         self._dataset_descriptor_normalizer = DatasetDescriptorNormalizer()
         self._ranked_implementation_groups = None
@@ -65,6 +64,12 @@ class Report:
     def set_distrust_points(self, category: DistrustPointCategory, points: int):
         self._distrust_points[category] = points
 
+    def set_similarity_tolerances(self, tolerances: Dict[str, float]):
+        self._similarity_tolerances = tolerances
+
+    def set_degradations(self, degradations: List[str]):
+        self._degradations = degradations
+
     def get_distrust_warnings(self):
         warnings = [[
             "Dataset similarity level 3. Datasets used have features with similar meta feature values. Distrust Pts increased by 0",
@@ -78,6 +83,8 @@ class Report:
             warnings.append(f"Acceptable models distrust points increased by {self._distrust_points[DistrustPointCategory.CLUSTER_INSIDE_RATIO_ACC]}")
         if self._distrust_points[DistrustPointCategory.CLUSTER_INSIDE_RATIO_NACC] > 0:
             warnings.append(f"Nearly acceptable models distrust points increased by {self._distrust_points[DistrustPointCategory.CLUSTER_INSIDE_RATIO_NACC]}")
+        for degradation in self._degradations:
+            warnings.append(f"Best-effort report, the time budget of the query ran short: {degradation}")
         return warnings
 
 
@@ -90,10 +97,13 @@ class Report:
             "acceptable_models": acceptable_models,
             "nearly_acceptable_models": nearly_acceptable_models,
         }
-        tasks = []
+        implementations = await self._document_cache.prefetch_models(acceptable_models + nearly_acceptable_models)
+        default_value_table = DefaultValueTable(implementations)
+        await self._document_cache.get_dataset(self._query.dataset)
         for model_group, models in model_groups.items():
             self._models_count[model_group] = len(models)
             self._implementation_groups[model_group] = {}
+            models_by_implementation: Dict[PydanticObjectId, List[ModelView]] = {}
             for model in models:
                 implementation = model.setup.implementation
                 if isinstance(implementation, Link):
@@ -102,13 +112,14 @@ class Report:
                     implementation_id = implementation.id
                 else:
                     raise ValueError(f"Unknown implementation type: {type(implementation)}")
-                async with self._implementation_groups_locks[model_group][implementation_id]:
-                    if implementation_id not in self._implementation_groups[model_group]:
-                        self._implementation_groups[model_group][implementation_id] = await ImplementationGroup.create(
-                            implementation, self._document_cache, self._metric_analytics, self._dataset_descriptor_normalizer)
-                tasks.append(self._implementation_groups[model_group][implementation_id].add_model(model))
-        await asyncio.gather(*tasks)
-        
+                models_by_implementation.setdefault(implementation_id, []).append(model)
+            for implementation_id, implementation_models in models_by_implementation.items():
+                implementation_group = await ImplementationGroup.create(
+                    implementation_models[0].setup.implementation, self._document_cache, default_value_table,
+                    self._metric_analytics, self._dataset_descriptor_normalizer)
+                await implementation_group.add_models(implementation_models)
+                self._implementation_groups[model_group][implementation_id] = implementation_group
+
     def _rank_datasets(self, dataset: Dataset):
         for implementation_group in self._implementation_groups.values():
             for group in implementation_group.values():
@@ -144,7 +155,8 @@ class Report:
             acceptable_models=self._models_count["acceptable_models"],
             nearly_acceptable_models=self._models_count["nearly_acceptable_models"],
             distrust_score=distrust_total / distrust_base,
-            warnings=self.get_distrust_warnings()
+            warnings=self.get_distrust_warnings(),
+            similarity_tolerances=self._similarity_tolerances
         )
         acceptable_models = [
             await implementation_group.generate_report(self._query, top_n, top_m)
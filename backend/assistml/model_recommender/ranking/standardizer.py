@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import List, Any, Dict, Optional, Union
 
@@ -8,6 +9,7 @@ class Standardizer:
     It determines whether the values are numeric or categorical,
     and applies quantile‑based binning for numeric values or cleaning for categorical ones.
     It also provides methods for inverse transformation so that concrete values can be suggested.
+    Lists of values are transformed at once, numeric values with precomputed bin edges.
     """
     def __init__(self, bins: int = 5, numeric_threshold: float = 0.8):
         """
@@ -22,6 +24,8 @@ class Standardizer:
         self.is_integer: Optional[bool] = None
         self.bin_intervals = None  # Will store pandas IntervalIndex for numeric binning
         self.numeric_labels = None  # e.g., ["Q1", "Q2", ...]
+        self.bin_edges: Optional[np.ndarray] = None  # edges of the bin intervals, precomputed for transform
+        self.representative_values: Dict[str, Union[float, int]] = {}  # maps bin label -> representative value
         self.categorical_mapping: Dict[Any, str] = {}  # maps original -> standardized
         self.inverse_categorical_mapping: Dict[str, Any] = {}  # maps standardized -> representative value
 
@@ -52,6 +56,16 @@ class Standardizer:
             binned = pd.qcut(series, q=self.bins, duplicates='drop', precision=10)
             self.bin_intervals = binned.cat.categories
             self.numeric_labels = [f"Q{i + 1}" for i in range(len(self.bin_intervals))]
+        self.bin_edges = np.array([interval.left for interval in self.bin_intervals] + [self.bin_intervals[-1].right],
+                                  dtype=float)
+        if len(self.numeric_labels) == 1:
+            constant = (self.bin_intervals[0].left + self.bin_intervals[0].right) / 2
+            self.representative_values = {self.numeric_labels[0]: constant}
+        else:
+            self.representative_values = {
+                label: (interval.left + interval.right) / 2 if not self.is_integer else round((interval.left + interval.right) / 2)
+                for label, interval in zip(self.numeric_labels, self.bin_intervals)
+            }
 
     def _fit_categorical(self, values: List[Any]) -> None:
         """
@@ -93,12 +107,16 @@ class Standardizer:
 
     def _transform_numeric(self, values: List[float]) -> List[str]:
         """
-        Transform numeric values into their corresponding bin labels.
+        Transform numeric values into their corresponding bin labels. The bins are closed on the right, the first
+        one on both sides, values outside of the bins are labelled NaN (like pd.cut with include_lowest).
         """
-        series = pd.Series(values)
-        bins = [interval.left for interval in self.bin_intervals] + [self.bin_intervals[-1].right]
-        binned = pd.cut(series, bins=bins, include_lowest=True, labels=self.numeric_labels, precision=10)
-        return binned.astype(str).tolist()
+        numbers = np.asarray(values, dtype=float)
+        bin_idx = np.searchsorted(self.bin_edges, numbers, side='left')
+        bin_idx[numbers == self.bin_edges[0]] = 1
+        is_outside = (bin_idx == 0) | (bin_idx == len(self.bin_edges)) | np.isnan(numbers)
+        labels = np.array(self.numeric_labels, dtype=object)[np.clip(bin_idx - 1, 0, len(self.numeric_labels) - 1)]
+        labels[is_outside] = np.nan
+        return labels.tolist()
 
     def _transform_categorical(self, values: List[Any]) -> List[str]:
         """
@@ -151,13 +169,9 @@ class Standardizer:
         Inverse transform numeric bin labels back to a representative value (the midpoint).
         """
         if len(self.numeric_labels) == 1:
-            constant = (self.bin_intervals[0].left + self.bin_intervals[0].right) / 2
+            constant = self.representative_values[self.numeric_labels[0]]
             return [constant for _ in transformed]
-        rep_values = {
-            label: (interval.left + interval.right) / 2 if not self.is_integer else round((interval.left + interval.right) / 2)
-            for label, interval in zip(self.numeric_labels, self.bin_intervals)
-        }
-        return [rep_values.get(tv, None) for tv in transformed]
+        return [self.representative_values.get(tv, None) for tv in transformed]
 
     def _inverse_transform_categorical(self, transformed: List[str]) -> List[Any]:
         """
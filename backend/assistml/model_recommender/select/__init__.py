@@ -1,3 +1,5 @@
+from .aggregation_pipelines import get_models_by_ids
 from .select import select_models_on_dataset_similarity
+from .selected_models import SelectedModels
 
-__all__ = ["select_models_on_dataset_similarity"]
+__all__ = ["select_models_on_dataset_similarity", "get_models_by_ids", "SelectedModels"]
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from bson import ObjectId
+from quart import current_app
+
+from common.data import CorpusVersion, Dataset, Task
+from common.data.task import TaskType
+from common.data.utils import dbref_id
+from common.utils.dataset_similarity import DatasetSimilarityPoints
+
+MIN_TOLERANCE_SCALE = 0.1
+MAX_TOLERANCE_SCALE = 4.0
+SEARCH_STEPS = 10
+
+_similarity_points: Optional[DatasetSimilarityPoints] = None
+_similarity_points_version: Optional[int] = None
+_build_lock = asyncio.Lock()
+
+
+async def build_similarity_points() -> None:
+    """
+    Load the characteristics of all datasets the similarity levels are based on into memory.
+    """
+    global _similarity_points, _similarity_points_version
+    async with _build_lock:
+        corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+        if _similarity_points is not None and _similarity_points_version == corpus_version:
+            return
+        current_app.logger.info(f"Loading dataset similarity points of corpus version {corpus_version}...")
+        start_time = time.time()
+        datasets = await Dataset.find_all().to_list()
+        _similarity_points = await asyncio.to_thread(DatasetSimilarityPoints, datasets)
+        _similarity_points_version = corpus_version
+        current_app.logger.info(f"Loaded {len(datasets)} dataset similarity points in {time.time() - start_time} seconds")
+
+async def _get_similarity_points() -> Optional[DatasetSimilarityPoints]:
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    if _similarity_points is None or _similarity_points_version != corpus_version:
+        if not _build_lock.locked():
+            current_app.add_background_task(build_similarity_points)
+        return None
+    return _similarity_points
+
+async def _get_dataset_model_counts(task_type: TaskType) -> Dict[ObjectId, int]:
+    datasets = await Task.find({"taskType": task_type.value}, with_children=True).aggregate([
+        {
+            "$group": {
+                "_id": dbref_id("$dataset"),
+                "modelCount": {"$sum": {"$ifNull": ["$modelCount", 0]}}
+            }
+        }
+    ]).to_list()
+    return {dataset["_id"]: dataset["modelCount"] for dataset in datasets}
+
+def scale_tolerances(tolerances: Dict[str, float], scale: float) -> Dict[str, float]:
+    """
+    Loosen (scale > 1) or tighten (scale < 1) the tolerances. The similarity ratio is a lower bound, hence its
+    distance to 1 is scaled.
+    """
+    return {
+        "feature_ratio": round(tolerances["feature_ratio"] * scale, 4),
+        "monotonous_filtering": round(tolerances["monotonous_filtering"] * scale, 4),
+        "mutual_info": round(tolerances["mutual_info"] * scale, 4),
+        "similarity_ratio": round(float(np.clip(1 - (1 - tolerances["similarity_ratio"]) * scale, 0, 1)), 4),
+    }
+
+def _search_tolerance_scale(points: DatasetSimilarityPoints, new_dataset: Dataset, model_counts: np.ndarray,
+                            base_tolerances: Dict[str, float], target_min: int, target_max: int) -> float:
+    def count_models(scale: float) -> int:
+        levels, _ = points.get_similarity_levels(new_dataset, scale_tolerances(base_tolerances, scale))
+        return int(model_counts[levels >= 3].sum())
+
+    # the number of models grows with the scale, search the tightest scale reaching the lower bound (in log space)
+    low, high = np.log(MIN_TOLERANCE_SCALE), np.log(MAX_TOLERANCE_SCALE)
+    if count_models(np.exp(low)) >= target_min:
+        return float(np.exp(low))
+    if count_models(np.exp(high)) < target_min:
+        return float(np.exp(high))
+    for _ in range(SEARCH_STEPS):
+        middle = (low + high) / 2
+        models_count = count_models(np.exp(middle))
+        if target_min <= models_count <= target_max:
+            return float(np.exp(middle))
+        if models_count < target_min:
+            low = middle
+        else:
+            high = middle
+    return float(np.exp(high))
+
+async def find_adaptive_tolerances(new_dataset: Dataset, task_type: TaskType,
+                                   base_tolerances: Dict[str, float]) -> Dict[str, float]:
+    """
+    Find tolerances for which the number of models on datasets with similarity level 3 lies within
+    TARGET_MODEL_COUNT_MIN and TARGET_MODEL_COUNT_MAX, keeping the tolerances as tight as possible.
+
+    Candidate tolerances are evaluated in memory, counting models by the stored model counts of the tasks. The base
+    tolerances are returned as long as the similarity points of the current dataset corpus are not loaded.
+    """
+    points = await _get_similarity_points()
+    if points is None:
+        current_app.logger.info("Dataset similarity points are not available yet, using the default tolerances")
+        return base_tolerances
+
+    dataset_model_counts = await _get_dataset_model_counts(task_type)
+    model_counts = np.array([
+        dataset_model_counts.get(dataset_id, 0) if dataset_id != new_dataset.id else 0
+        for dataset_id in points.dataset_ids
+    ])
+    scale = await asyncio.to_thread(
+        _search_tolerance_scale, points, new_dataset, model_counts, base_tolerances,
+        current_app.config["TARGET_MODEL_COUNT_MIN"], current_app.config["TARGET_MODEL_COUNT_MAX"]
+    )
+    tolerances = scale_tolerances(base_tolerances, scale)
+    current_app.logger.info(f"Using adaptive tolerances {tolerances} (scale {scale:.3f})")
+    return tolerances
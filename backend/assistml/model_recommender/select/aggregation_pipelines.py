@@ -1,13 +1,21 @@
 import asyncio
-from typing import List, Optional
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel
+from pymongo.errors import ExecutionTimeout
 from quart import current_app
 
-from common.data import Dataset, DatasetSimilarity, Model, Task
+from assistml.model_recommender.query_operations import get_operation_comment
+from assistml.model_recommender.select.selected_models import SelectedModels
+from common.data import Dataset, DatasetSimilarity, Model, ModelCatalogEntry, Task
 from common.data.task import TaskType
 from common.data.projection.model import ModelView
 from common.data.similar_models import SimilarModels
+from common.data.utils import dbref_id
 
 RATIO_FIELD_NAMES = [
     "categoricalRatio",
@@ -96,91 +104,108 @@ def _build_matching_features_field_definition(features_field_name: str, new_feat
         }
     }
 
-def _get_calculate_similar_tasks_pipeline(
-        query_id: ObjectId,
-        task_type: TaskType,
-        similarity_level: int,
-):
-    pipeline = [
-        {
-            "$match": {
-                "queryId": query_id,
-                **({"hasSim1": True} if similarity_level >= 1 else {}),
-                **({"hasSim2": True} if similarity_level >= 2 else {}),
-                **({"hasSim3": True} if similarity_level >= 3 else {})
-            }
-        }, {
-            "$sort": {
-                "datasetId": 1
-            }
-        }, {
-            "$lookup": {
-                "from": Task.get_collection_name(),
-                "localField": "datasetId",
-                "foreignField": "dataset.$id",
-                "pipeline": [
-                    {
-                        "$match": {
-                            "taskType": task_type.value
-                        }
-                    }
-                ],
-                "as": "task"
-            }
-        }, {
-            "$unwind": {
-                "path": "$task",
-                "preserveNullAndEmptyArrays": False
-            }
-        }
-    ]
-    return pipeline
+def _get_similar_datasets_filter(context_id: ObjectId, similarity_level: int) -> dict:
+    return {
+        "contextId": context_id,
+        **({"hasSim1": True} if similarity_level >= 1 else {}),
+        **({"hasSim2": True} if similarity_level >= 2 else {}),
+        **({"hasSim3": True} if similarity_level >= 3 else {})
+    }
+
+class TaskQuotas(NamedTuple):
+    """
+    Maximum number of models per task: every task gets up to `quota` models, the tasks in `extended_task_ids` one more.
+    """
+    quota: int
+    extended_task_ids: List[ObjectId]
+
+def _get_task_quotas(task_model_counts: Dict[ObjectId, int], models_limit: int) -> Optional[TaskQuotas]:
+    """
+    Distribute the models limit evenly across tasks (water-filling): tasks with fewer models than their share keep
+    all of them and pass the remainder on to the larger tasks. Returns None if all models fit into the limit.
+    """
+    if sum(task_model_counts.values()) <= models_limit:
+        return None
+    tasks = sorted(task_model_counts.items(), key=lambda task: (task[1], task[0]))
+    remaining_limit = models_limit
+    for position, (_, model_count) in enumerate(tasks):
+        remaining_tasks_count = len(tasks) - position
+        quota = remaining_limit // remaining_tasks_count
+        if model_count > quota:
+            extended_tasks_count = remaining_limit - quota * remaining_tasks_count
+            larger_tasks = sorted(tasks[position:], key=lambda task: (-task[1], task[0]))
+            return TaskQuotas(quota, [task_id for task_id, _ in larger_tasks[:extended_tasks_count]])
+        remaining_limit -= model_count
+    return None
+
+def _get_task_quota_condition(task_quotas: "TaskQuotas"):
+    task_id = dbref_id("$setup.task")
+    return {
+        "$lte": [
+            "$taskModelNumber",
+            {"$cond": [{"$in": [task_id, task_quotas.extended_task_ids]}, task_quotas.quota + 1, task_quotas.quota]}
+        ]
+    }
 
 def _get_calculate_similar_models_pipeline(
         query_id: ObjectId,
         task_type: TaskType,
-        similarity_level: int,
-        model_per_task_limit: Optional[int] = None
+        dataset_ids: List[ObjectId],
+        sampling_seed: int,
+        into: str,
+        task_quotas: Optional["TaskQuotas"] = None
 ):
     pipeline = [
-        *_get_calculate_similar_tasks_pipeline(query_id, task_type, similarity_level),
         {
-            "$lookup": {
-                "from": Model.get_collection_name(),
-                "localField": "task._id",
-                "foreignField": "setup.task.$id",
-                **({"pipeline": [
-                    {
-                        "$limit": model_per_task_limit
-                    }
-                ]} if model_per_task_limit else {}),
-                "as": "model"
+            "$match": {
+                "taskType": task_type.value,
+                "datasetId": {"$in": dataset_ids}
             }
         }, {
-            "$unwind": {
-                "path": "$model",
-                "includeArrayIndex": "model.taskModelIdx",
-                "preserveNullAndEmptyArrays": False
+            "$set": {
+                # seeded pseudo-random but deterministic order of the models
+                "sampleHash": {"$toHashedIndexKey": {"$concat": [str(sampling_seed), ":", {"$toString": "$_id"}]}}
             }
         }, {
-            "$addFields": {
-                "model.queryId": "$queryId",
-                "model.taskId": "$task._id"
+            "$setWindowFields": {
+                "partitionBy": {
+                    "task": dbref_id("$setup.task"),
+                    "implementation": dbref_id("$setup.implementation")
+                },
+                "sortBy": {"sampleHash": 1, "_id": 1},
+                "output": {
+                    "implementationModelNumber": {"$documentNumber": {}}
+                }
             }
         }, {
-            "$replaceRoot": {
-                "newRoot": "$model"
+            # round-robin across the implementations of a task
+            "$setWindowFields": {
+                "partitionBy": dbref_id("$setup.task"),
+                "sortBy": {"implementationModelNumber": 1, "sampleHash": 1, "_id": 1},
+                "output": {
+                    "taskModelNumber": {"$documentNumber": {}}
+                }
             }
-        }, {
-            "$set": {
+        },
+        *([{
+            "$match": {
+                "$expr": _get_task_quota_condition(task_quotas)
+            }
+        }] if task_quotas is not None else []),
+        {
+            "$project": {
+                "_id": 0,
                 "modelId": "$_id",
+                "queryId": {"$literal": query_id},
+                "taskId": dbref_id("$setup.task"),
+                "taskModelIdx": {"$subtract": ["$taskModelNumber", 1]},
+                "implementationId": dbref_id("$setup.implementation"),
+                "metrics": 1,
                 "createdAt": { "$toDate": "$$NOW" },
             }
-        }, {
-            "$unset": "_id"
         }, {
             "$merge": {
-                "into": SimilarModels.get_collection_name(),
+                "into": into,
                 "on": ["queryId", "modelId"],
                 "whenMatched": "replace",
                 "whenNotMatched": "insert"
@@ -189,37 +214,50 @@ def _get_calculate_similar_models_pipeline(
     ]
     return pipeline
 
-def _get_task_count_of_dataset_similarities_pipeline(
-        query_id: ObjectId,
-        task_type: TaskType,
-        similarity_level: int,
-):
-    return [
-            *_get_calculate_similar_tasks_pipeline(query_id, task_type, similarity_level),
-            {"$count": "count"}
+def _get_similar_models_key_condition(operator: str, key: Tuple[int, ObjectId]) -> dict:
+    # compares the compound key (taskModelIdx, modelId) with the given key
+    task_model_idx, model_id = key
+    strict_operator = {"$gte": "$gt", "$lte": "$lt"}.get(operator, operator)
+    return {
+        "$or": [
+            {"taskModelIdx": {strict_operator: task_model_idx}},
+            {"taskModelIdx": task_model_idx, "modelId": {operator: model_id}}
         ]
+    }
 
 def _get_fetch_similar_models_pipeline(
         query_id: ObjectId,
         limit: int = None,
-        offset_id: ObjectId = None):
+        offset: Optional[Tuple[int, ObjectId]] = None,
+        range_start: Optional[Tuple[int, ObjectId]] = None,
+        range_end: Optional[Tuple[int, ObjectId]] = None):
+    # keyset pagination on (taskModelIdx, modelId), so that every prefix is spread evenly across tasks
+    key_conditions = []
+    if offset is not None:
+        key_conditions.append(_get_similar_models_key_condition("$gt", offset))
+    elif range_start is not None:
+        key_conditions.append(_get_similar_models_key_condition("$gte", range_start))
+    if range_end is not None:
+        key_conditions.append(_get_similar_models_key_condition("$lt", range_end))
     pipeline = [
         {
             "$match": {
                 "queryId": query_id,
-                **({"modelId": {"$gt": offset_id}} if offset_id else {})
+                **({"$and": key_conditions} if key_conditions else {})
             }
         }, {
             "$sort": {
-                #"taskModelIdx": 1, # idea is fetch models evenly distributed across tasks, but breaks cursor pagination
+                "taskModelIdx": 1,
                 "modelId": 1
             }
-        },  {
-            "$set": {
-                "_id": "$modelId"
-            }
         }, {
-            "$unset": ["queryId", "modelId", "taskModelIdx"]
+            "$project": {
+                "_id": "$modelId",
+                "taskModelIdx": 1,
+                "taskId": 1,
+                "implementationId": 1,
+                "metrics": 1
+            }
         },
         *([{
             "$limit": limit
@@ -227,6 +265,67 @@ def _get_fetch_similar_models_pipeline(
     ]
     return pipeline
 
+def _get_similar_models_split_point_pipeline(query_id: ObjectId, position: int):
+    # only reads the queryId_taskModelIdx_modelId_ index (covered query)
+    return [
+        {
+            "$match": {
+                "queryId": query_id
+            }
+        }, {
+            "$sort": {
+                "taskModelIdx": 1,
+                "modelId": 1
+            }
+        }, {
+            "$skip": position
+        }, {
+            "$limit": 1
+        }, {
+            "$project": {
+                "_id": 0,
+                "taskModelIdx": 1,
+                "modelId": 1
+            }
+        }
+    ]
+
+def _get_sample_model_catalog_pipeline(
+        task_type: TaskType,
+        exclude_dataset_id: ObjectId,
+        sample_key_range: dict,
+        limit: int
+):
+    # equality on taskType and range on sampleKey, hence the sort and limit are served by the index
+    pipeline = [
+        {
+            "$match": {
+                "taskType": task_type.value,
+                "sampleKey": sample_key_range,
+                "datasetId": {"$ne": exclude_dataset_id}
+            }
+        }, {
+            "$sort": {
+                "sampleKey": 1
+            }
+        }, {
+            "$limit": limit
+        }, {
+            "$project": {
+                "_id": 1,
+                "taskId": 1,
+                "implementationId": 1,
+                "metrics": 1
+            }
+        }
+    ]
+    return pipeline
+
+def _get_sample_start_key(seed: ObjectId) -> float:
+    # deterministic per seed, so that repeated queries for the same dataset get the same sample
+    seed_hash = hashlib.sha256(str(seed).encode("utf-8")).digest()
+    return int.from_bytes(seed_hash[:8], "big") / 2**64
+
 def _max_size_stage(size_mb: int):
     return {
         "$match": {
@@ -239,19 +338,87 @@ def _max_size_stage(size_mb: int):
         }
     }
 
+def _get_sim_3_stages(monotonous_filtering_tolerance: float, mutual_info_tolerance: float,
+                      similarity_ratio_tolerance: float):
+    return [
+        {
+            "$addFields": {
+                "numericalFeatures": { "$objectToArray": "$features.numericalFeatures"},
+                "newNumericalFeatures": { "$objectToArray": "$newDataset.features.numericalFeatures"},
+                "categoricalFeatures": { "$objectToArray": "$features.categoricalFeatures"},
+                "newCategoricalFeatures": { "$objectToArray": "$newDataset.features.categoricalFeatures"}
+            }
+        }, {
+            "$addFields": {
+                "matchingNumerical": _build_matching_features_field_definition(
+                    "numericalFeatures", "newNumericalFeatures",
+                    monotonous_filtering_tolerance, mutual_info_tolerance),
+                "matchingCategorical": _build_matching_features_field_definition(
+                    "categoricalFeatures", "newCategoricalFeatures",
+                    monotonous_filtering_tolerance, mutual_info_tolerance)
+            }
+        }, {
+            "$addFields": {
+                "totalMatches": { "$add": [ { "$size": "$matchingNumerical" }, { "$size": "$matchingCategorical" } ] },
+                "totalFeatures": { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] },
+                "similarity3": { "$cond": [
+                    {
+                        "$gt": [
+                            { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] }, 0
+                        ]
+                    },
+                    { "$divide": [
+                        { "$add": [ { "$size": "$matchingNumerical" }, { "$size": "$matchingCategorical" } ] },
+                        { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] }
+                    ] },
+                    0
+                  ]
+                }
+            }
+        }, {
+            "$addFields": {
+                "hasSim3": {
+                    "$expr": { "$gte": ["$similarity3", similarity_ratio_tolerance] }
+                }
+            }
+        }
+    ]
+
+def _get_skipped_sim_3_stages():
+    # the feature matching is the most expensive part of the similarity calculation
+    return [
+        {
+            "$addFields": {
+                "matchingNumerical": [],
+                "matchingCategorical": [],
+                "totalMatches": 0,
+                "totalFeatures": 0,
+                "similarity3": 0.0,
+                "hasSim3": False
+            }
+        }
+    ]
+
 def _get_dataset_similarity_pipeline(
-        query_id: ObjectId,
+        context_id: ObjectId,
         new_dataset: Dataset,
         feature_ratio_tolerance: float,
         monotonous_filtering_tolerance: float,
         mutual_info_tolerance: float,
-        similarity_ratio_tolerance: float
+        similarity_ratio_tolerance: float,
+        candidate_dataset_ids: Optional[List[ObjectId]] = None,
+        include_sim_3: bool = True
 ):
     pipeline = [
+        *([{
+            "$match": {
+                "_id": {"$in": candidate_dataset_ids}
+            }
+        }] if candidate_dataset_ids is not None else []),
         _max_size_stage(8),
         {
             "$addFields": {
-                "queryId": query_id,
+                "contextId": context_id,
                 "datasetId": "$_id"
             }
         }, {
@@ -293,47 +460,10 @@ def _get_dataset_similarity_pipeline(
                     }
                 }
             }
-        }, {
-            "$addFields": {
-                "numericalFeatures": { "$objectToArray": "$features.numericalFeatures"},
-                "newNumericalFeatures": { "$objectToArray": "$newDataset.features.numericalFeatures"},
-                "categoricalFeatures": { "$objectToArray": "$features.categoricalFeatures"},
-                "newCategoricalFeatures": { "$objectToArray": "$newDataset.features.categoricalFeatures"}
-            }
-        }, {
-            "$addFields": {
-                "matchingNumerical": _build_matching_features_field_definition(
-                    "numericalFeatures", "newNumericalFeatures",
-                    monotonous_filtering_tolerance, mutual_info_tolerance),
-                "matchingCategorical": _build_matching_features_field_definition(
-                    "categoricalFeatures", "newCategoricalFeatures",
-                    monotonous_filtering_tolerance, mutual_info_tolerance)
-            }
-        }, {
-            "$addFields": {
-                "totalMatches": { "$add": [ { "$size": "$matchingNumerical" }, { "$size": "$matchingCategorical" } ] },
-                "totalFeatures": { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] },
-                "similarity3": { "$cond": [
-                    {
-                        "$gt": [
-                            { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] }, 0
-                        ]
-                    },
-                    { "$divide": [
-                        { "$add": [ { "$size": "$matchingNumerical" }, { "$size": "$matchingCategorical" } ] },
-                        { "$add": [ { "$size": "$numericalFeatures" }, { "$size": "$categoricalFeatures" } ] }
-                    ] },
-                    0
-                  ]
-                }
-            }
-        }, {
-            "$addFields": {
-                "hasSim3": {
-                    "$expr": { "$gte": ["$similarity3", similarity_ratio_tolerance] }
-                }
-            }
-        }, {
+        },
+        *(_get_sim_3_stages(monotonous_filtering_tolerance, mutual_info_tolerance, similarity_ratio_tolerance)
+          if include_sim_3 else _get_skipped_sim_3_stages()),
+        {
             "$unset": [
                 "info",
                 "features",
@@ -351,8 +481,8 @@ def _get_dataset_similarity_pipeline(
             }
         }, {
             "$merge": {
-                "into": "dataset_similarities",
-                "on": ["queryId", "datasetId"],
+                "into": DatasetSimilarity.get_collection_name(),
+                "on": ["contextId", "datasetId"],
                 "whenMatched": "replace",
                 "whenNotMatched": "insert"
             }
@@ -365,6 +495,9 @@ async def _execute_with_retry(async_func, *args, max_retries: int = 5, **kwargs)
     for try_no in range(max_retries):
         try:
             return await async_func(*args, **kwargs)
+        except ExecutionTimeout:
+            # the time budget of the query is exhausted, retrying would exceed it even more
+            raise
         except Exception as e:
             current_app.logger.error(f"Error executing function: {e}")
             if try_no == max_retries - 1:
@@ -374,84 +507,265 @@ async def _execute_with_retry(async_func, *args, max_retries: int = 5, **kwargs)
             backoff_time *= 2
             current_app.logger.info("Retrying...")
 
+def _get_similar_models_collection_name(query_id: ObjectId) -> str:
+    if current_app.config["SCRATCH_COLLECTIONS"]:
+        return f"{SimilarModels.get_collection_name()}_{query_id}"
+    return SimilarModels.get_collection_name()
+
+def _get_similar_models_collection(query_id: ObjectId) -> AsyncIOMotorCollection:
+    return SimilarModels.get_motor_collection().database[_get_similar_models_collection_name(query_id)]
+
+async def _create_similar_models_scratch_collection(query_id: ObjectId):
+    # $merge on fields other than _id requires a unique index on them
+    await _get_similar_models_collection(query_id).create_indexes([
+        IndexModel([("queryId", 1), ("modelId", 1)], name="queryId_modelId_", unique=True),
+        IndexModel([("queryId", 1), ("taskModelIdx", 1), ("modelId", 1)], name="queryId_taskModelIdx_modelId_",
+                   unique=True),
+    ])
+
+def _operation_kwargs(max_time_ms: Optional[int]) -> Dict[str, Any]:
+    # the comment identifies the operations of a query, so that they can be killed if the query is cancelled
+    return {
+        **({"maxTimeMS": max_time_ms} if max_time_ms is not None else {}),
+        **({"comment": get_operation_comment()} if get_operation_comment() is not None else {})
+    }
+
+async def _aggregate(collection: AsyncIOMotorCollection, pipeline: List[dict],
+                     max_time_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+    return await collection.aggregate(pipeline, **_operation_kwargs(max_time_ms)).to_list(None)
+
+async def _get_similar_models_split_points(query_id: ObjectId, expected_models_count: int, ranges_count: int,
+                                           max_time_ms: Optional[int] = None) -> List[Tuple[int, ObjectId]]:
+    """
+    Get the keys that split the similar models of the query into ranges of roughly the same size. The expected count
+    may be inaccurate, the ranges cover all models anyway.
+    """
+    positions = [expected_models_count * range_no // ranges_count for range_no in range(1, ranges_count)]
+    collection = _get_similar_models_collection(query_id)
+    split_documents = await asyncio.gather(*[
+        _execute_with_retry(_aggregate, collection, _get_similar_models_split_point_pipeline(query_id, position),
+                            max_time_ms)
+        for position in positions
+    ])
+    split_points = {(batch[0]["taskModelIdx"], batch[0]["modelId"]) for batch in split_documents if batch}
+    return sorted(split_points)
+
+async def _fetch_similar_models_range(
+        query_id: ObjectId,
+        range_start: Optional[Tuple[int, ObjectId]],
+        range_end: Optional[Tuple[int, ObjectId]],
+        max_time_ms: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    collection = _get_similar_models_collection(query_id)
+    documents: List[Dict[str, Any]] = []
+    batch_size = 1_000
+    offset = None
+
+    while True:
+        pipeline = _get_fetch_similar_models_pipeline(query_id, batch_size, offset, range_start, range_end)
+        batch = await _execute_with_retry(_aggregate, collection, pipeline, max_time_ms)
+        documents.extend(batch)
+        if len(batch) < batch_size:
+            break
+        offset = (batch[-1]["taskModelIdx"], batch[-1]["_id"])
+
+    return documents
+
 # Public functions to get models
 
 async def calculate_dataset_similarity(
-        query_id: ObjectId,
+        context_id: ObjectId,
         new_dataset: Dataset,
         feature_ratio_tolerance: float,
         monotonous_filtering_tolerance: float,
         mutual_info_tolerance: float,
-        similarity_ratio_tolerance: float
+        similarity_ratio_tolerance: float,
+        candidate_dataset_ids: Optional[List[ObjectId]] = None,
+        max_time_ms: Optional[int] = None,
+        include_sim_3: bool = True
 ):
-    pipeline = _get_dataset_similarity_pipeline(query_id, new_dataset, feature_ratio_tolerance,
+    """
+    Calculate the similarities of all datasets to the new dataset and store them for the given context. Without
+    include_sim_3, the feature matching is skipped and no dataset has similarity level 3.
+    """
+    pipeline = _get_dataset_similarity_pipeline(context_id, new_dataset, feature_ratio_tolerance,
                                                 monotonous_filtering_tolerance, mutual_info_tolerance,
-                                                similarity_ratio_tolerance)
-    return await _execute_with_retry(Dataset.find().aggregate(pipeline).to_list)
-
-async def calculate_similar_models(query_id: ObjectId, task_type: TaskType, similarity_level: int):
-    models_limit: Optional[int] = current_app.config["PROCESS_MODEL_LIMIT"]
+                                                similarity_ratio_tolerance, candidate_dataset_ids, include_sim_3)
+    return await _execute_with_retry(Dataset.find().aggregate(pipeline, **_operation_kwargs(max_time_ms)).to_list)
+
+async def _get_task_model_counts(task_type: TaskType, dataset_ids: List[ObjectId],
+                                 unknown_model_count: int) -> Dict[ObjectId, int]:
+    tasks = await Task.find({
+        "dataset.$id": {"$in": dataset_ids},
+        "taskType": task_type.value
+    }, with_children=True).aggregate([{"$project": {"_id": 1, "modelCount": 1}}]).to_list()
+    # tasks ingested before the model counts were stored are assumed to be large
+    return {task["_id"]: task.get("modelCount", unknown_model_count) for task in tasks}
+
+async def calculate_similar_models(query_id: ObjectId, task_type: TaskType, dataset_ids: List[ObjectId],
+                                   models_limit: Optional[int], max_time_ms: Optional[int] = None) -> int:
+    """
+    Store the models of the given datasets and task type as similar models of the query. If a models limit is given,
+    a sample evenly spread across tasks and their implementations is stored.
+
+    Returns:
+        The expected number of stored models, based on the stored model counts of the tasks.
+    """
     current_app.logger.info(f"Finding {f'up to {models_limit}' if models_limit is not None else 'all'} related models...")
 
-    # Heuristic to limit the number of models per task
-    models_per_task_limit = None
+    task_model_counts = await _get_task_model_counts(task_type, dataset_ids, models_limit or 0)
+    expected_models_count = sum(task_model_counts.values())
+    task_quotas = None
     if models_limit is not None:
-        pipeline = _get_task_count_of_dataset_similarities_pipeline(query_id, task_type, similarity_level)
-        tasks_count = (await _execute_with_retry(
-            DatasetSimilarity.find().aggregate(pipeline).to_list
-        ))[0]["count"]
-        models_per_task_limit = models_limit // (tasks_count / 2)
-        current_app.logger.info(f"{tasks_count} tasks found, limiting models per task to {models_per_task_limit}")
-
-    pipeline = _get_calculate_similar_models_pipeline(query_id, task_type, similarity_level, models_per_task_limit)
-    await _execute_with_retry(DatasetSimilarity.find().aggregate(pipeline).to_list)
-
-    matched_models_count = await SimilarModels.find({"queryId": query_id}).count()
-    current_app.logger.info(f"Found {matched_models_count} models")
-    return matched_models_count
-
-async def get_similar_models(query_id: ObjectId, task_type: TaskType, similarity_level: int):
-    # check if similar datasets exists
-    count = await DatasetSimilarity.find({
-        "queryId": query_id,
-        **({"hasSim1": True} if similarity_level >= 1 else {}),
-        **({"hasSim2": True} if similarity_level >= 2 else {}),
-        **({"hasSim3": True} if similarity_level >= 3 else {})
-    }).count()
-    if count == 0:
-        return []
+        task_quotas = _get_task_quotas(task_model_counts, models_limit)
+        if task_quotas is not None:
+            expected_models_count = models_limit
+            current_app.logger.info(f"{len(task_model_counts)} tasks found, limiting models per task to "
+                                    f"{task_quotas.quota} (+1 for {len(task_quotas.extended_task_ids)} tasks)")
+
+    if current_app.config["SCRATCH_COLLECTIONS"]:
+        await _create_similar_models_scratch_collection(query_id)
+    pipeline = _get_calculate_similar_models_pipeline(query_id, task_type, dataset_ids,
+                                                      current_app.config["SAMPLING_SEED"],
+                                                      _get_similar_models_collection_name(query_id), task_quotas)
+    await _execute_with_retry(Model.find().aggregate(pipeline, **_operation_kwargs(max_time_ms)).to_list)
+    return expected_models_count
+
+class SelectionPipeline(NamedTuple):
+    name: str
+    collection: str
+    pipeline: List[dict]
+
+def _without_merge_stage(pipeline: List[dict]) -> List[dict]:
+    return [stage for stage in pipeline if "$merge" not in stage]
+
+async def get_selection_pipelines(
+        query_id: ObjectId,
+        new_dataset: Dataset,
+        task_type: TaskType,
+        tolerances: Dict[str, float],
+        dataset_ids: List[ObjectId],
+        candidate_dataset_ids: Optional[List[ObjectId]] = None
+) -> List[SelectionPipeline]:
+    """
+    Build the aggregation pipelines the model selection runs for a query, without their final $merge stage, so that
+    they can be explained without writing any scratch data.
+
+    Returns:
+        The dataset similarity pipeline and the similar models pipeline for the given similar datasets.
+    """
+    dataset_similarity_pipeline = _get_dataset_similarity_pipeline(
+        ObjectId(), new_dataset, tolerances["feature_ratio"], tolerances["monotonous_filtering"],
+        tolerances["mutual_info"], tolerances["similarity_ratio"], candidate_dataset_ids
+    )
 
     models_limit: Optional[int] = current_app.config["PROCESS_MODEL_LIMIT"]
-    current_app.logger.info(f"{count} similar datasets found with similarity level {similarity_level}.")
+    task_quotas = None
+    if models_limit is not None:
+        task_model_counts = await _get_task_model_counts(task_type, dataset_ids, models_limit)
+        task_quotas = _get_task_quotas(task_model_counts, models_limit)
+    similar_models_pipeline = _get_calculate_similar_models_pipeline(
+        query_id, task_type, dataset_ids, current_app.config["SAMPLING_SEED"],
+        _get_similar_models_collection_name(query_id), task_quotas
+    )
 
-    matched_models_count = await calculate_similar_models(query_id, task_type, similarity_level)
-    models: List[ModelView] = []
-    batch_size = 1_000
-    offset_id = None
+    return [
+        SelectionPipeline("dataset_similarity", Dataset.get_collection_name(),
+                          _without_merge_stage(dataset_similarity_pipeline)),
+        SelectionPipeline("calculate_similar_models", Model.get_collection_name(),
+                          _without_merge_stage(similar_models_pipeline)),
+    ]
 
-    while True:
-        next_batch_size = min(batch_size, models_limit - len(models)) if models_limit is not None else batch_size
-        pipeline = _get_fetch_similar_models_pipeline(query_id, next_batch_size, offset_id)
+async def get_similar_dataset_ids(context_id: ObjectId, similarity_level: int) -> List[ObjectId]:
+    return await DatasetSimilarity.distinct("datasetId", _get_similar_datasets_filter(context_id, similarity_level))
 
+async def get_similar_models(
+        query_id: ObjectId,
+        task_type: TaskType,
+        dataset_ids: List[ObjectId],
+        models_limit: Optional[int],
+        max_time_ms: Optional[int] = None
+) -> SelectedModels:
+    """
+    Select the models of the given datasets and task type, at most models_limit if given. Every MongoDB operation is
+    bounded by max_time_ms if given.
+    """
+    # check if similar datasets exists
+    if len(dataset_ids) == 0:
+        return SelectedModels.from_documents([])
+
+    expected_models_count = await calculate_similar_models(query_id, task_type, dataset_ids, models_limit, max_time_ms)
+    fetch_parallelism = max(1, min(current_app.config["FETCH_PARALLELISM"], expected_models_count // 1_000))
+    split_points = await _get_similar_models_split_points(query_id, expected_models_count, fetch_parallelism,
+                                                          max_time_ms)
+    range_bounds = list(zip([None] + split_points, split_points + [None]))
+    current_app.logger.info(f"Fetching about {expected_models_count} models in {len(range_bounds)} ranges...")
+
+    ranges = await asyncio.gather(*[
+        _fetch_similar_models_range(query_id, range_start, range_end, max_time_ms)
+        for range_start, range_end in range_bounds
+    ])
+    documents = [document for range_documents in ranges for document in range_documents]
+    current_app.logger.info(f"Retrieved {len(documents)} / {expected_models_count} models")
+    if models_limit is not None:
+        documents = documents[:models_limit]
+
+    return SelectedModels.from_documents(documents)
+
+async def get_catalog_models(task_type: TaskType, exclude_dataset_id: ObjectId, limit: int,
+                             max_time_ms: Optional[int] = None) -> SelectedModels:
+    """
+    Sample models of the given task type from the model catalog, regardless of the dataset similarity.
+
+    The sample is read as a single range of the random sample keys, starting at a position derived from the excluded
+    dataset and wrapping around at the end of the key space.
+    """
+    start_key = _get_sample_start_key(exclude_dataset_id)
+    pipeline = _get_sample_model_catalog_pipeline(task_type, exclude_dataset_id, {"$gte": start_key}, limit)
+    documents = await _execute_with_retry(ModelCatalogEntry.find().aggregate(pipeline, **_operation_kwargs(max_time_ms)).to_list)
+    if len(documents) < limit:
+        pipeline = _get_sample_model_catalog_pipeline(task_type, exclude_dataset_id, {"$lt": start_key},
+                                                      limit - len(documents))
+        documents.extend(await _execute_with_retry(ModelCatalogEntry.find().aggregate(pipeline, **_operation_kwargs(max_time_ms)).to_list))
+    current_app.logger.info(f"Sampled {len(documents)} models of task type {task_type.value} from the model catalog")
+    return SelectedModels.from_documents(documents)
+
+async def get_models_by_ids(model_ids: List[ObjectId], max_time_ms: Optional[int] = None) -> List[ModelView]:
+    """
+    Fetch the full documents of the given models, preserving the order of the ids.
+    """
+    models_by_id: Dict[ObjectId, ModelView] = {}
+    batch_size = 1_000
+    for batch_start in range(0, len(model_ids), batch_size):
+        batch_ids = list(model_ids[batch_start:batch_start + batch_size])
         batch = await _execute_with_retry(
-                    SimilarModels.find().aggregate(aggregation_pipeline=pipeline, projection_model=ModelView).to_list
-                )
-        if not batch:
-            break
-        models.extend(batch)
-        offset_id = batch[-1].id
-        current_app.logger.info(f"Retrieved {len(models)} / {min(matched_models_count, models_limit)} models so far {len(models)*100/min(matched_models_count, models_limit)} %.")
-        if models_limit is not None and len(models) >= models_limit:
-            break
-        if len(batch) < batch_size:
-            break
-
-    return models
-
-async def clear_dataset_similarity_context(query_id: ObjectId):
-    await _execute_with_retry(DatasetSimilarity.find({"queryId": query_id}).delete)
-    current_app.logger.info("Cleared dataset similarity context")
-
-async def clear_similar_models_context(query_id: ObjectId):
-    await _execute_with_retry(SimilarModels.find({"queryId": query_id}).delete)
-    current_app.logger.info("Cleared similar models context")
\ No newline at end of file
+            Model.find({"_id": {"$in": batch_ids}}, projection_model=ModelView, max_time_ms=max_time_ms,
+                       comment=get_operation_comment()).to_list
+        )
+        models_by_id.update({model.id: model for model in batch})
+    return [models_by_id[model_id] for model_id in model_ids if model_id in models_by_id]
+
+async def clear_dataset_similarity_contexts(context_ids: List[ObjectId]):
+    await _execute_with_retry(DatasetSimilarity.find({"contextId": {"$in": context_ids}}).delete)
+    current_app.logger.info(f"Cleared {len(context_ids)} dataset similarity contexts")
+
+async def clear_similar_models_contexts(query_ids: List[ObjectId]):
+    await _execute_with_retry(SimilarModels.find({"queryId": {"$in": query_ids}}).delete)
+    if current_app.config["SCRATCH_COLLECTIONS"]:
+        database = SimilarModels.get_motor_collection().database
+        for query_id in query_ids:
+            await _execute_with_retry(database.drop_collection, _get_similar_models_collection_name(query_id))
+    current_app.logger.info(f"Cleared {len(query_ids)} similar models contexts")
+
+async def clear_stale_similar_models_collections(max_age_seconds: int = 12 * 60 * 60):
+    """
+    Drop scratch collections of similar models that were not cleared, e.g. because the backend was restarted.
+    """
+    database = SimilarModels.get_motor_collection().database
+    prefix = f"{SimilarModels.get_collection_name()}_"
+    now = datetime.now(timezone.utc)
+    for collection_name in await database.list_collection_names(filter={"name": {"$regex": f"^{prefix}"}}):
+        query_id = collection_name[len(prefix):]
+        if ObjectId.is_valid(query_id) and (now - ObjectId(query_id).generation_time).total_seconds() > max_age_seconds:
+            await database.drop_collection(collection_name)
+            current_app.logger.info(f"Dropped stale scratch collection {collection_name}")
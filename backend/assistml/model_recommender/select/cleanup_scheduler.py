@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Dict, List, Set
+
+from bson import ObjectId
+from quart import current_app
+
+from assistml.model_recommender.select.aggregation_pipelines import clear_dataset_similarity_contexts, \
+    clear_similar_models_contexts, clear_stale_similar_models_collections
+
+
+class CleanupScheduler:
+    """
+    Deletes the scratch data of queries in the background, so that cleanup latency is not added to the requests.
+
+    Scheduled ids are collected across queries and deleted in batches of CLEANUP_BATCH_SIZE ids every
+    CLEANUP_INTERVAL_SECONDS, which bounds the load caused by the deletes. The TTL indexes on the scratch data remain
+    the safety net for ids that are lost, e.g. on a crash of the backend.
+    """
+
+    _pending_query_ids: Set[ObjectId]
+    _pending_context_ids: Set[ObjectId]
+    _stop_event: asyncio.Event
+    _metrics: Dict[str, float]
+
+    def __init__(self):
+        self._pending_query_ids = set()
+        self._pending_context_ids = set()
+        self._stop_event = asyncio.Event()
+        self._metrics = {
+            "cleared_queries": 0,
+            "cleared_contexts": 0,
+            "failed_batches": 0,
+            "last_batch_seconds": 0.0,
+        }
+
+    def schedule_similar_models(self, query_id: ObjectId) -> None:
+        self._pending_query_ids.add(query_id)
+
+    def schedule_dataset_similarity_contexts(self, context_ids: List[ObjectId]) -> None:
+        self._pending_context_ids.update(context_ids)
+
+    def get_metrics(self) -> Dict[str, float]:
+        return {
+            **self._metrics,
+            "pending_queries": len(self._pending_query_ids),
+            "pending_contexts": len(self._pending_context_ids),
+        }
+
+    @staticmethod
+    def _take(pending_ids: Set[ObjectId], batch_size: int) -> List[ObjectId]:
+        return [pending_ids.pop() for _ in range(min(batch_size, len(pending_ids)))]
+
+    async def _clear_batch(self, batch_size: int) -> bool:
+        query_ids = self._take(self._pending_query_ids, batch_size)
+        context_ids = self._take(self._pending_context_ids, batch_size)
+        if not query_ids and not context_ids:
+            return True
+
+        start_time = time.time()
+        try:
+            if query_ids:
+                await clear_similar_models_contexts(query_ids)
+                self._metrics["cleared_queries"] += len(query_ids)
+            if context_ids:
+                await clear_dataset_similarity_contexts(context_ids)
+                self._metrics["cleared_contexts"] += len(context_ids)
+        except Exception as e:
+            # keep the ids for the next run, the TTL indexes clean up if the deletes keep failing
+            self._metrics["failed_batches"] += 1
+            self._pending_query_ids.update(query_ids)
+            self._pending_context_ids.update(context_ids)
+            current_app.logger.error(f"Error while cleaning up scratch data: {e}")
+            return False
+        finally:
+            self._metrics["last_batch_seconds"] = time.time() - start_time
+        current_app.logger.info(f"Cleanup backlog: {self.get_metrics()}")
+        return True
+
+    async def run(self) -> None:
+        """
+        Run the cleanup loop until stop is called. Pending ids are cleared one last time before returning.
+        """
+        self._stop_event.clear()
+        if current_app.config["SCRATCH_COLLECTIONS"]:
+            await clear_stale_similar_models_collections()
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=current_app.config["CLEANUP_INTERVAL_SECONDS"])
+            except asyncio.TimeoutError:
+                pass
+            await self._clear_batch(current_app.config["CLEANUP_BATCH_SIZE"])
+        while self._pending_query_ids or self._pending_context_ids:
+            if not await self._clear_batch(current_app.config["CLEANUP_BATCH_SIZE"]):
+                break
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+cleanup_scheduler = CleanupScheduler()
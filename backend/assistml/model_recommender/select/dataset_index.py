@@ -0,0 +1,79 @@
+import asyncio
+import glob
+import os
+import time
+from typing import List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from quart import current_app
+
+from common.data import CorpusVersion, Dataset
+from common.utils.dataset_descriptor_index import DatasetDescriptorIndex
+
+_index: Optional[DatasetDescriptorIndex] = None
+_build_lock = asyncio.Lock()
+
+
+def _get_index_dir() -> str:
+    return os.path.join(os.path.expanduser(current_app.config["WORKING_DIR"]), "dataset_index")
+
+def _get_index_path(corpus_version: int) -> str:
+    return os.path.join(_get_index_dir(), f"descriptor_index_v{corpus_version}.pkl")
+
+def _remove_outdated_index_files(corpus_version: int) -> None:
+    current_path = _get_index_path(corpus_version)
+    for path in glob.glob(os.path.join(_get_index_dir(), "descriptor_index_v*.pkl")):
+        if path != current_path:
+            os.remove(path)
+
+async def build_dataset_index() -> Optional[DatasetDescriptorIndex]:
+    """
+    Make sure the index of the current dataset corpus is available. It is loaded from the working directory if it
+    has been built before (e.g. by another backend process), otherwise it is built and persisted.
+    """
+    global _index
+    async with _build_lock:
+        corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+        if _index is not None and _index.corpus_version == corpus_version:
+            return _index
+
+        index_path = _get_index_path(corpus_version)
+        if os.path.exists(index_path):
+            _index = await asyncio.to_thread(DatasetDescriptorIndex.load, index_path)
+            current_app.logger.info(f"Loaded dataset index of corpus version {corpus_version}")
+            return _index
+
+        current_app.logger.info(f"Building dataset index of corpus version {corpus_version}...")
+        start_time = time.time()
+        try:
+            index = await DatasetDescriptorIndex.build(corpus_version)
+        except ValueError as e:
+            current_app.logger.warning(f"Could not build dataset index: {e}")
+            return None
+        os.makedirs(_get_index_dir(), exist_ok=True)
+        await asyncio.to_thread(index.save, index_path)
+        _remove_outdated_index_files(corpus_version)
+        _index = index
+        current_app.logger.info(f"Built dataset index of {len(index)} datasets in {time.time() - start_time} seconds")
+        return _index
+
+async def get_most_similar_dataset_ids(dataset: Dataset, k: int) -> Optional[Tuple[List[PydanticObjectId], int]]:
+    """
+    Get the ids of the k datasets with the most similar descriptors.
+
+    If the index does not reflect the current dataset corpus, it is rebuilt in the background, so that the request
+    path never waits for it. Until then, the last loaded index is used: the dataset is the query point, not a
+    candidate, hence the index of a previous corpus still finds its neighbors among the datasets it contains.
+
+    Returns:
+        The ids of the datasets and the corpus version of the index they were found with, or None if no index is
+        loaded yet.
+    """
+    index = _index
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    if (index is None or index.corpus_version != corpus_version) and not _build_lock.locked():
+        current_app.add_background_task(build_dataset_index)
+    if index is None:
+        return None
+    similar_datasets = await asyncio.to_thread(index.query, dataset, k)
+    return [dataset_id for dataset_id, _ in similar_datasets], index.corpus_version
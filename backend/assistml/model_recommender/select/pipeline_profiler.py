@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from quart import current_app
+
+from assistml.model_recommender.select.aggregation_pipelines import SelectionPipeline, get_selection_pipelines, \
+    get_similar_dataset_ids
+from assistml.model_recommender.select.dataset_index import get_most_similar_dataset_ids
+from assistml.model_recommender.select.select import TOLERANCES
+from assistml.model_recommender.select.similarity_cache import get_similarity_context
+from common.data import CorpusVersion, Dataset, PipelineProfile, Query
+from common.data.pipeline_profile import StageProfile
+from common.utils.dataset_neighbors import get_dataset_neighbors
+
+
+def _get_stage_name(stage: Dict[str, Any]) -> str:
+    return next((key for key in stage if key.startswith("$")), "unknown")
+
+def _collect_plan_details(plan: Any, indexes: List[str]) -> int:
+    # walks a (classic or SBE) query plan, collects the used indexes and returns the number of collection scans
+    collection_scans = 0
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            collection_scans += 1
+        if "indexName" in plan and plan["indexName"] not in indexes:
+            indexes.append(plan["indexName"])
+        for value in plan.values():
+            collection_scans += _collect_plan_details(value, indexes)
+    elif isinstance(plan, list):
+        for value in plan:
+            collection_scans += _collect_plan_details(value, indexes)
+    return collection_scans
+
+def _parse_cursor_stage(name: str, explain: Dict[str, Any]) -> StageProfile:
+    execution_stats = explain.get("executionStats", {})
+    indexes: List[str] = []
+    collection_scans = _collect_plan_details(explain.get("queryPlanner", {}).get("winningPlan", {}), indexes)
+    return StageProfile(
+        stage=name,
+        execution_time_ms=execution_stats.get("executionTimeMillis"),
+        documents_returned=execution_stats.get("nReturned"),
+        documents_examined=execution_stats.get("totalDocsExamined"),
+        keys_examined=execution_stats.get("totalKeysExamined"),
+        collection_scans=collection_scans,
+        indexes_used=indexes
+    )
+
+def _parse_stages(explain: Dict[str, Any], prefix: str = "") -> List[StageProfile]:
+    if "shards" in explain:
+        return [
+            stage
+            for shard_name, shard_explain in explain["shards"].items()
+            for stage in _parse_stages(shard_explain, f"{prefix}{shard_name}:")
+        ]
+    if "stages" not in explain:
+        # the whole pipeline was pushed down into the query layer
+        return [_parse_cursor_stage(f"{prefix}$cursor", explain)]
+
+    stages: List[StageProfile] = []
+    previous_time_ms = 0
+    for stage in explain["stages"]:
+        name = _get_stage_name(stage)
+        if name == "$cursor":
+            profile = _parse_cursor_stage(f"{prefix}{name}", stage[name])
+        else:
+            profile = StageProfile(
+                stage=f"{prefix}{name}",
+                execution_time_ms=stage.get("executionTimeMillisEstimate"),
+                documents_returned=stage.get("nReturned"),
+                documents_examined=stage.get("totalDocsExamined"),  # reported by $lookup
+                keys_examined=stage.get("totalKeysExamined"),
+                collection_scans=stage.get("collectionScans"),
+                indexes_used=list(stage.get("indexesUsed", []))
+            )
+        # MongoDB reports the time spent up to and including a stage, keep the time of the stage itself
+        if profile.execution_time_ms is not None:
+            cumulative_time_ms = profile.execution_time_ms
+            profile.execution_time_ms = max(0, cumulative_time_ms - previous_time_ms)
+            previous_time_ms = cumulative_time_ms
+        stages.append(profile)
+    return stages
+
+async def _explain(selection_pipeline: SelectionPipeline) -> Tuple[Dict[str, Any], int]:
+    database = Dataset.get_motor_collection().database
+    start_time = time.time()
+    explain = await database.command({
+        "explain": {
+            "aggregate": selection_pipeline.collection,
+            "pipeline": selection_pipeline.pipeline,
+            "cursor": {}
+        },
+        "verbosity": "executionStats"
+    })
+    return explain, int((time.time() - start_time) * 1000)
+
+async def _get_dataset_ids(new_dataset: Dataset, similarity_level: int) -> List[PydanticObjectId]:
+    dataset_neighbors = await get_dataset_neighbors(new_dataset.id, TOLERANCES)
+    if dataset_neighbors is not None:
+        return dataset_neighbors.get_dataset_ids(similarity_level)
+    similarity_context = await get_similarity_context(new_dataset, TOLERANCES)
+    return await get_similar_dataset_ids(similarity_context.id, similarity_level)
+
+async def profile_query_pipelines(query_id: PydanticObjectId, similarity_level: int = 3) -> List[PipelineProfile]:
+    """
+    Explain the selection pipelines of a query with execution statistics and store the results.
+
+    The pipelines are run without their $merge stage and the documents that would reach it are reported as merge
+    documents instead. The similar models pipeline needs the similar datasets, though: if the dataset has no
+    precomputed neighbors, its similarity context is looked up or built like for a regular query, which stores the
+    dataset similarities and may evict the least recently used contexts.
+
+    Returns:
+        The stored profiles, one per pipeline.
+    """
+    query = await Query.get(query_id)
+    if query is None:
+        raise ValueError(f"Query {query_id} not found")
+    new_dataset: Dataset = await query.dataset.fetch()
+    if not new_dataset:
+        raise ValueError("Dataset not found")
+
+    candidate_dataset_ids: Optional[List[PydanticObjectId]] = None
+    if current_app.config["DATASET_INDEX_PREFILTER_K"] is not None:
+        similar_datasets = await get_most_similar_dataset_ids(new_dataset,
+                                                              current_app.config["DATASET_INDEX_PREFILTER_K"])
+        if similar_datasets is not None:
+            candidate_dataset_ids, _ = similar_datasets
+    dataset_ids = await _get_dataset_ids(new_dataset, similarity_level)
+    selection_pipelines = await get_selection_pipelines(query.id, new_dataset, query.task_type, TOLERANCES,
+                                                        dataset_ids, candidate_dataset_ids)
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+
+    profiles: List[PipelineProfile] = []
+    for selection_pipeline in selection_pipelines:
+        current_app.logger.info(f"Explaining pipeline {selection_pipeline.name} of query {query_id}...")
+        explain, execution_time_ms = await _explain(selection_pipeline)
+        stages = _parse_stages(explain)
+        profiles.append(PipelineProfile(
+            query_id=query.id,
+            pipeline=selection_pipeline.name,
+            collection=selection_pipeline.collection,
+            created_at=datetime.now(timezone.utc),
+            corpus_version=corpus_version,
+            execution_time_ms=execution_time_ms,
+            merge_documents=stages[-1].documents_returned if stages else None,
+            stages=stages
+        ))
+    await PipelineProfile.insert_many(profiles)
+    return profiles
@@ -1,47 +1,117 @@
 import time
+from typing import Dict, Optional
 
+from pymongo.errors import ExecutionTimeout
 from quart import current_app
 
-from assistml.model_recommender.select.aggregation_pipelines import calculate_dataset_similarity, \
-    clear_dataset_similarity_context, clear_similar_models_context, get_similar_models
+from assistml.model_recommender.query_budget import QueryBudget
+from assistml.model_recommender.select.adaptive_tolerances import find_adaptive_tolerances
+from assistml.model_recommender.select.aggregation_pipelines import get_catalog_models, get_similar_dataset_ids, \
+    get_similar_models
+from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+from assistml.model_recommender.select.selected_models import SelectedModels
+from assistml.model_recommender.select.similarity_cache import get_similarity_context
 from common.data import Dataset, Query
-from common.data.projection.model import ModelView
+from common.utils.dataset_neighbors import get_dataset_neighbors
+from common.utils.dataset_similarity import DEFAULT_SIMILARITY_TOLERANCES
 
-TOLERANCES = {"feature_ratio": 0.1, "monotonous_filtering": 0.1, "mutual_info": 0.1, "similarity_ratio": 0.5}
+TOLERANCES = DEFAULT_SIMILARITY_TOLERANCES
 
 
-async def select_models_on_dataset_similarity(query: Query) -> tuple[list[ModelView], int]:
+async def select_models_on_dataset_similarity(query: Query,
+                                              budget: QueryBudget) -> tuple[SelectedModels, int, Dict[str, float]]:
+    """
+    Select the models on the datasets most similar to the dataset of the query.
+
+    If the time budget runs short, the similarity level 3 is skipped and fewer models are processed. If the dataset
+    similarity cannot be determined in time, models of similarity level 0 are used as a best effort.
+    """
     new_dataset: Dataset = await query.dataset.fetch()
     if not new_dataset:
         raise ValueError("Dataset not found")
 
     current_app.logger.info("Selecting models based on dataset similarity...")
-    current_app.logger.info("Calculating similarity context...")
     start_time = time.time()
-    resp = await calculate_dataset_similarity(query.id, new_dataset, TOLERANCES["feature_ratio"],
-                                       TOLERANCES["monotonous_filtering"], TOLERANCES["mutual_info"],
-                                       TOLERANCES["similarity_ratio"])
-    current_app.logger.info(f"Response: {resp}")
-    context_built_time = time.time()
-    current_app.logger.info("Calculated similarity context took {} seconds".format(context_built_time - start_time))
-
-    lowest_sim_level = 0 if current_app.config["INCLUDE_SIMILARITY_LEVEL_0"] else 1
-
-    for similarity_level in range(3, lowest_sim_level-1, -1):
-        sim_start_time = time.time()
-        current_app.logger.info(f"Trying to find models with similarity level {similarity_level}...")
-        models = await get_similar_models(query.id, query.task_type, similarity_level)
-        sim_end_time = time.time()
-
-        if len(models) > 0:
-            current_app.logger.info(f"Found {len(models)} models with similarity level {similarity_level} in {sim_end_time - sim_start_time} seconds")
-            current_app.logger.info("Total time for selecting models based on dataset similarity: {} seconds".format(sim_end_time - start_time))
-            await clear_dataset_similarity_context(query.id)
-            await clear_similar_models_context(query.id)
-            return models, similarity_level
+    tolerances = TOLERANCES
+    if current_app.config["ADAPTIVE_TOLERANCES"]:
+        tolerances = await find_adaptive_tolerances(new_dataset, query.task_type, TOLERANCES)
+    dataset_neighbors = await get_dataset_neighbors(new_dataset.id, tolerances)
+    similarity_context = None
+    timed_out = False
+    skip_sim_3 = False
+    if dataset_neighbors is not None:
+        current_app.logger.info("Using precomputed dataset neighbors")
+    else:
+        current_app.logger.info("No up-to-date dataset neighbors available, calculating similarity context...")
+        if budget.is_running_short():
+            # the feature matching of similarity level 3 is skipped already when calculating the similarities
+            budget.degrade("Datasets with similarity level 3 were not considered separately")
+            skip_sim_3 = True
+        try:
+            similarity_context = await get_similarity_context(new_dataset, tolerances, budget.get_max_time_ms(),
+                                                              include_sim_3=not skip_sim_3)
+        except ExecutionTimeout:
+            budget.degrade("The dataset similarity could not be calculated in time")
+            timed_out = True
+        context_built_time = time.time()
+        current_app.logger.info("Calculated similarity context took {} seconds".format(context_built_time - start_time))
 
-    current_app.logger.info("No models were found")
-    if not current_app.config["INCLUDE_SIMILARITY_LEVEL_0"]:
-        current_app.logger.warn("You might want to consider including similarity level 0, but be aware that it might take a long time and consume a lot of resources")
+    async def similar_dataset_ids(level: int):
+        if dataset_neighbors is not None:
+            return dataset_neighbors.get_dataset_ids(level)
+        return await get_similar_dataset_ids(similarity_context.id, level)
+
+    models_limit: Optional[int] = current_app.config["PROCESS_MODEL_LIMIT"]
+    start_level = 3
+    if timed_out:
+        start_level = 0
+    elif skip_sim_3:
+        start_level = 2
+    elif budget.is_running_short():
+        budget.degrade("Datasets with similarity level 3 were not considered separately")
+        start_level = 2
+
+    try:
+        for similarity_level in range(start_level, 0, -1):
+            degraded_models_limit = current_app.config["DEGRADED_PROCESS_MODEL_LIMIT"]
+            if budget.is_running_short() and (models_limit is None or models_limit > degraded_models_limit):
+                budget.degrade(f"The number of processed models was limited to {degraded_models_limit}")
+                models_limit = degraded_models_limit
+            sim_start_time = time.time()
+            current_app.logger.info(f"Trying to find models with similarity level {similarity_level}...")
+            dataset_ids = await similar_dataset_ids(similarity_level)
+            current_app.logger.info(f"{len(dataset_ids)} similar datasets found with similarity level {similarity_level}.")
+            try:
+                models = await get_similar_models(query.id, query.task_type, dataset_ids, models_limit,
+                                                  budget.get_max_time_ms())
+            except ExecutionTimeout:
+                budget.degrade(f"The models of similarity level {similarity_level} could not be selected in time")
+                timed_out = True
+                break
+            sim_end_time = time.time()
+
+            if len(models) > 0:
+                current_app.logger.info(f"Found {len(models)} models with similarity level {similarity_level} in {sim_end_time - sim_start_time} seconds")
+                current_app.logger.info("Total time for selecting models based on dataset similarity: {} seconds".format(sim_end_time - start_time))
+                return models, similarity_level, tolerances
+    finally:
+        # the selected models are fetched already, their scratch data is deleted in the background
+        cleanup_scheduler.schedule_similar_models(query.id)
+
+    # if the budget is exhausted, the (cheap) similarity level 0 is the best effort
+    if not current_app.config["INCLUDE_SIMILARITY_LEVEL_0"] and not timed_out:
+        current_app.logger.info("No models were found")
         raise ValueError("No models found with similarity level 3, 2 or 1")
-    raise ValueError("No models found with similarity level 1, skipping similarity level 0 due to performance reasons")
+
+    # similarity level 0 ignores the datasets, hence a bounded sample of the model catalog is used
+    current_app.logger.info("Trying to find models with similarity level 0...")
+    catalog_models_limit = current_app.config["SIMILARITY_LEVEL_0_MODEL_LIMIT"]
+    if models_limit is not None:
+        catalog_models_limit = min(catalog_models_limit, models_limit)
+    models = await get_catalog_models(query.task_type, new_dataset.id, catalog_models_limit, budget.get_max_time_ms())
+    if len(models) > 0:
+        current_app.logger.info("Total time for selecting models based on dataset similarity: {} seconds".format(time.time() - start_time))
+        return models, 0, tolerances
+
+    current_app.logger.info("No models were found")
+    raise ValueError("No models found with similarity level 3, 2, 1 or 0")
@@ -0,0 +1,52 @@
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from common.data.model import Metric
+
+_METRIC_VALUES = {metric.value for metric in Metric}
+
+
+class SelectedModels:
+    """
+    Compact columnar representation of the models selected for a query.
+
+    Only the fields required for clustering are kept: the ids of the models, of their tasks and of their
+    implementations as well as their metrics. Full model documents are fetched later on, and only for the
+    models that end up in the acceptable or nearly acceptable region.
+    """
+
+    ids: np.ndarray
+    task_ids: np.ndarray
+    implementation_ids: np.ndarray
+    metrics: pd.DataFrame
+
+    def __init__(self, ids: np.ndarray, task_ids: np.ndarray, implementation_ids: np.ndarray, metrics: pd.DataFrame):
+        if not (len(ids) == len(task_ids) == len(implementation_ids) == len(metrics)):
+            raise ValueError("All columns of the selected models must have the same length")
+        self.ids = ids
+        self.task_ids = task_ids
+        self.implementation_ids = implementation_ids
+        self.metrics = metrics
+
+    @classmethod
+    def from_documents(cls, documents: List[Dict[str, Any]]) -> "SelectedModels":
+        """
+        Build the columnar representation from raw documents of the shape
+        {"_id": ..., "taskId": ..., "implementationId": ..., "metrics": {...}}.
+        """
+        ids = np.array([document["_id"] for document in documents], dtype=object)
+        task_ids = np.array([document.get("taskId") for document in documents], dtype=object)
+        implementation_ids = np.array([document.get("implementationId") for document in documents], dtype=object)
+
+        metrics = pd.DataFrame([document.get("metrics", {}) for document in documents])
+        metrics = metrics[[column for column in metrics.columns if column in _METRIC_VALUES]]
+        metrics = metrics.rename(columns=Metric).apply(pd.to_numeric, errors="coerce")
+        return cls(ids, task_ids, implementation_ids, metrics.reset_index(drop=True))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return f"SelectedModels(models={len(self)}, metrics={list(self.metrics.columns)})"
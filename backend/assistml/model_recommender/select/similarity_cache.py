@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from beanie import PydanticObjectId
+
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout
+from quart import current_app
+
+from assistml.model_recommender.select.aggregation_pipelines import calculate_dataset_similarity
+from assistml.model_recommender.select.cleanup_scheduler import cleanup_scheduler
+from assistml.model_recommender.select.dataset_index import get_most_similar_dataset_ids
+from common.data import CorpusVersion, Dataset, SimilarityContext
+from common.data.similarity_context import SimilarityContextStatus
+
+CONTEXT_BUILD_WAIT_SECONDS = 10 * 60
+CONTEXT_BUILD_POLL_SECONDS = 1
+CONTEXT_BUILD_LEASE_SECONDS = 30
+
+
+def _build_context_key(dataset: Dataset, tolerances: Dict[str, float], corpus_version: int,
+                       prefilter_k: Optional[int], index_version: Optional[int], include_sim_3: bool = True) -> str:
+    key_data = json.dumps({
+        "datasetId": str(dataset.id),
+        "tolerances": sorted(tolerances.items()),
+        "corpusVersion": corpus_version,
+        "prefilterK": prefilter_k,
+        **({"indexVersion": index_version} if index_version is not None else {}),
+        **({"includeSim3": False} if not include_sim_3 else {})
+    })
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+def _get_lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=CONTEXT_BUILD_LEASE_SECONDS)
+
+async def _renew_lease(context_id: PydanticObjectId) -> None:
+    # runs while the context is calculated, until it is cancelled
+    while True:
+        await asyncio.sleep(CONTEXT_BUILD_LEASE_SECONDS / 3)
+        try:
+            await SimilarityContext.find_one(
+                {"_id": context_id, "status": SimilarityContextStatus.BUILDING.value}
+            ).update({"$set": {"leaseExpiresAt": _get_lease_expiry()}})
+        except Exception as e:
+            current_app.logger.warning(f"Could not renew the lease of similarity context {context_id}: {e}")
+
+async def _delete_abandoned_context(key: str) -> bool:
+    # contexts created before leases were introduced have no lease and count as abandoned
+    abandoned_context = await SimilarityContext.get_motor_collection().find_one_and_delete({
+        "key": key,
+        "status": SimilarityContextStatus.BUILDING.value,
+        "leaseExpiresAt": {"$not": {"$gt": datetime.now(timezone.utc)}}
+    })
+    if abandoned_context is None:
+        return False
+    cleanup_scheduler.schedule_dataset_similarity_contexts([abandoned_context["_id"]])
+    return True
+
+async def _wait_for_context(key: str, max_time_ms: Optional[int] = None) -> SimilarityContext | None:
+    """
+    Wait until a context that is built by another query (or backend replica) is ready.
+    Returns None if the context disappeared, its lease expired (the context is deleted then) or it is not ready within
+    CONTEXT_BUILD_WAIT_SECONDS. Raises ExecutionTimeout if it is not ready within max_time_ms.
+    """
+    deadline = time.time() + CONTEXT_BUILD_WAIT_SECONDS
+    query_deadline = time.time() + max_time_ms / 1000 if max_time_ms is not None else None
+    while time.time() < deadline:
+        context = await SimilarityContext.find_one({"key": key})
+        if context is None:
+            return None
+        if context.status == SimilarityContextStatus.READY.value:
+            return context
+        if await _delete_abandoned_context(key):
+            current_app.logger.info("Similarity context was abandoned by another query, taking it over...")
+            return None
+        if query_deadline is not None and time.time() >= query_deadline:
+            raise ExecutionTimeout("Similarity context calculated by another query is not ready in time")
+        await asyncio.sleep(CONTEXT_BUILD_POLL_SECONDS)
+    return None
+
+async def _touch_context(context: SimilarityContext) -> None:
+    context.last_used_at = datetime.now(timezone.utc)
+    await SimilarityContext.find_one({"_id": context.id}).update({"$set": {"lastUsedAt": context.last_used_at}})
+
+async def _evict_contexts(cache_size: int) -> None:
+    evicted_contexts = await SimilarityContext.find(
+        {"status": SimilarityContextStatus.READY.value}
+    ).sort("-lastUsedAt").skip(cache_size).to_list()
+    if not evicted_contexts:
+        return
+    evicted_context_ids = [context.id for context in evicted_contexts]
+    await SimilarityContext.find({"_id": {"$in": evicted_context_ids}}).delete()
+    cleanup_scheduler.schedule_dataset_similarity_contexts(evicted_context_ids)
+
+async def get_similarity_context(new_dataset: Dataset, tolerances: Dict[str, float],
+                                 max_time_ms: Optional[int] = None, include_sim_3: bool = True) -> SimilarityContext:
+    """
+    Get the similarity context of the new dataset for the given tolerances.
+
+    The context is shared across queries and backend replicas. It is identified by the new dataset, the tolerances
+    and the version of the dataset corpus, hence it is invalidated as soon as datasets are added.
+    Only the SIMILARITY_CACHE_SIZE most recently used contexts are kept.
+
+    If DATASET_INDEX_PREFILTER_K is set, only the datasets with the most similar descriptors are considered. The
+    descriptor index may lag behind the dataset corpus, hence its version is part of the identity of the context.
+    If max_time_ms is given and the context is not available in time, pymongo's ExecutionTimeout is raised.
+    Without include_sim_3, a complete context is reused if it is ready, otherwise a context without similarity level 3
+    is calculated, which skips the expensive feature matching.
+    """
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    prefilter_k: Optional[int] = current_app.config["DATASET_INDEX_PREFILTER_K"]
+    candidate_dataset_ids = None
+    index_version = None
+    if prefilter_k is not None:
+        similar_datasets = await get_most_similar_dataset_ids(new_dataset, prefilter_k)
+        if similar_datasets is not None:
+            candidate_dataset_ids, index_version = similar_datasets
+        else:
+            current_app.logger.info("Dataset index is not available yet, considering all datasets")
+            prefilter_k = None
+    if not include_sim_3:
+        complete_context = await SimilarityContext.find_one({
+            "key": _build_context_key(new_dataset, tolerances, corpus_version, prefilter_k, index_version),
+            "status": SimilarityContextStatus.READY.value
+        })
+        if complete_context is not None:
+            current_app.logger.info(f"Reusing cached similarity context {complete_context.id}")
+            await _touch_context(complete_context)
+            return complete_context
+    key = _build_context_key(new_dataset, tolerances, corpus_version, prefilter_k, index_version, include_sim_3)
+
+    context = await SimilarityContext.find_one({"key": key})
+    if context is not None and context.status != SimilarityContextStatus.READY.value:
+        current_app.logger.info("Similarity context is being calculated by another query, waiting...")
+        # if the other calculation failed or was abandoned, it is taken over
+        context = await _wait_for_context(key, max_time_ms)
+    if context is not None and context.status == SimilarityContextStatus.READY.value:
+        current_app.logger.info(f"Reusing cached similarity context {context.id}")
+        await _touch_context(context)
+        return context
+
+    now = datetime.now(timezone.utc)
+    context = SimilarityContext(
+        key=key,
+        dataset_id=new_dataset.id,
+        tolerances=tolerances,
+        corpus_version=corpus_version,
+        status=SimilarityContextStatus.BUILDING,
+        created_at=now,
+        last_used_at=now,
+        lease_expires_at=_get_lease_expiry()
+    )
+    try:
+        await context.insert()
+    except DuplicateKeyError:
+        # another query claimed the context in the meantime
+        return await get_similarity_context(new_dataset, tolerances, max_time_ms, include_sim_3)
+
+    lease_renewal = asyncio.create_task(_renew_lease(context.id))
+    try:
+        resp = await calculate_dataset_similarity(context.id, new_dataset, tolerances["feature_ratio"],
+                                                  tolerances["monotonous_filtering"], tolerances["mutual_info"],
+                                                  tolerances["similarity_ratio"], candidate_dataset_ids, max_time_ms,
+                                                  include_sim_3)
+    except (Exception, asyncio.CancelledError):
+        # queries waiting for the context take over, partial similarities are deleted in the background
+        await asyncio.shield(SimilarityContext.find_one({"_id": context.id}).delete())
+        cleanup_scheduler.schedule_dataset_similarity_contexts([context.id])
+        raise
+    finally:
+        lease_renewal.cancel()
+    current_app.logger.info(f"Response: {resp}")
+    await SimilarityContext.find_one({"_id": context.id}).update(
+        {"$set": {"status": SimilarityContextStatus.READY.value}})
+    context.status = SimilarityContextStatus.READY.value
+
+    await _evict_contexts(current_app.config["SIMILARITY_CACHE_SIZE"])
+    return context
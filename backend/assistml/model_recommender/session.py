@@ -0,0 +1,101 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from beanie import PydanticObjectId
+from quart import current_app
+
+from assistml.model_recommender.select import get_models_by_ids
+from assistml.model_recommender.select.selected_models import SelectedModels
+from common.data.projection.model import ModelView
+from common.utils.lru_cache import LRUCache
+
+_sessions: Optional[LRUCache[PydanticObjectId, "RecommendationSession"]] = None
+_session_ids: Optional[LRUCache[PydanticObjectId, PydanticObjectId]] = None
+
+
+class RecommendationSession:
+    """
+    Server-side state of a query that is reused when only the preferences of the query change.
+
+    A session keeps the selected models with their compact metric matrix, so that the selection is not repeated, and
+    the model documents fetched for the reports so far. Re-ranking only clusters the models again and fetches the
+    models not seen yet. The documents referenced by the models are served by the shared document cache.
+
+    The degradations applied while selecting the models are kept as well, as they apply to every report of the
+    session. A session is identified by the id of the query it was created for.
+    """
+
+    query_id: PydanticObjectId
+    models: SelectedModels
+    similarity_level: int
+    similarity_tolerances: Dict[str, float]
+    degradations: List[str]
+    _model_views: Dict[PydanticObjectId, ModelView]
+    _model_views_lock: asyncio.Lock
+
+    def __init__(self, query_id: PydanticObjectId, models: SelectedModels, similarity_level: int,
+                 similarity_tolerances: Dict[str, float], degradations: List[str]):
+        self.query_id = query_id
+        self.models = models
+        self.similarity_level = similarity_level
+        self.similarity_tolerances = similarity_tolerances
+        self.degradations = degradations
+        self._model_views = {}
+        self._model_views_lock = asyncio.Lock()
+
+    async def get_model_views(self, model_idx: np.ndarray, max_time_ms: Optional[int] = None) -> List[ModelView]:
+        """
+        Get the full documents of the selected models at the given positions, fetching only those not cached yet.
+        """
+        model_ids = self.models.ids[model_idx]
+        async with self._model_views_lock:
+            missing_ids = [model_id for model_id in model_ids if model_id not in self._model_views]
+            if missing_ids:
+                for model in await get_models_by_ids(missing_ids, max_time_ms):
+                    self._model_views[model.id] = model
+        return [self._model_views[model_id] for model_id in model_ids if model_id in self._model_views]
+
+
+def _get_sessions() -> LRUCache[PydanticObjectId, RecommendationSession]:
+    global _sessions
+    if _sessions is None:
+        _sessions = LRUCache(current_app.config["RECOMMENDATION_SESSION_COUNT"],
+                             current_app.config["RECOMMENDATION_SESSION_TTL_SECONDS"])
+    return _sessions
+
+def _get_session_ids() -> LRUCache[PydanticObjectId, PydanticObjectId]:
+    # maps the queries sharing a session (queries of a batch, re-ranked queries) to the id of the session
+    global _session_ids
+    if _session_ids is None:
+        _session_ids = LRUCache(current_app.config["RECOMMENDATION_SESSION_COUNT"]
+                                * current_app.config["BATCH_REPORT_MAX_PREFERENCE_SETS"],
+                                current_app.config["RECOMMENDATION_SESSION_TTL_SECONDS"])
+    return _session_ids
+
+def store_session(session: RecommendationSession, query_ids: Iterable[PydanticObjectId] = ()) -> None:
+    """
+    Store a session for the query it was created for and the given further queries, which share a single entry.
+    Sessions idle for RECOMMENDATION_SESSION_TTL_SECONDS are evicted, as are the least recently used ones beyond
+    RECOMMENDATION_SESSION_COUNT.
+    """
+    _get_sessions().put(session.query_id, session)
+    session_ids = _get_session_ids()
+    for query_id in query_ids:
+        session_ids.put(query_id, session.query_id)
+
+def get_session(query_id: PydanticObjectId) -> Optional[RecommendationSession]:
+    """
+    Get the session of a query and keep it alive for another RECOMMENDATION_SESSION_TTL_SECONDS.
+
+    Returns:
+        The session, or None if the query has no session (anymore).
+    """
+    sessions, session_ids = _get_sessions(), _get_session_ids()
+    session_id = session_ids.get(query_id)
+    session = sessions.get(session_id if session_id is not None else query_id)
+    if session is not None:
+        sessions.put(session.query_id, session)
+        if session_id is not None:
+            session_ids.put(query_id, session_id)
+    return session
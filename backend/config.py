@@ -14,6 +14,7 @@ class Config:
 
     WORKING_DIR = os.path.expanduser(os.getenv("WORKING_DIR", "~/.assistml/working"))
     SAVE_UPLOADS = _parse_bool(os.getenv("SAVE_UPLOADS", False))
+    ADMIN_API_ENABLED = _parse_bool(os.getenv("ADMIN_API_ENABLED", False))
 
     MONGO_HOST = os.getenv("MONGO_HOST")
     MONGO_PORT = int(os.getenv("MONGO_PORT"))
@@ -22,8 +23,34 @@ class Config:
     MONGO_DB = os.getenv("MONGO_DB", "assistml")
     MONGO_TLS = _parse_bool(os.getenv("MONGO_TLS", False))
 
-    INCLUDE_SIMILARITY_LEVEL_0 = _parse_bool(os.getenv("INCLUDE_SIMILARITY_LEVEL_0", False))
+    INCLUDE_SIMILARITY_LEVEL_0 = _parse_bool(os.getenv("INCLUDE_SIMILARITY_LEVEL_0", True))
+    SIMILARITY_LEVEL_0_MODEL_LIMIT = int(os.getenv("SIMILARITY_LEVEL_0_MODEL_LIMIT", 1000))
     PROCESS_MODEL_LIMIT = int(os.getenv("PROCESS_MODEL_LIMIT")) if os.getenv("PROCESS_MODEL_LIMIT") is not None else None
+    DEGRADED_PROCESS_MODEL_LIMIT = int(os.getenv("DEGRADED_PROCESS_MODEL_LIMIT", 1000))
+    DEGRADED_CLUSTERING_SAMPLE_SIZE = int(os.getenv("DEGRADED_CLUSTERING_SAMPLE_SIZE", 5000))
+    QUERY_TIME_BUDGET_SECONDS = float(os.getenv("QUERY_TIME_BUDGET_SECONDS")) if os.getenv("QUERY_TIME_BUDGET_SECONDS") is not None else None
+    SAMPLING_SEED = int(os.getenv("SAMPLING_SEED", 0))
+    FETCH_PARALLELISM = int(os.getenv("FETCH_PARALLELISM", 4))
+    SCRATCH_COLLECTIONS = _parse_bool(os.getenv("SCRATCH_COLLECTIONS", False))
+    CLEANUP_INTERVAL_SECONDS = float(os.getenv("CLEANUP_INTERVAL_SECONDS", 5))
+    CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 100))
+    ADAPTIVE_TOLERANCES = _parse_bool(os.getenv("ADAPTIVE_TOLERANCES", False))
+    TARGET_MODEL_COUNT_MIN = int(os.getenv("TARGET_MODEL_COUNT_MIN", 100))
+    TARGET_MODEL_COUNT_MAX = int(os.getenv("TARGET_MODEL_COUNT_MAX", 5000))
+    CLUSTERING_ENGINE = os.getenv("CLUSTERING_ENGINE", "dbscan")
+    CLUSTERING_SAMPLE_SIZE = int(os.getenv("CLUSTERING_SAMPLE_SIZE")) if os.getenv("CLUSTERING_SAMPLE_SIZE") is not None else None
+    PARETO_PREFILTER_LAYERS = int(os.getenv("PARETO_PREFILTER_LAYERS")) if os.getenv("PARETO_PREFILTER_LAYERS") is not None else None
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 100))
+    REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", 60))
+    RECOMMENDATION_SESSION_COUNT = int(os.getenv("RECOMMENDATION_SESSION_COUNT", 32))
+    RECOMMENDATION_SESSION_TTL_SECONDS = float(os.getenv("RECOMMENDATION_SESSION_TTL_SECONDS", 900))
+    BATCH_REPORT_MAX_PREFERENCE_SETS = int(os.getenv("BATCH_REPORT_MAX_PREFERENCE_SETS", 100))
+    DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", 10000))
+    DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", 3600))
+    DOCUMENT_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("DOCUMENT_CACHE_VERSION_CHECK_SECONDS", 30))
+    SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", 32))
+    DATASET_NEIGHBORS_COUNT = int(os.getenv("DATASET_NEIGHBORS_COUNT", 1000))
+    DATASET_INDEX_PREFILTER_K = int(os.getenv("DATASET_INDEX_PREFILTER_K")) if os.getenv("DATASET_INDEX_PREFILTER_K") is not None else None
 
     assert MONGO_HOST is not None, "MONGO_HOST must be set"
     assert MONGO_PORT is not None, "MONGO_PORT must be set"
@@ -1,3 +1,5 @@
+from .corpus_version import CorpusVersion
+from .dataset_neighbors import DatasetNeighbors
 from .dataset_similarities import DatasetSimilarity
 from .implementation import Implementation
 from .object_document_mapper import ObjectDocumentMapper
@@ -5,7 +7,10 @@ from .dataset import Dataset
 from .similar_models import SimilarModels
 from .task import Task
 from .model import Model
+from .model_catalog import ModelCatalogEntry
+from .pipeline_profile import PipelineProfile
 from .query import Query
+from .similarity_context import SimilarityContext
 
 __all__ = [
     'ObjectDocumentMapper',
@@ -13,7 +18,12 @@ __all__ = [
     'Task',
     'Implementation',
     'Model',
+    'ModelCatalogEntry',
     'Query',
     'DatasetSimilarity',
     'SimilarModels',
+    'SimilarityContext',
+    'CorpusVersion',
+    'DatasetNeighbors',
+    'PipelineProfile',
 ]
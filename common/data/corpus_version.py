@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from beanie import Document
+from pymongo import IndexModel, ReturnDocument
+
+from .utils import alias_generator
+
+
+class CorpusVersion(Document):
+    """
+    Version stamp of a collection of the metadata repository. The version is incremented whenever documents
+    are added to the collection, so that derived data (e.g. cached similarities) can detect that it is outdated.
+    """
+    name: str
+    version: int = 0
+    updated_at: datetime
+
+    class Settings:
+        name = "corpus_versions"
+        validate_on_save = True
+        indexes = [
+            IndexModel("name", name="name_", unique=True),
+        ]
+
+    class Config:
+        populate_by_name = True
+        alias_generator = alias_generator
+
+    @classmethod
+    async def get_version(cls, name: str) -> int:
+        corpus_version = await cls.find_one({"name": name})
+        return corpus_version.version if corpus_version is not None else 0
+
+    @classmethod
+    async def bump(cls, name: str) -> int:
+        corpus_version = await cls.get_motor_collection().find_one_and_update(
+            {"name": name},
+            {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return corpus_version["version"]
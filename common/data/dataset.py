@@ -183,8 +183,8 @@ class Dataset(Document):
                 numeric_agg_mean = np.mean(numeric_stats, axis=0)
                 numeric_agg_std = np.std(numeric_stats, axis=0)
             else:
-                numeric_agg_mean = np.zeros(7)
-                numeric_agg_std = np.zeros(7)
+                numeric_agg_mean = np.zeros(5)
+                numeric_agg_std = np.zeros(5)
         else:
             numeric_agg_mean = np.zeros(5)
             numeric_agg_std = np.zeros(5)
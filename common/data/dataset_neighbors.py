@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Dict, List
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+
+from .utils import CustomBaseModel, alias_generator
+
+
+class DatasetNeighbor(CustomBaseModel):
+    dataset_id: PydanticObjectId
+    similarity_level: int
+    similarity3: float
+    similarity: float
+
+
+class DatasetNeighbors(Document):
+    """
+    Precomputed top-N most similar datasets of a dataset, ordered by similarity level and cosine similarity of the
+    dataset descriptors (both descending). Lists are computed when a dataset is added and patched when other datasets
+    are added, the corpus version tells which state of the dataset corpus they reflect.
+    """
+    dataset_id: PydanticObjectId
+    tolerances: Dict[str, float]
+    corpus_version: int
+    neighbors: List[DatasetNeighbor]
+    updated_at: datetime
+
+    class Settings:
+        name = "dataset_neighbors"
+        validate_on_save = True
+        indexes = [
+            IndexModel("datasetId", name="datasetId_", unique=True),
+        ]
+
+    class Config:
+        populate_by_name = True
+        alias_generator = alias_generator
+
+    def get_dataset_ids(self, similarity_level: int) -> List[PydanticObjectId]:
+        return [neighbor.dataset_id for neighbor in self.neighbors if neighbor.similarity_level >= similarity_level]
@@ -10,7 +10,7 @@ from .utils import alias_generator
 
 class DatasetSimilarity(Document):
     dataset_id: ObjectId
-    query_id: ObjectId
+    context_id: ObjectId
     created_at: datetime
     total_features: int
     total_matches: int
@@ -22,12 +22,12 @@ class DatasetSimilarity(Document):
     has_sim_3: bool
 
     class Settings:
-        name = "dataset_similarities"
+        name = "dataset_similarity_cache"
         validate_on_save = True
         indexes = [
-            IndexModel([("datasetId", ASCENDING), ("queryId", ASCENDING)], name="datasetId_queryId_", unique=True),
-            IndexModel([("queryId", ASCENDING), ("datasetId", ASCENDING)], name="queryId_datasetId_", unique=True),
-            IndexModel("queryId", name="queryId_"),
+            IndexModel([("datasetId", ASCENDING), ("contextId", ASCENDING)], name="datasetId_contextId_", unique=True),
+            IndexModel([("contextId", ASCENDING), ("datasetId", ASCENDING)], name="contextId_datasetId_", unique=True),
+            IndexModel("contextId", name="contextId_"),
             IndexModel("createdAt", name="createdAt_", expireAfterSeconds=12*60*60),
         ]
 
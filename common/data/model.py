@@ -1,12 +1,12 @@
 from enum import Enum
 from typing import Optional, Any, List, Type, Dict, Literal
 
-from beanie import Document, Link
+from beanie import Document, Link, PydanticObjectId
 from pydantic import field_validator
-from pymongo import IndexModel
+from pymongo import ASCENDING, IndexModel
 
 from .implementation import Implementation
-from .task import Task
+from .task import Task, TaskType
 from .utils import CustomBaseModel, alias_generator, encode_dict
 
 
@@ -65,6 +65,9 @@ class Model(Document):
     mlsea_uri: Optional[str] = None
     setup: Setup
     metrics: Dict[Metric, Any]
+    # denormalized from setup.task to allow selecting models without joining tasks
+    dataset_id: Optional[PydanticObjectId] = None
+    task_type: Optional[TaskType] = None
 
     class Settings:
         name = "models"
@@ -75,6 +78,7 @@ class Model(Document):
                        partialFilterExpression={"mlseaUri": {"$exists": True}}),
             IndexModel("setup.task.$id", name="setup.task.$id_"),
             IndexModel("setup.task", name="setup.task_"),
+            IndexModel([("taskType", ASCENDING), ("datasetId", ASCENDING)], name="taskType_datasetId_"),
         ]
         bson_encoders = {
             Dict: encode_dict
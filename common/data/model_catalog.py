@@ -0,0 +1,54 @@
+import random
+from typing import Any, Dict, Optional
+
+from beanie import Document, Link, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+
+from .model import Model
+from .task import TaskType
+from .utils import alias_generator
+
+
+class ModelCatalogEntry(Document):
+    """
+    Compact copy of a model containing only the fields required to select and cluster models, grouped by task type.
+    The id of an entry is the id of the model. Entries are ordered by a random sample key, so that a uniform sample of
+    the models of a task type can be read with a single index range scan.
+    """
+    task_type: TaskType
+    dataset_id: PydanticObjectId
+    task_id: PydanticObjectId
+    implementation_id: PydanticObjectId
+    metrics: Dict[str, Any]
+    sample_key: float
+
+    class Settings:
+        name = "model_catalog"
+        keep_nulls = False
+        validate_on_save = True
+        indexes = [
+            IndexModel([("taskType", ASCENDING), ("sampleKey", ASCENDING)], name="taskType_sampleKey_"),
+        ]
+
+    class Config:
+        populate_by_name = True
+        use_enum_values = True
+        alias_generator = alias_generator
+
+    @classmethod
+    def from_model(cls, model: Model) -> Optional["ModelCatalogEntry"]:
+        """
+        Create the catalog entry of a model. Returns None if the model lacks the denormalized task keys.
+        """
+        if model.dataset_id is None or model.task_type is None:
+            return None
+        return cls(
+            id=model.id,
+            task_type=model.task_type,
+            dataset_id=model.dataset_id,
+            task_id=model.setup.task.to_ref().id if isinstance(model.setup.task, Link) else model.setup.task.id,
+            implementation_id=(model.setup.implementation.to_ref().id if isinstance(model.setup.implementation, Link)
+                               else model.setup.implementation.id),
+            metrics={metric.value: value for metric, value in model.metrics.items()},
+            sample_key=random.random()
+        )
@@ -2,12 +2,17 @@ from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from config import Config
+from .corpus_version import CorpusVersion
+from .dataset_neighbors import DatasetNeighbors
 from .dataset_similarities import DatasetSimilarity
 from .dataset import Dataset
 from .implementation import Implementation
 from .model import Model
+from .model_catalog import ModelCatalogEntry
+from .pipeline_profile import PipelineProfile
 from .query import Query
 from .similar_models import SimilarModels
+from .similarity_context import SimilarityContext
 from .task import Task, ClassificationTask, RegressionTask, ClusteringTask, LearningCurveTask
 
 
@@ -31,5 +36,6 @@ class ObjectDocumentMapper:
         await init_beanie(
             database=self._db,
             document_models=[Dataset, Task, ClassificationTask, RegressionTask, ClusteringTask, LearningCurveTask,
-                             Implementation, Model, Query, DatasetSimilarity, SimilarModels]
+                             Implementation, Model, Query, DatasetSimilarity, SimilarModels, SimilarityContext,
+                             CorpusVersion, DatasetNeighbors, ModelCatalogEntry, PipelineProfile]
         )
@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import List, Optional
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+
+from .utils import CustomBaseModel, alias_generator
+
+
+class StageProfile(CustomBaseModel):
+    stage: str
+    execution_time_ms: Optional[int] = None
+    documents_returned: Optional[int] = None
+    documents_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+    collection_scans: Optional[int] = None
+    indexes_used: List[str] = []
+
+
+class PipelineProfile(Document):
+    """
+    Execution statistics of an aggregation pipeline of the model selection, as reported by MongoDB's explain.
+    Profiles are kept to compare the performance of the pipelines over time.
+    """
+    query_id: PydanticObjectId
+    pipeline: str
+    collection: str
+    created_at: datetime
+    corpus_version: int
+    execution_time_ms: Optional[int] = None
+    merge_documents: Optional[int] = None  # documents that reach the $merge stage, which is not executed
+    stages: List[StageProfile]
+
+    class Settings:
+        name = "pipeline_profiles"
+        validate_on_save = True
+        indexes = [
+            IndexModel([("pipeline", 1), ("createdAt", -1)], name="pipeline_createdAt_"),
+            IndexModel("queryId", name="queryId_"),
+        ]
+
+    class Config:
+        populate_by_name = True
+        alias_generator = alias_generator
@@ -2,6 +2,7 @@ from typing import Optional, List, Any, Dict, Union
 
 from beanie import Document, Link
 from pydantic import Field, field_serializer, field_validator, confloat, SerializationInfo
+from pymongo import DESCENDING, IndexModel
 
 from . import Implementation
 from .dataset import Dataset
@@ -16,6 +17,7 @@ class Summary(CustomBaseModel):
     nearly_acceptable_models: int
     distrust_score: float
     warnings: List[str]
+    similarity_tolerances: Optional[Dict[str, float]] = None
 
 
 class PerformanceReport(CustomBaseModel):
@@ -125,12 +127,17 @@ class Query(Document):
     semantic_types: List[str]
     preferences: Dict[Metric, confloat(ge=0, le=1)]
     report: Optional[Report] = None
+    cache_key: Optional[str] = None  # set once a complete report is stored, identifies identical queries
 
     class Settings:
         name = "queries"
         keep_nulls = False
         validate_on_save = True
         alias_generator = alias_generator
+        indexes = [
+            IndexModel([("cache_key", 1), ("_id", DESCENDING)], name="cache_key_id_",
+                       partialFilterExpression={"cache_key": {"$exists": True}}),
+        ]
         bson_encoders = {
             Dict: encode_dict
         }
@@ -1,11 +1,11 @@
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict
 
 from beanie import Document
 from bson import ObjectId
 from pymongo import IndexModel
 
-from .model import Metric, Setup
+from .model import Metric
 from .utils import alias_generator
 
 
@@ -14,8 +14,8 @@ class SimilarModels(Document):
     query_id: ObjectId
     created_at: datetime
     task_model_idx: int  # index of the model in the task, used for even distribution
-    mlsea_uri: Optional[str] = None
-    setup: Setup
+    task_id: ObjectId
+    implementation_id: ObjectId
     metrics: Dict[Metric, Any]
 
     class Settings:
@@ -0,0 +1,45 @@
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Optional
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel
+
+from .utils import alias_generator
+
+
+class SimilarityContextStatus(Enum):
+    BUILDING = "building"
+    READY = "ready"
+
+
+class SimilarityContext(Document):
+    """
+    Cached result of a dataset similarity calculation. The similarities of all datasets to the new dataset are stored
+    in the DatasetSimilarity collection, referencing the context by its id.
+
+    While a context is building, its lease is renewed by the query calculating it. A context whose lease expired is
+    abandoned, e.g. because the backend replica crashed.
+    """
+    key: str
+    dataset_id: PydanticObjectId
+    tolerances: Dict[str, float]
+    corpus_version: int
+    status: SimilarityContextStatus
+    created_at: datetime
+    last_used_at: datetime
+    lease_expires_at: Optional[datetime] = None
+
+    class Settings:
+        name = "similarity_contexts"
+        validate_on_save = True
+        indexes = [
+            IndexModel("key", name="key_", unique=True),
+            IndexModel("lastUsedAt", name="lastUsedAt_"),
+            IndexModel("createdAt", name="createdAt_", expireAfterSeconds=12*60*60),
+        ]
+
+    class Config:
+        populate_by_name = True
+        use_enum_values = True
+        alias_generator = alias_generator
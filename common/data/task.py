@@ -3,7 +3,7 @@ from enum import Enum
 from typing import List, ForwardRef, Optional
 
 from beanie import Document, Link, BackLink
-from pymongo import IndexModel
+from pymongo import ASCENDING, IndexModel
 
 from .dataset import Dataset
 from .implementation import Implementation
@@ -37,6 +37,7 @@ class Task(Document):
     task_type: TaskType
     dataset: Link[Dataset]
     related_implementations: Optional[List[Link[Implementation]]] = None
+    model_count: Optional[int] = None  # maintained on model ingestion to sample models evenly across tasks
     #models: Optional[List[BackLink[Model]]] = Field(None, json_schema_extra={"original_field": "setup.task"})  # nested backlinks seem not to be supported by beanie
 
     class Settings:
@@ -49,6 +50,7 @@ class Task(Document):
             IndexModel("mlseaUri", name="mlseaUri_", unique=True,
                        partialFilterExpression={"mlseaUri": {"$exists": True}}),
             IndexModel("taskType", name="taskType_"),
+            IndexModel([("dataset.$id", ASCENDING), ("taskType", ASCENDING)], name="dataset.$id_taskType_"),
         ]
 
     class Config:
@@ -31,6 +31,13 @@ def encode_dict(d: dict) -> dict:
         result[encoded_key] = encoded_value
     return result
 
+def dbref_id(dbref_field_path: str) -> dict:
+    """
+    Build an aggregation expression for the id of the DBRef at the given field path. Field paths in expressions must
+    not contain "$"-prefixed names such as the "$id" of a DBRef.
+    """
+    return {"$getField": {"field": {"$literal": "$id"}, "input": dbref_field_path}}
+
 class CustomBaseModel(BaseModel):
 
     class Config:
@@ -1,11 +1,17 @@
 from common.dto.analyse_dataset_request import AnalyseDatasetRequestDto
 from common.dto.analyse_dataset_response import AnalyseDatasetResponseDto, DatasetInfoDto, DbWriteStatusDto
+from common.dto.batch_report_request import BatchReportRequestDto
+from common.dto.batch_report_response import BatchReportResponseDto
 from common.dto.report_request import ReportRequestDto
 from common.dto.report_response import ReportResponseDto
+from common.dto.rerank_request import RerankRequestDto
 
 __all__ = [
     'ReportRequestDto',
     'ReportResponseDto',
+    'RerankRequestDto',
+    'BatchReportRequestDto',
+    'BatchReportResponseDto',
     'AnalyseDatasetRequestDto',
     'AnalyseDatasetResponseDto',
     'DatasetInfoDto',
@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import Field, confloat, field_serializer, field_validator
+
+from common.data import Model
+from common.data.model import Metric
+from common.data.task import TaskType
+from common.data.utils import CustomBaseModel
+from common.dto.report_request import ReportRequestDto
+
+
+class BatchReportRequestDto(CustomBaseModel):
+    classification_type: str
+    semantic_types: List[str]
+    preference_sets: List[Dict[Metric, confloat(ge=0, le=1)]] = Field(min_length=1)
+    dataset_name: Optional[str] = None
+    dataset_id: str
+    task_type: TaskType
+
+    @field_validator("preference_sets", mode="before")
+    def validate_preference_sets(cls, v: Any) -> List[dict[Metric, Any]]:
+        if not isinstance(v, list):
+            raise ValueError("Preference sets must be a list")
+        return [Model.validate_metrics(preferences) for preferences in v]
+
+    @field_serializer("preference_sets")
+    def serialize_preference_sets(self, preference_sets: List[dict[Metric, Any]], info) -> List[Dict[str, Any]]:
+        return [{metric.value: value for metric, value in preferences.items()} for preferences in preference_sets]
+
+    @field_validator("task_type", mode="before")
+    def validate_task_type(cls, v: Any) -> TaskType:
+        if isinstance(v, TaskType):
+            return v
+        if isinstance(v, str):
+            try:
+                return TaskType(v)
+            except ValueError:
+                raise ValueError(f"Task type {v} is not valid")
+        raise ValueError(f"Task type {v} is not valid")
+
+    @field_serializer("task_type")
+    def serialize_task_type(self, task_type: TaskType, info) -> str:
+        return task_type.value
+
+    def to_report_requests(self) -> List[ReportRequestDto]:
+        return [
+            ReportRequestDto(
+                classification_type=self.classification_type,
+                semantic_types=self.semantic_types,
+                preferences=preferences,
+                dataset_name=self.dataset_name,
+                dataset_id=self.dataset_id,
+                task_type=self.task_type
+            )
+            for preferences in self.preference_sets
+        ]
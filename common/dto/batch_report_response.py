@@ -0,0 +1,8 @@
+from typing import List
+
+from common.data.utils import CustomBaseModel
+from common.dto.report_response import ReportResponseDto
+
+
+class BatchReportResponseDto(CustomBaseModel):
+    reports: List[ReportResponseDto]
@@ -1,5 +1,7 @@
+from typing import Optional
+
 from common.data.query import Report
 
 
 class ReportResponseDto(Report):
-    pass
+    query_id: Optional[str] = None
@@ -0,0 +1,19 @@
+from typing import Any, Dict
+
+from pydantic import confloat, field_serializer, field_validator
+
+from common.data import Model
+from common.data.model import Metric
+from common.data.utils import CustomBaseModel
+
+
+class RerankRequestDto(CustomBaseModel):
+    preferences: Dict[Metric, confloat(ge=0, le=1)]
+
+    @field_validator("preferences", mode="before")
+    def validate_preferences(cls, v: Any) -> dict[Metric, Any]:
+        return Model.validate_metrics(v)
+
+    @field_serializer("preferences")
+    def serialize_preferences(self, preferences: dict[Metric, Any], info) -> Dict[str, Any]:
+        return {metric.value: value for metric, value in preferences.items()}
@@ -0,0 +1,101 @@
+import os
+import pickle
+from typing import List, Tuple
+
+import numpy as np
+from beanie import PydanticObjectId
+from sklearn.neighbors import BallTree
+
+from common.data import Dataset
+from common.utils.dataset_descriptor_normalizer import DatasetDescriptorNormalizer
+
+
+def _to_unit_vectors(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    unit_vectors = np.zeros_like(vectors, dtype=float)
+    np.divide(vectors, norms, out=unit_vectors, where=norms != 0)
+    return unit_vectors
+
+
+class DatasetDescriptorIndex:
+    """
+    Metric tree over the normalized descriptors of all datasets to find the most similar datasets in logarithmic time.
+
+    Descriptors are scaled to unit length, so that the euclidean distance is a monotonic function of the cosine
+    similarity used by Dataset.similarity (d^2 = 2 - 2 * cos).
+    """
+
+    corpus_version: int
+    _dataset_ids: List[PydanticObjectId]
+    _positions: dict
+    _vectors: np.ndarray
+    _normalizer: DatasetDescriptorNormalizer
+    _tree: BallTree
+
+    def __init__(self, normalizer: DatasetDescriptorNormalizer, corpus_version: int, leaf_size: int = 40):
+        """
+        Build the index over all datasets added to the normalizer.
+
+        Parameters:
+        normalizer (DatasetDescriptorNormalizer): Normalizer the datasets of the corpus have been added to.
+        corpus_version (int): Version of the dataset corpus the index is built for.
+        """
+        dataset_ids, vectors = normalizer.normalize_all()
+        if not dataset_ids:
+            raise ValueError("Cannot build an index without datasets")
+        self.corpus_version = corpus_version
+        self._dataset_ids = dataset_ids
+        self._positions = {dataset_id: position for position, dataset_id in enumerate(dataset_ids)}
+        self._vectors = _to_unit_vectors(vectors)
+        self._normalizer = normalizer
+        self._tree = BallTree(self._vectors, leaf_size=leaf_size)
+
+    @classmethod
+    async def build(cls, corpus_version: int) -> "DatasetDescriptorIndex":
+        normalizer = DatasetDescriptorNormalizer()
+        # stream the datasets, only their descriptors are kept in memory
+        async for dataset in Dataset.find_all():
+            normalizer.add_dataset(dataset)
+        normalizer.fit_normalizers()
+        return cls(normalizer, corpus_version)
+
+    def __len__(self) -> int:
+        return len(self._dataset_ids)
+
+    def query(self, dataset: Dataset, k: int) -> List[Tuple[PydanticObjectId, float]]:
+        """
+        Find the k datasets whose descriptors are most similar to the descriptor of the given dataset.
+
+        Returns:
+        List[Tuple[PydanticObjectId, float]]: Dataset ids and cosine similarities, most similar first. The dataset
+        itself is never part of the result.
+        """
+        if dataset.id in self._positions:
+            vector = self._vectors[self._positions[dataset.id]]
+        else:
+            vector = _to_unit_vectors(self._normalizer.normalize(dataset.get_dataset_descriptor()))
+
+        # query one more neighbor in case the dataset itself is part of the index
+        _, positions = self._tree.query(vector.reshape(1, -1), k=min(k + 1, len(self)), sort_results=True)
+        positions = positions[0]
+        similarities = self._vectors[positions] @ vector
+        return [
+            (self._dataset_ids[position], float(similarity))
+            for position, similarity in zip(positions, similarities)
+            if self._dataset_ids[position] != dataset.id
+        ][:k]
+
+    def save(self, path: str) -> None:
+        # write to a temporary file first, so that concurrent readers never see a partial index
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DatasetDescriptorIndex":
+        with open(path, "rb") as file:
+            index = pickle.load(file)
+        if not isinstance(index, cls):
+            raise ValueError(f"{path} does not contain a dataset descriptor index")
+        return index
@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from beanie import PydanticObjectId
@@ -36,3 +36,13 @@ class DatasetDescriptorNormalizer:
         if self._min_vector is None or self._max_vector is None or self._range_vector is None:
             raise ValueError("Normalizers not fitted")
         return (descriptor - self._min_vector) / self._range_vector
+
+    def normalize_all(self) -> Tuple[List[PydanticObjectId], np.ndarray]:
+        """
+        Normalize the descriptors of all added datasets.
+
+        Returns:
+        Tuple[List[PydanticObjectId], np.ndarray]: The dataset ids and their normalized descriptors (one row each).
+        """
+        dataset_ids = list(self._descriptors.keys())
+        return dataset_ids, self.normalize(np.array([self._descriptors[dataset_id] for dataset_id in dataset_ids]))
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from beanie import BulkWriter, PydanticObjectId
+
+from common.data import CorpusVersion, Dataset, DatasetNeighbors
+from common.data.dataset_neighbors import DatasetNeighbor
+from common.utils.dataset_descriptor_normalizer import DatasetDescriptorNormalizer
+from common.utils.dataset_similarity import DEFAULT_SIMILARITY_TOLERANCES, DatasetSimilarityPoints
+
+DEFAULT_NEIGHBORS_COUNT = 1000
+
+
+class _DatasetCorpus:
+    """
+    All datasets of the metadata repository, prepared for calculating similarity levels and descriptor similarities.
+    """
+
+    datasets: List[Dataset]
+    points: DatasetSimilarityPoints
+    _normalizer: DatasetDescriptorNormalizer
+    _descriptors: np.ndarray
+    _descriptor_norms: np.ndarray
+
+    def __init__(self, datasets: List[Dataset]):
+        self.datasets = datasets
+        self.points = DatasetSimilarityPoints(datasets)
+        self._normalizer = DatasetDescriptorNormalizer()
+        for dataset in datasets:
+            self._normalizer.add_dataset(dataset)
+        self._normalizer.fit_normalizers()
+        self._descriptors = np.array([self.normalize(dataset) for dataset in datasets])
+        self._descriptor_norms = np.linalg.norm(self._descriptors, axis=1)
+
+    def normalize(self, dataset: Dataset) -> np.ndarray:
+        return self._normalizer.normalize(dataset.get_dataset_descriptor())
+
+    def get_similarities(self, dataset: Dataset) -> np.ndarray:
+        """
+        Cosine similarities of the normalized descriptors of all datasets to the given dataset, see Dataset.similarity.
+        """
+        descriptor = self.normalize(dataset)
+        norms = self._descriptor_norms * np.linalg.norm(descriptor)
+        similarities = np.zeros(len(self.datasets), dtype=float)
+        np.divide(self._descriptors @ descriptor, norms, out=similarities, where=norms != 0)
+        return similarities
+
+
+def _strip_features(features_path: str, stripped_fields: dict) -> dict:
+    # feature maps are keyed by feature name, hence the fields of every feature are replaced via an array of pairs
+    return {"$arrayToObject": {"$map": {
+        "input": {"$objectToArray": features_path},
+        "in": {"k": "$$this.k", "v": {"$mergeObjects": ["$$this.v", stripped_fields]}}
+    }}}
+
+# The descriptors and similarity points only use the statistics of the features. The value lists, which make up most
+# of a dataset document, are replaced by empty ones, so that the datasets still validate.
+_CORPUS_PROJECTION = {
+    "info": {"$mergeObjects": ["$info", {"analyzedFeatures": {"$literal": []}, "discardedFeatures": {"$literal": []}}]},
+    "features.numericalFeatures": _strip_features("$features.numericalFeatures", {
+        "outliers": {"number": "$$this.v.outliers.number", "actualValues": {"$literal": []}}
+    }),
+    "features.categoricalFeatures": _strip_features("$features.categoricalFeatures", {"levels": {"$literal": {}}}),
+    "features.unstructuredFeatures": 1,
+    "features.datetimeFeatures": 1
+}
+
+
+async def _load_corpus() -> Optional[_DatasetCorpus]:
+    datasets = await Dataset.find_all().aggregate([{"$project": _CORPUS_PROJECTION}],
+                                                  projection_model=Dataset).to_list()
+    if not datasets:
+        return None
+    # preparing the descriptors is CPU bound, keep the event loop responsive
+    return await asyncio.to_thread(_DatasetCorpus, datasets)
+
+def _sorted_tolerances(tolerances: Dict[str, float]) -> Dict[str, float]:
+    # lists are looked up by the tolerances as embedded document, which requires a stable key order
+    return dict(sorted(tolerances.items()))
+
+def _calculate_neighbors(corpus: _DatasetCorpus, dataset: Dataset, tolerances: Dict[str, float],
+                         neighbors_count: int) -> List[DatasetNeighbor]:
+    levels, similarity3 = corpus.points.get_similarity_levels(dataset, tolerances)
+    similarities = corpus.get_similarities(dataset)
+
+    order = np.lexsort((-similarities, -levels))
+    neighbors = []
+    for idx in order:
+        if corpus.datasets[idx].id == dataset.id:
+            continue
+        neighbors.append(DatasetNeighbor(
+            dataset_id=corpus.datasets[idx].id,
+            similarity_level=int(levels[idx]),
+            similarity3=float(similarity3[idx]),
+            similarity=float(similarities[idx])
+        ))
+        if len(neighbors) >= neighbors_count:
+            break
+    return neighbors
+
+def _calculate_new_dataset_neighbors(corpus: _DatasetCorpus,
+                                     new_dataset: Dataset,
+                                     tolerances: Dict[str, float]) -> Dict[PydanticObjectId, DatasetNeighbor]:
+    # the new dataset as neighbor of every other dataset
+    new_dataset_points = DatasetSimilarityPoints([new_dataset])
+    similarities = corpus.get_similarities(new_dataset)
+    new_dataset_neighbors = {}
+    for idx, dataset in enumerate(corpus.datasets):
+        if dataset.id == new_dataset.id:
+            continue
+        levels, similarity3 = new_dataset_points.get_similarity_levels(dataset, tolerances)
+        new_dataset_neighbors[dataset.id] = DatasetNeighbor(
+            dataset_id=new_dataset.id,
+            similarity_level=int(levels[0]),
+            similarity3=float(similarity3[0]),
+            similarity=float(similarities[idx])
+        )
+    return new_dataset_neighbors
+
+async def update_all_dataset_neighbors(tolerances: Dict[str, float] = DEFAULT_SIMILARITY_TOLERANCES,
+                                       neighbors_count: int = DEFAULT_NEIGHBORS_COUNT) -> int:
+    """
+    (Re)calculate the neighbor lists of all datasets. Returns the number of updated lists.
+    """
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    corpus = await _load_corpus()
+    if corpus is None:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    async with BulkWriter(ordered=False) as bulk_writer:
+        for dataset in corpus.datasets:
+            neighbors = _calculate_neighbors(corpus, dataset, tolerances, neighbors_count)
+            await DatasetNeighbors.find_one({"datasetId": dataset.id}).update({"$set": {
+                "tolerances": _sorted_tolerances(tolerances),
+                "corpusVersion": corpus_version,
+                "neighbors": neighbors,
+                "updatedAt": now
+            }}, upsert=True, bulk_writer=bulk_writer)
+    await DatasetNeighbors.find({"datasetId": {"$nin": [dataset.id for dataset in corpus.datasets]}}).delete()
+    return len(corpus.datasets)
+
+async def add_dataset_neighbors(dataset_id: PydanticObjectId,
+                                tolerances: Dict[str, float] = DEFAULT_SIMILARITY_TOLERANCES,
+                                neighbors_count: int = DEFAULT_NEIGHBORS_COUNT) -> bool:
+    """
+    Calculate the neighbor list of a newly added dataset and patch the lists of all other datasets.
+
+    Only lists that were up-to-date before the dataset was added are patched. Returns False if any other list was
+    not, e.g. because further datasets were added concurrently; run update_all_dataset_neighbors to recalculate
+    them. The descriptor similarities of patched lists are not recalculated, although the normalization of the
+    descriptors depends on the corpus; run update_all_dataset_neighbors periodically to refresh them.
+
+    The similarities are calculated in a worker thread and the lists are patched server-side, without loading them.
+    """
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    corpus = await _load_corpus()
+    new_dataset = next((dataset for dataset in corpus.datasets if dataset.id == dataset_id), None) if corpus else None
+    if new_dataset is None:
+        raise ValueError(f"Dataset {dataset_id} not found")
+
+    neighbors = await asyncio.to_thread(_calculate_neighbors, corpus, new_dataset, tolerances, neighbors_count)
+    new_dataset_neighbors = await asyncio.to_thread(_calculate_new_dataset_neighbors, corpus, new_dataset, tolerances)
+
+    now = datetime.now(timezone.utc)
+    await DatasetNeighbors.find_one({"datasetId": new_dataset.id}).update({"$set": {
+        "tolerances": _sorted_tolerances(tolerances),
+        "corpusVersion": corpus_version,
+        "neighbors": neighbors,
+        "updatedAt": now
+    }}, upsert=True)
+
+    # committed explicitly instead of on leaving a context, which discards the result
+    bulk_writer = BulkWriter(ordered=False)
+    for neighbors_dataset_id, new_dataset_neighbor in new_dataset_neighbors.items():
+        await DatasetNeighbors.find_one({
+            "datasetId": neighbors_dataset_id,
+            "corpusVersion": corpus_version - 1,
+            "tolerances": _sorted_tolerances(tolerances),
+            "neighbors.datasetId": {"$ne": new_dataset.id}
+        }).update({
+            "$push": {"neighbors": {
+                "$each": [new_dataset_neighbor],
+                "$sort": {"similarityLevel": -1, "similarity": -1},
+                "$slice": neighbors_count
+            }},
+            "$set": {"corpusVersion": corpus_version, "updatedAt": now}
+        }, bulk_writer=bulk_writer)
+    result = await bulk_writer.commit()
+    patched_lists_count = result.matched_count if result is not None else 0
+    return patched_lists_count == len(new_dataset_neighbors)
+
+async def get_dataset_neighbors(dataset_id: PydanticObjectId,
+                                tolerances: Dict[str, float]) -> Optional[DatasetNeighbors]:
+    """
+    Get the neighbor list of a dataset if it reflects the current dataset corpus and the given tolerances.
+    """
+    corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
+    return await DatasetNeighbors.find_one({
+        "datasetId": dataset_id,
+        "corpusVersion": corpus_version,
+        "tolerances": _sorted_tolerances(tolerances)
+    })
@@ -0,0 +1,100 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from common.data import Dataset
+
+DEFAULT_SIMILARITY_TOLERANCES = {
+    "feature_ratio": 0.1,
+    "monotonous_filtering": 0.1,
+    "mutual_info": 0.1,
+    "similarity_ratio": 0.5
+}
+
+
+def _get_feature_ratios(dataset: Dataset) -> np.ndarray:
+    return np.array([
+        dataset.info.categorical_ratio,
+        dataset.info.numerical_ratio,
+        dataset.info.datetime_ratio,
+        dataset.info.unstructured_ratio
+    ], dtype=float)
+
+def _get_feature_points(features: dict) -> np.ndarray:
+    """
+    Get the (monotonous filtering, mutual info) points of the given features.
+    Missing mutual info (e.g. for regression) is represented as NaN.
+    """
+    points = [
+        [feature.monotonous_filtering, feature.mutual_info if feature.mutual_info is not None else np.nan]
+        for feature in features.values()
+    ]
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+def _count_matching_features(features: np.ndarray, new_features: np.ndarray,
+                             monotonous_filtering_tolerance: float, mutual_info_tolerance: float) -> int:
+    if len(features) == 0 or len(new_features) == 0:
+        return 0
+    # comparisons with NaN are False, hence features without mutual info never match
+    monotonous_filtering_diff = np.abs(features[:, np.newaxis, 0] - new_features[np.newaxis, :, 0])
+    mutual_info_diff = np.abs(features[:, np.newaxis, 1] - new_features[np.newaxis, :, 1])
+    matches = (monotonous_filtering_diff <= monotonous_filtering_tolerance) & (mutual_info_diff <= mutual_info_tolerance)
+    return int(np.count_nonzero(matches.any(axis=1)))
+
+
+class DatasetSimilarityPoints:
+    """
+    In-memory representation of the dataset characteristics the similarity levels are based on.
+
+    The similarity levels are calculated the same way as by the dataset similarity aggregation pipeline of the model
+    recommender: level 1 requires the same kinds of features, level 2 additionally similar feature ratios and level 3
+    additionally a sufficient share of features with similar monotonous filtering and mutual info.
+    """
+
+    dataset_ids: List
+    _ratios: np.ndarray
+    _numerical_features: List[np.ndarray]
+    _categorical_features: List[np.ndarray]
+
+    def __init__(self, datasets: List[Dataset]):
+        self.dataset_ids = [dataset.id for dataset in datasets]
+        self._ratios = np.array([_get_feature_ratios(dataset) for dataset in datasets], dtype=float).reshape(-1, 4)
+        self._numerical_features = [_get_feature_points(dataset.features.numerical_features) for dataset in datasets]
+        self._categorical_features = [_get_feature_points(dataset.features.categorical_features) for dataset in datasets]
+
+    def __len__(self) -> int:
+        return len(self.dataset_ids)
+
+    def get_similarity_levels(self, new_dataset: Dataset,
+                              tolerances: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the similarity levels of all datasets to the new dataset.
+
+        Returns:
+        Tuple[np.ndarray, np.ndarray]: The similarity level (0-3) and the similarity3 ratio of every dataset.
+        """
+        new_ratios = _get_feature_ratios(new_dataset)
+        both_zero = (self._ratios == 0) & (new_ratios == 0)
+        has_sim_1 = (((self._ratios != 0) & (new_ratios != 0)) | both_zero).all(axis=1)
+        has_sim_2 = (((self._ratios >= new_ratios - tolerances["feature_ratio"])
+                      & (self._ratios <= new_ratios + tolerances["feature_ratio"])) | both_zero).all(axis=1)
+
+        similarity3 = np.zeros(len(self), dtype=float)
+        new_numerical_features = _get_feature_points(new_dataset.features.numerical_features)
+        new_categorical_features = _get_feature_points(new_dataset.features.categorical_features)
+        # the feature comparison is expensive and only affects datasets that can reach level 3
+        for idx in np.flatnonzero(has_sim_1 & has_sim_2):
+            total_features = len(self._numerical_features[idx]) + len(self._categorical_features[idx])
+            if total_features == 0:
+                continue
+            total_matches = (
+                _count_matching_features(self._numerical_features[idx], new_numerical_features,
+                                         tolerances["monotonous_filtering"], tolerances["mutual_info"])
+                + _count_matching_features(self._categorical_features[idx], new_categorical_features,
+                                           tolerances["monotonous_filtering"], tolerances["mutual_info"])
+            )
+            similarity3[idx] = total_matches / total_features
+        has_sim_3 = similarity3 >= tolerances["similarity_ratio"]
+
+        levels = has_sim_1.astype(int) + (has_sim_1 & has_sim_2) + (has_sim_1 & has_sim_2 & has_sim_3)
+        return levels, similarity3
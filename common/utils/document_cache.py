@@ -1,59 +1,169 @@
-import asyncio
-from collections import defaultdict
-from typing import DefaultDict, Dict, Union, TypeVar, Type
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Type, TypeVar, Union
 
 from beanie import PydanticObjectId, Link, Document
 
-from common.data import Dataset, Task, Implementation
+from common.data import CorpusVersion, Dataset, Task, Implementation
+from common.data.projection.model import ModelView
+from common.utils.lru_cache import LRUCache
+from common.utils.single_flight import SingleFlight
+from config import Config
 
 T = TypeVar("T", bound=Document)
 
-class DocumentCache:
-    _cache: Dict[Type[T], Dict[PydanticObjectId, T]]
-    _locks: Dict[Type[T], DefaultDict[PydanticObjectId, asyncio.Lock]]
+PREFETCH_BATCH_SIZE = 1_000
+CACHED_DOCUMENT_TYPES = (Dataset, Task, Implementation)
 
-    def __init__(self):
-        self._cache = {}
-        self._locks = {}
+_shared_document_cache: Optional["DocumentCache"] = None
+
+
+def _get_reference_id(reference: Union[Link[T], T]) -> PydanticObjectId:
+    if isinstance(reference, Link):
+        return reference.to_ref().id
+    return reference.id
 
-    async def _get_document(self, document_type: Type[T], reference: Union[Link[T], PydanticObjectId, T]) -> T:
-        if document_type not in self._cache:
-            self._cache[document_type] = {}
-            self._locks[document_type] = defaultdict(asyncio.Lock)
 
-        cache = self._cache[document_type]
+class DocumentCacheStats(NamedTuple):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class DocumentCache:
+    """
+    Size-bounded LRU cache of datasets, tasks and implementations, which barely change but are referenced by every
+    ranked model. Entries expire after ttl_seconds.
+
+    Entries are invalidated by the corpus version stamps of their collections, which are bumped whenever documents
+    are added or changed: at most every version_check_seconds, the stamps are compared with those the entries were
+    loaded under and the entries of changed collections are dropped. Concurrent fetches of the same document are
+    coalesced.
+    """
+    _caches: Dict[Type[T], LRUCache[PydanticObjectId, T]]
+    _fetches: SingleFlight[Tuple[Type[T], PydanticObjectId], Optional[T]]
+    _hits: Dict[Type[T], int]
+    _misses: Dict[Type[T], int]
+    _versions: Dict[Type[T], int]
+    _version_check_seconds: Optional[float]
+    _versions_checked_at: Optional[float]
+
+    def __init__(self, max_size: int = 10_000, ttl_seconds: Optional[float] = None,
+                 version_check_seconds: Optional[float] = None):
+        self._caches = {document_type: LRUCache(max_size, ttl_seconds) for document_type in CACHED_DOCUMENT_TYPES}
+        self._fetches = SingleFlight()
+        self._hits = {document_type: 0 for document_type in CACHED_DOCUMENT_TYPES}
+        self._misses = {document_type: 0 for document_type in CACHED_DOCUMENT_TYPES}
+        self._versions = {}
+        self._version_check_seconds = version_check_seconds
+        self._versions_checked_at = None
+
+    async def _check_versions(self) -> None:
+        if self._version_check_seconds is None:
+            return
+        now = time.monotonic()
+        if self._versions_checked_at is not None and now - self._versions_checked_at < self._version_check_seconds:
+            return
+        self._versions_checked_at = now
+        corpus_versions = await CorpusVersion.find(
+            {"name": {"$in": [document_type.get_collection_name() for document_type in CACHED_DOCUMENT_TYPES]}}
+        ).to_list()
+        versions = {corpus_version.name: corpus_version.version for corpus_version in corpus_versions}
+        for document_type in CACHED_DOCUMENT_TYPES:
+            version = versions.get(document_type.get_collection_name(), 0)
+            if self._versions.get(document_type, version) != version:
+                self._caches[document_type].clear()
+            self._versions[document_type] = version
+
+    async def _fetch_document(self, document_type: Type[T], reference: Union[Link[T], PydanticObjectId]) -> Optional[T]:
+        if isinstance(reference, Link):
+            return await reference.fetch()
+        return await document_type.get(reference, with_children=True)
+
+    async def _get_document(self, document_type: Type[T], reference: Union[Link[T], PydanticObjectId, T]) -> T:
+        await self._check_versions()
+        cache = self._caches[document_type]
 
         if isinstance(reference, document_type):
-            document = reference
-            document_id = document.id
-            lock = self._locks[document_type][document_id]
-            async with lock:
-                if document_id not in cache:
-                    cache[document_id] = document
-
-        elif isinstance(reference, Link):
-            document_id = reference.to_ref().id
-            lock = self._locks[document_type][document_id]
-            async with lock:
-                if document_id not in cache:
-                    document = await reference.fetch()
-                    cache[document_id] = document
-            document = cache[document_id]
+            if reference.id not in cache:
+                cache.put(reference.id, reference)
+            return reference
 
+        if isinstance(reference, Link):
+            document_id = reference.to_ref().id
         elif isinstance(reference, PydanticObjectId):
             document_id = reference
-            lock = self._locks[document_type][document_id]
-            async with lock:
-                if reference not in cache:
-                    document = await document_type.get(document_id)
-                    cache[document_id] = document
-            document = cache[document_id]
-
         else:
             raise ValueError(f"Unknown document type: {type(reference)}")
 
+        document = cache.get(document_id)
+        if document is not None:
+            self._hits[document_type] += 1
+            return document
+
+        self._misses[document_type] += 1
+        document = await self._fetches.run((document_type, document_id),
+                                           lambda: self._fetch_document(document_type, reference))
+        if document is not None:
+            cache.put(document_id, document)
         return document
 
+    async def _prefetch_documents(self, document_type: Type[T], document_ids: Iterable[PydanticObjectId]) -> List[T]:
+        # loads the documents not cached yet with $in queries instead of one query per document and returns all
+        # requested documents that exist
+        cache = self._caches[document_type]
+        documents: Dict[PydanticObjectId, T] = {}
+        missing_ids: List[PydanticObjectId] = []
+        for document_id in set(document_ids):
+            document = cache.get(document_id)
+            if document is not None:
+                documents[document_id] = document
+            else:
+                missing_ids.append(document_id)
+        self._hits[document_type] += len(documents)
+        self._misses[document_type] += len(missing_ids)
+
+        for batch_start in range(0, len(missing_ids), PREFETCH_BATCH_SIZE):
+            batch_ids = missing_ids[batch_start:batch_start + PREFETCH_BATCH_SIZE]
+            # tasks are stored as subclasses of Task
+            for document in await document_type.find({"_id": {"$in": batch_ids}}, with_children=True).to_list():
+                cache.put(document.id, document)
+                documents[document.id] = document
+        return list(documents.values())
+
+    async def prefetch_models(self, models: List[ModelView]) -> List[Implementation]:
+        """
+        Load the tasks, datasets and implementations referenced by the given models, including all components of the
+        implementations, with a few bulk queries per collection. Afterwards, the documents of the models are served
+        from the cache without further queries.
+
+        Returns:
+            The implementations referenced by the models and all of their components.
+        """
+        await self._check_versions()
+        tasks = await self._prefetch_documents(
+            Task, (_get_reference_id(model.setup.task) for model in models if model.setup.task is not None))
+        await self._prefetch_documents(Dataset, (_get_reference_id(task.dataset) for task in tasks))
+
+        implementation_ids: Set[PydanticObjectId] = set()
+        for model in models:
+            implementation_ids.add(_get_reference_id(model.setup.implementation))
+            implementation_ids.update(_get_reference_id(parameter.implementation)
+                                      for parameter in model.setup.hyper_parameters)
+        # the component trees are loaded level by level
+        visited_ids: Set[PydanticObjectId] = set()
+        prefetched_implementations: List[Implementation] = []
+        while implementation_ids:
+            visited_ids.update(implementation_ids)
+            implementations = await self._prefetch_documents(Implementation, implementation_ids)
+            prefetched_implementations.extend(implementations)
+            implementation_ids = {
+                _get_reference_id(component)
+                for implementation in implementations if implementation.components
+                for component in implementation.components.values()
+            } - visited_ids
+        return prefetched_implementations
+
     async def get_dataset(self, dataset: Union[Link[Dataset], PydanticObjectId, Dataset]) -> Dataset:
         return await self._get_document(Dataset, dataset)
 
@@ -68,3 +178,30 @@ class DocumentCache:
 
     async def get_task(self, task: Union[Link[Task], PydanticObjectId, Task]) -> Task:
         return await self._get_document(Task, task)
+
+    def get_stats(self) -> Dict[str, DocumentCacheStats]:
+        """
+        Returns:
+            The statistics of the cache per collection.
+        """
+        return {
+            document_type.get_collection_name(): DocumentCacheStats(
+                size=len(self._caches[document_type]),
+                hits=self._hits[document_type],
+                misses=self._misses[document_type],
+                evictions=self._caches[document_type].get_evictions()
+            )
+            for document_type in CACHED_DOCUMENT_TYPES
+        }
+
+
+def get_shared_document_cache() -> DocumentCache:
+    """
+    Get the document cache shared by all requests of the process, configured by DOCUMENT_CACHE_SIZE (per
+    collection), DOCUMENT_CACHE_TTL_SECONDS and DOCUMENT_CACHE_VERSION_CHECK_SECONDS.
+    """
+    global _shared_document_cache
+    if _shared_document_cache is None:
+        _shared_document_cache = DocumentCache(Config.DOCUMENT_CACHE_SIZE, Config.DOCUMENT_CACHE_TTL_SECONDS,
+                                               Config.DOCUMENT_CACHE_VERSION_CHECK_SECONDS)
+    return _shared_document_cache
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Size-bounded in-memory cache evicting the least recently used entries. If ttl_seconds is given, entries expire
+    that long after they were put. Evicted and expired entries are counted.
+    """
+    _max_size: int
+    _ttl_seconds: Optional[float]
+    _entries: "OrderedDict[K, Tuple[float, V]]"
+    _evictions: int
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._evictions = 0
+
+    def _is_expired(self, put_at: float) -> bool:
+        return self._ttl_seconds is not None and time.monotonic() - put_at > self._ttl_seconds
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        put_at, value = entry
+        if self._is_expired(put_at):
+            del self._entries[key]
+            self._evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_evictions(self) -> int:
+        return self._evictions
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
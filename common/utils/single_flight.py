@@ -0,0 +1,52 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Call(Generic[V]):
+    task: "asyncio.Task[V]"
+    waiters: int
+
+    def __init__(self, task: "asyncio.Task[V]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Coalesces concurrent calls with the same key: only the first call runs the function, the others wait for and
+    share its result (or exception).
+
+    The function runs in its own task, hence a cancelled caller does not cancel the computation of the others. The
+    computation is only cancelled once all of its callers are cancelled.
+    """
+    _calls: Dict[K, _Call[V]]
+
+    def __init__(self):
+        self._calls = {}
+
+    def _remove_call(self, key: K, call: _Call[V]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def is_in_flight(self, key: K) -> bool:
+        return key in self._calls
+
+    async def run(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._remove_call(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
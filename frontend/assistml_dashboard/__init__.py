@@ -7,7 +7,7 @@ from quart import g
 from assistml_dashboard.client import BackendClient
 from assistml_dashboard.components import create_layout, register_callbacks
 from common.data import ObjectDocumentMapper
-from common.utils.document_cache import DocumentCache
+from common.utils.document_cache import get_shared_document_cache
 from config import Config
 
 logging.basicConfig(level=logging.getLevelName(Config.LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,7 +29,7 @@ def create_app():
 
         async with app.server.app_context():
             g.backend_client = BackendClient(app.server.config)
-            g.document_cache = DocumentCache()
+            g.document_cache = get_shared_document_cache()
             register_callbacks(app)
 
         app.layout = await create_layout()
@@ -7,7 +7,8 @@ from pydantic import ValidationError
 
 from common.data.model import Metric
 from common.data.task import TaskType
-from common.dto import AnalyseDatasetRequestDto, AnalyseDatasetResponseDto, ReportRequestDto, ReportResponseDto
+from common.dto import AnalyseDatasetRequestDto, AnalyseDatasetResponseDto, ReportRequestDto, ReportResponseDto, \
+    RerankRequestDto
 
 
 class BackendClient:
@@ -81,3 +82,33 @@ class BackendClient:
                 return ReportResponseDto(**response_json), None
             except ValidationError as e:
                 return None, f"Error while parsing response: {e}"
+
+    async def get_report(self, query_id: str) -> (Optional[ReportResponseDto], Optional[str]):
+        url = f"{self.base_url}/query/{query_id}"
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(url=url)
+
+            if response.status_code != 200:
+                return None, response.text
+
+            response_json = response.json()
+            try:
+                return ReportResponseDto(**response_json), None
+            except ValidationError as e:
+                return None, f"Error while parsing response: {e}"
+
+    async def rerank(self, query_id: str, preferences: dict[Metric, Any]) -> (Optional[ReportResponseDto], Optional[str]):
+        url = f"{self.base_url}/query/{query_id}/rerank"
+        rerank_dto = RerankRequestDto(preferences=preferences)
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(url=url, json=rerank_dto.model_dump(by_alias=True),
+                                         headers={'Content-Type': 'application/json'})
+
+            if response.status_code != 200:
+                return None, response.text
+
+            response_json = response.json()
+            try:
+                return ReportResponseDto(**response_json), None
+            except ValidationError as e:
+                return None, f"Error while parsing response: {e}"
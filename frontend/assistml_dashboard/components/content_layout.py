@@ -1,10 +1,11 @@
-from dash import html
+from dash import html, dcc
 import dash_bootstrap_components as dbc
 
 
 def create_content():
     return html.Div(
         children=[
+            dcc.Store(id='query-id-store'),
             html.H6(id='report_section', ),
             html.H6(id='result_section', children='Analysis results will get displayed here !!!!',
                     style={'font-weight': 'bold', }),
@@ -8,7 +8,7 @@ from common.data.query import ImplementationGroupReport
 from common.data import Implementation
 from common.data.query import HyperparameterConfigurationReport, ImplementationDatasetGroupReport, \
     PartialHyperparameterConfiguration
-from common.utils.document_cache import DocumentCache
+from common.utils.document_cache import DocumentCache, get_shared_document_cache
 
 
 def background_color(grade):
@@ -49,7 +49,7 @@ async def create_recursive_hyperparameter_configuration_tree_layout(
 ):
     if 'document_cache' not in g:
         current_app.logger.debug("Creating document cache")
-        g.document_cache = DocumentCache()
+        g.document_cache = get_shared_document_cache()
     document_cache: DocumentCache = g.document_cache
     implementation: Implementation = await document_cache.get_implementation(implementation)
     configuration: Optional[PartialHyperparameterConfiguration] = next(
@@ -114,7 +114,7 @@ async def create_hyperparameter_configuration_report_layout(
 ):
     if 'document_cache' not in g:
         current_app.logger.debug("Creating document cache")
-        g.document_cache = DocumentCache()
+        g.document_cache = get_shared_document_cache()
     document_cache:DocumentCache = g.document_cache
 
     main_implementation: Implementation = await document_cache.get_implementation(main_implementation)
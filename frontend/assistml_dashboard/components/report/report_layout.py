@@ -17,6 +17,10 @@ def _generate_summary(summary: Summary):
             warnings_string += "\n* " + warning
     else:
         distrust += "."
+    tolerances = []
+    if summary.similarity_tolerances:
+        tolerances.append(html.P("Dataset similarity tolerances: " + ", ".join(
+            f"{name.replace('_', ' ')} {value}" for name, value in summary.similarity_tolerances.items())))
     return html.Div([
         html.H1('Query results'),
         html.Div([
@@ -24,7 +28,8 @@ def _generate_summary(summary: Summary):
                 "There is " + str(no_of_acceptable) + " acceptable models that match your query and " + str(
                     no_of_nearly_acceptable) + " nearly acceptable models."),
             html.P(distrust),
-            dcc.Markdown(warnings_string)
+            dcc.Markdown(warnings_string),
+            *tolerances
         ])
     ])
 
@@ -1,3 +1,4 @@
+import dash
 from flash import Flash, Input, Output, State, ALL, MATCH
 
 from assistml_dashboard.components.sidebar.classifier_preferences_layout import get_slider_layout
@@ -23,7 +24,9 @@ def register_classifier_preferences_callbacks(app: Flash):
             previous_value = stored_values.get(metric.value, 0.45)  # default value
             sliders.extend(get_slider_layout(metric, previous_value))
 
-        return sliders, stored_values
+        # the store is updated by store_slider_values once the sliders are rendered, writing the stale values would
+        # re-rank the report for the previous metrics
+        return sliders, dash.no_update
 
     @app.callback(
         Output({"type": "metric-slider-label", "index": MATCH}, "children"),
@@ -1,3 +1,4 @@
+import dash
 from flash import Flash, Input, Output, State
 from quart import g, current_app
 
@@ -21,6 +22,7 @@ def register_sidebar_callbacks(app: Flash):
             Output('submit_btn_load_output', 'children'),
             Output('result_section', 'children'),
             Output('report_section', 'children'),
+            Output('query-id-store', 'data'),
         ],
         [
             Input('submit_button', 'n_clicks'),
@@ -42,10 +44,10 @@ def register_sidebar_callbacks(app: Flash):
         response: AnalyseDatasetResponseDto
         response, error = await backend.analyse_dataset(class_label, class_feature_type, feature_type_list)
         if response is None:
-            return error, "Feature suggestion not possible", ""
+            return error, "Feature suggestion not possible", "", None
 
         if response.data_profile is None:
-            return response.db_write_status.status, "Feature suggestion not possible", ""
+            return response.db_write_status.status, "Feature suggestion not possible", "", None
 
         current_app.logger.debug(f"Dataset_id: {response.db_write_status.dataset_id}")
 
@@ -54,8 +56,31 @@ def register_sidebar_callbacks(app: Flash):
         report, error = await backend.query(class_feature_type, feature_type_list, preferences, response.db_write_status.dataset_id, csv_filename, TaskType(task_type))
 
         if report is None:
-            return response.db_write_status.status, suggested_features, f"Error while profiling the dataset: {error}"
+            return response.db_write_status.status, suggested_features, f"Error while profiling the dataset: {error}", None
 
         report_layout = await create_report_layout(report, error)
 
-        return response.db_write_status.status, suggested_features, report_layout
+        return response.db_write_status.status, suggested_features, report_layout, report.query_id
+
+    @app.callback(
+        [
+            Output('report_section', 'children', allow_duplicate=True),
+            Output('query-id-store', 'data', allow_duplicate=True),
+        ],
+        Input('slider-values-store', 'data'),
+        State('query-id-store', 'data'),
+        prevent_initial_call=True
+    )
+    async def rerank_report(stored_values, query_id):
+        # only the preferences changed, the models selected for the last query are ranked again
+        if query_id is None or not stored_values:
+            return dash.no_update, dash.no_update
+
+        preferences = {Metric(metric): value for metric, value in stored_values.items()}
+        report, error = await backend.rerank(query_id, preferences)
+        if report is None:
+            return f"Error while re-ranking the models: {error}", dash.no_update
+
+        report_layout = await create_report_layout(report, error)
+
+        return report_layout, report.query_id
@@ -24,6 +24,10 @@ class Config(object):
     MONGO_DB = os.getenv("MONGO_DB", "assistml")
     MONGO_TLS = _parse_bool(os.getenv("MONGO_TLS", False))
 
+    DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", 10000))
+    DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", 3600))
+    DOCUMENT_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("DOCUMENT_CACHE_VERSION_CHECK_SECONDS", 30))
+
     assert BACKEND_BASE_URL is not None, "BACKEND_BASE_URL must be set"
 
     assert MONGO_HOST is not None, "MONGO_HOST must be set"
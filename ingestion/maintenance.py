@@ -0,0 +1,51 @@
+import asyncio
+
+import click
+
+from common.data import ObjectDocumentMapper
+from common.utils.dataset_neighbors import DEFAULT_NEIGHBORS_COUNT, update_all_dataset_neighbors
+from common.utils.dataset_similarity import DEFAULT_SIMILARITY_TOLERANCES
+from processing.migration import count_task_models, denormalize_model_keys, refresh_model_catalog
+
+
+async def _run(maintenance_task, *args):
+    odm = ObjectDocumentMapper()
+    await odm.connect()
+    return await maintenance_task(*args)
+
+@click.group()
+def main():
+    """Maintenance tasks for an existing metadata repository."""
+
+@main.command('denormalize-model-keys')
+def denormalize_model_keys_command():
+    """Store dataset id and task type of the related task on every model (required by the model selection)."""
+    click.echo("Denormalizing task keys on models")
+    updated_models_count = asyncio.run(_run(denormalize_model_keys))
+    click.echo(f"Updated {updated_models_count} models")
+
+@main.command('count-task-models')
+def count_task_models_command():
+    """Store the number of models on every task (required to sample models evenly across tasks)."""
+    click.echo("Counting models of tasks")
+    tasks_count = asyncio.run(_run(count_task_models))
+    click.echo(f"Counted models of {tasks_count} tasks")
+
+@main.command('refresh-model-catalog')
+def refresh_model_catalog_command():
+    """Add models that are missing in the per task type model catalog (required by similarity level 0)."""
+    click.echo("Refreshing model catalog")
+    added_entries_count = asyncio.run(_run(refresh_model_catalog))
+    click.echo(f"Added {added_entries_count} models to the catalog")
+
+@main.command('update-dataset-neighbors')
+@click.option('--neighbors-count', default=DEFAULT_NEIGHBORS_COUNT, type=int, help='Number of neighbors to keep per dataset')
+def update_dataset_neighbors_command(neighbors_count):
+    """Recalculate the precomputed nearest-dataset neighbor lists of all datasets."""
+    click.echo("Updating dataset neighbors")
+    updated_lists_count = asyncio.run(_run(update_all_dataset_neighbors, DEFAULT_SIMILARITY_TOLERANCES,
+                                           neighbors_count))
+    click.echo(f"Updated {updated_lists_count} dataset neighbor lists")
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,9 @@ from typing import Dict, List, Optional
 import pandas as pd
 from sklearn.datasets import fetch_openml
 
-from common.data import Dataset
+from common.data import CorpusVersion, Dataset
 from common.data.dataset import TargetFeatureType, Info
+from common.utils.dataset_neighbors import update_all_dataset_neighbors
 from config import Config
 from mlsea import DatasetDto, mlsea_repository as mlsea
 from processing.task import process_all as process_all_tasks
@@ -14,6 +15,7 @@ from processing.types import ProcessingOptions
 
 
 async def process_all_datasets(dataset_ids: List[int] = None, options: ProcessingOptions = ProcessingOptions()):
+    initial_corpus_version = await CorpusVersion.get_version(Dataset.get_collection_name())
     count = 0
     offset_id = options.offset.pop('dataset', 0) if options.offset is not None else 0
     while True:
@@ -47,6 +49,12 @@ async def process_all_datasets(dataset_ids: List[int] = None, options: Processin
         if options.head is not None and count >= options.head:
             break
 
+    if await CorpusVersion.get_version(Dataset.get_collection_name()) != initial_corpus_version:
+        # recalculating all lists once is cheaper than patching them for every single new dataset
+        print("Updating dataset neighbors")
+        updated_lists_count = await update_all_dataset_neighbors()
+        print(f"Updated {updated_lists_count} dataset neighbor lists")
+
 async def _ensure_dataset_exists(dataset_dto: DatasetDto):
     dataset: Optional[Dataset] = await Dataset.find_one(
         #Dataset.info.mlsea_uri == dataset_dto.mlsea_dataset_uri
@@ -62,6 +70,7 @@ async def _ensure_dataset_exists(dataset_dto: DatasetDto):
     dataset = Dataset(**profiled_dataset)
     dataset.info.mlsea_uri = dataset_dto.mlsea_dataset_uri
     await dataset.insert()
+    await CorpusVersion.bump(Dataset.get_collection_name())
     return dataset
 
 def _profile_dataset(openml_dataset_id, default_target_feature_label: str):
@@ -5,7 +5,7 @@ from typing import Optional, List
 import openml
 from beanie import WriteRules, Link
 
-from common.data import Task, Implementation
+from common.data import CorpusVersion, Task, Implementation
 from common.data.implementation import Parameter, Software, Platform
 from mlsea import mlsea_repository as mlsea
 from mlsea.dtos import ImplementationDto, SoftwareDto
@@ -54,6 +54,7 @@ async def process_all_implementations(task: Task, options: ProcessingOptions = P
                 offset_id = implementation_dto.openml_flow_id
 
         await task.save(link_rule=WriteRules.DO_NOTHING)
+        await CorpusVersion.bump(Task.get_collection_name())
 
         if options.head is not None and count >= options.head:
             break
@@ -122,6 +123,7 @@ async def _ensure_implementation_exists(implementation_dto: ImplementationDto, s
         class_name=class_name
     )
     await implementation.insert(link_rule=WriteRules.DO_NOTHING)
+    await CorpusVersion.bump(Implementation.get_collection_name())
     return implementation
 
 def _transform_software_dto(software_dto: SoftwareDto) -> List[Software]:
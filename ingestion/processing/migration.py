@@ -0,0 +1,130 @@
+from common.data import Model, ModelCatalogEntry, Task
+from common.data.utils import dbref_id
+
+
+def _get_denormalize_model_keys_pipeline():
+    return [
+        {
+            "$match": {
+                "datasetId": {"$exists": False}
+            }
+        }, {
+            "$lookup": {
+                "from": Task.get_collection_name(),
+                "let": {
+                    "taskId": dbref_id("$setup.task")
+                },
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {"$eq": ["$_id", "$$taskId"]}
+                        }
+                    }, {
+                        "$project": {
+                            "_id": 0,
+                            "datasetId": dbref_id("$dataset"),
+                            "taskType": 1
+                        }
+                    }
+                ],
+                "as": "task"
+            }
+        }, {
+            "$unwind": {
+                "path": "$task",
+                "preserveNullAndEmptyArrays": False
+            }
+        }, {
+            "$project": {
+                "datasetId": "$task.datasetId",
+                "taskType": "$task.taskType"
+            }
+        }, {
+            "$merge": {
+                "into": Model.get_collection_name(),
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }
+        }
+    ]
+
+def _get_refresh_model_catalog_pipeline():
+    return [
+        {
+            "$match": {
+                "datasetId": {"$exists": True},
+                "taskType": {"$exists": True}
+            }
+        }, {
+            "$project": {
+                "taskType": 1,
+                "datasetId": 1,
+                "taskId": dbref_id("$setup.task"),
+                "implementationId": dbref_id("$setup.implementation"),
+                "metrics": 1,
+                "sampleKey": {"$rand": {}}
+            }
+        }, {
+            "$merge": {
+                "into": ModelCatalogEntry.get_collection_name(),
+                "on": "_id",
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
+
+def _get_count_task_models_pipeline():
+    return [
+        {
+            "$group": {
+                "_id": dbref_id("$setup.task"),
+                "modelCount": {"$sum": 1}
+            }
+        }, {
+            "$merge": {
+                "into": Task.get_collection_name(),
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }
+        }
+    ]
+
+async def denormalize_model_keys() -> int:
+    """
+    Store the dataset id and the task type of the related task directly on every model that does not have them yet.
+
+    Returns:
+        The number of models that were updated.
+    """
+    pending_models_count = await Model.find({"datasetId": {"$exists": False}}).count()
+    if pending_models_count == 0:
+        return 0
+    await Model.find().aggregate(_get_denormalize_model_keys_pipeline()).to_list()
+    remaining_models_count = await Model.find({"datasetId": {"$exists": False}}).count()
+    return pending_models_count - remaining_models_count
+
+async def refresh_model_catalog() -> int:
+    """
+    Add all models that are missing in the model catalog, e.g. models ingested by an older version.
+    Requires the denormalized task keys on the models, see denormalize_model_keys.
+
+    Returns:
+        The number of models that were added to the catalog.
+    """
+    catalog_entries_count = await ModelCatalogEntry.find().count()
+    await Model.find().aggregate(_get_refresh_model_catalog_pipeline()).to_list()
+    return await ModelCatalogEntry.find().count() - catalog_entries_count
+
+async def count_task_models() -> int:
+    """
+    Store the number of models on every task.
+
+    Returns:
+        The number of tasks with at least one model.
+    """
+    await Task.find(with_children=True).update_many({"$set": {"modelCount": 0}})
+    await Model.find().aggregate(_get_count_task_models_pipeline()).to_list()
+    return await Task.find({"modelCount": {"$gt": 0}}, with_children=True).count()
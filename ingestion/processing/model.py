@@ -4,7 +4,7 @@ from typing import Optional, Any, Dict
 import openml.runs
 from beanie import Link, WriteRules
 
-from common.data import Task, Model, Implementation
+from common.data import CorpusVersion, Task, Model, Implementation, ModelCatalogEntry
 from common.data.model import Setup, Parameter, Metric
 from common.data.implementation import Platform
 from mlsea import mlsea_repository as mlsea
@@ -64,9 +64,17 @@ async def _ensure_model_exists(run_dto: RunDto, task: Task):
     model = Model(
         mlsea_uri=run_dto.mlsea_run_uri,
         setup=setup,
-        metrics=metrics
+        metrics=metrics,
+        dataset_id=task.dataset.to_ref().id if isinstance(task.dataset, Link) else task.dataset.id,
+        task_type=task.task_type
     )
     await model.insert()
+    await Task.find_one({"_id": task.id}, with_children=True).update({"$inc": {"modelCount": 1}})
+
+    catalog_entry = ModelCatalogEntry.from_model(model)
+    if catalog_entry is not None:
+        await catalog_entry.insert()
+    await CorpusVersion.bump(Model.get_collection_name())
     return model
 
 
@@ -99,6 +107,7 @@ async def _generate_setup(run_dto: RunDto, task: Task) -> Setup:
             and openml_run.setup_string is not None):
         implementation.class_name = openml_run.setup_string.split(' ')[0]
         await implementation.save(link_rule=WriteRules.DO_NOTHING)
+        await CorpusVersion.bump(Implementation.get_collection_name())
 
     return Setup(
         hyper_parameters=hyper_parameters,
@@ -3,7 +3,7 @@ from typing import Dict, Optional
 
 import openml.tasks
 
-from common.data import Dataset, Task
+from common.data import CorpusVersion, Dataset, Task
 from common.data.task import TaskType, ClassificationTask, RegressionTask, ClusteringTask, LearningCurveTask
 from mlsea import mlsea_repository as mlsea
 from mlsea.dtos import TaskDto
@@ -65,6 +65,7 @@ async def _ensure_task_exists(task_dto: TaskDto, dataset: Dataset):
     task = _parse_task(task_dto, dataset)
 
     await task.insert()
+    await CorpusVersion.bump(Task.get_collection_name())
     return task
 
 def _parse_task_type(task_type_concept: str) -> TaskType: